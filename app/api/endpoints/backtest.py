@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+import asyncio
+
+from app.core.responses import FastJSONResponse
+from app.models.schemas import BacktestRequest, BacktestResponse
+from app.services.backtest import BacktestError, run_backtest
+
+router = APIRouter()
+
+@router.post("/run", response_model=BacktestResponse)
+async def run_signal_backtest(request: BacktestRequest):
+    """在本地存储的历史数据上回测趋势信号，返回各信号的收益、胜率和回撤"""
+    try:
+        result = await asyncio.to_thread(
+            run_backtest,
+            request.symbols,
+            request.signals,
+            request.start_date,
+            request.end_date,
+            request.hold_days,
+            request.take_profit,
+            request.stop_loss,
+            request.fee_rate,
+            request.stamp_tax,
+        )
+        return FastJSONResponse(result)
+    except BacktestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query
-import json
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+import asyncio
 
-from app.services.realtime_data import get_stock_realtime_data
+from app.core.config import settings
+from app.core.responses import FastJSONResponse, dumps
+from app.services.realtime_data import fetch_realtime_snapshot
+from app.services.realtime_hub import realtime_hub
+from app.services.upstream import CircuitOpenError
 
 router = APIRouter()
 
@@ -9,8 +14,34 @@ router = APIRouter()
 async def get_realtime_data(symbol: str = Query("000895", description="股票代码")):
     """获取股票实时盘口数据"""
     try:
-        result_json = get_stock_realtime_data(symbol)
-        result = json.loads(result_json)
-        return result
+        return FastJSONResponse(await fetch_realtime_snapshot(symbol))
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stream")
+async def stream_realtime_data(request: Request, symbol: str = Query("000895", description="股票代码")):
+    """
+    以 Server-Sent Events 推送股票实时盘口数据
+
+    同一只股票的所有订阅者共享一个后台轮询；每条 snapshot 事件的数据与 /data 的返回相同，
+    轮询失败时推送 error 事件，长时间没有数据时发送注释行作为心跳。
+    """
+    async def event_stream():
+        async with realtime_hub.subscription(symbol) as queue:
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(
+                        queue.get(), timeout=settings.REALTIME_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,21 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
-from app.models.schemas import StockAnalysisResponse
-from app.services.stock_analyzer import analyze_stock
+from app.core.config import settings
+from app.core.responses import FastJSONResponse, dumps, etag_response
+from app.models.schemas import BatchAnalysisRequest, BatchAnalysisResponse, StockAnalysisResponse
+from app.services.response_cache import response_cache
+from app.services.stock_analyzer import analyze_stock_async, analyze_stock_checked, analyze_stocks_async
 
 router = APIRouter()
 
 @router.get("/analysis", response_model=StockAnalysisResponse)
 async def get_stock_analysis(
+    request: Request,
     symbol: str = Query("000895", description="股票代码"),
     start_date: str = Query("20240530", description="开始日期，格式 'YYYYMMDD'"),
-    end_date: str = Query("20250605", description="结束日期，格式 'YYYYMMDD'")
+    end_date: str = Query("20250605", description="结束日期，格式 'YYYYMMDD'"),
+    live: bool = Query(False, description="盘中模式：忽略结束日期，用实时行情生成当日的临时K线")
 ):
-    """获取股票技术分析结果，包括各种技术指标和信号"""
+    """
+    获取股票技术分析结果，包括各种技术指标和信号
+
+    非盘中模式的结果在新的K线定型前不变，会被缓存并带ETag返回，条件请求命中时返回304
+    """
+    try:
+        if live:
+            result = await analyze_stock_async(symbol, start_date, end_date, live)
+            if result is None:
+                raise HTTPException(status_code=404, detail=f"无法获取股票 {symbol} 的数据")
+            return FastJSONResponse(result)
+
+        key = response_cache.key("analysis", symbol, start_date, end_date)
+        cached = response_cache.get(key)
+        if cached is None:
+            result, last_bar = await analyze_stock_checked(symbol, start_date, end_date)
+            if result is None:
+                raise HTTPException(status_code=404, detail=f"无法获取股票 {symbol} 的数据")
+            cached = response_cache.put(key, dumps(result), last_bar)
+        return etag_response(request, *cached)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/analysis/batch", response_model=BatchAnalysisResponse)
+async def get_batch_stock_analysis(request: BatchAnalysisRequest):
+    """批量获取多只股票的技术分析结果，返回成功的结果以及每只股票的错误信息"""
+    if len(request.symbols) > settings.BATCH_MAX_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"一次最多分析 {settings.BATCH_MAX_SYMBOLS} 只股票"
+        )
     try:
-        result = analyze_stock(symbol, start_date, end_date)
-        if result is None:
-            raise HTTPException(status_code=404, detail=f"无法获取股票 {symbol} 的数据")
-        return result
+        results, errors = await analyze_stocks_async(
+            request.symbols, request.start_date, request.end_date
+        )
+        return FastJSONResponse({"results": results, "errors": errors})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,13 +1,31 @@
-from fastapi import APIRouter, HTTPException, Query, BackgroundTasks
-from fastapi.responses import FileResponse
-import os
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
 
-from app.services.stock_exporter import export_stock_data
+from app.core.config import settings
+from app.core.responses import FastJSONResponse
+from app.services.stock_exporter import (
+    EXPORT_FORMATS,
+    ExportFormatError,
+    check_format,
+    export_filename,
+    export_stock_data_async,
+    iter_columnar_export,
+    iter_zip_archive,
+    resolve_columns,
+    stream_stock_export,
+)
 from app.models.schemas import StockExportResponse
 
 router = APIRouter()
 
+# 各导出格式的响应类型
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
 @router.get("/csv", response_model=StockExportResponse)
 async def export_stock_to_csv(
     symbol: str = Query(..., description="股票代码"),
@@ -16,42 +34,103 @@ async def export_stock_to_csv(
 ):
     """导出股票数据为CSV文件"""
     try:
-        output_file = export_stock_data(symbol, start_date, end_date)
+        output_file = await export_stock_data_async(symbol, start_date, end_date)
         if not output_file:
-            return StockExportResponse(
-                success=False,
-                message=f"无法获取股票 {symbol} 的数据"
-            )
+            return FastJSONResponse({
+                "success": False,
+                "message": f"无法获取股票 {symbol} 的数据",
+                "file_path": None
+            })
         
-        return StockExportResponse(
-            success=True,
-            message=f"股票数据已成功导出",
-            file_path=output_file
-        )
+        return FastJSONResponse({
+            "success": True,
+            "message": f"股票数据已成功导出",
+            "file_path": output_file
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/download/{symbol}")
-async def download_stock_csv(
+async def download_stock_file(
     symbol: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    background_tasks: BackgroundTasks = None
+    format: str = Query("csv", description="导出格式：csv、parquet 或 arrow"),
+    columns: Optional[str] = Query(None, description="导出的列，用逗号分隔，如 '收盘价,成交量' 或 'close,volume'")
 ):
-    """下载股票数据CSV文件"""
+    """下载股票数据文件，边生成边发送，不写临时文件"""
     try:
-        output_file = export_stock_data(symbol, start_date, end_date)
-        if not output_file or not os.path.exists(output_file):
-            raise HTTPException(status_code=404, detail=f"无法生成股票 {symbol} 的数据文件")
-        
-        # 设置下载完成后删除文件（可选）
-        if background_tasks:
-            background_tasks.add_task(lambda: os.unlink(output_file) if os.path.exists(output_file) else None)
-        
-        return FileResponse(
-            path=output_file,
-            filename=os.path.basename(output_file),
-            media_type="text/csv"
-        )
+        chunks = await stream_stock_export(symbol, start_date, end_date, format, _split(columns))
+    except ExportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    if chunks is None:
+        raise HTTPException(status_code=404, detail=f"无法生成股票 {symbol} 的数据文件")
+
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers=_attachment(export_filename(symbol, EXPORT_FORMATS[format]))
+    )
+
+@router.get("/zip")
+async def download_stocks_zip(
+    symbols: str = Query(..., description="股票代码，用逗号分隔，如 '000895,600000'"),
+    start_date: Optional[str] = Query(None, description="开始日期，格式 'YYYYMMDD'"),
+    end_date: Optional[str] = Query(None, description="结束日期，格式 'YYYYMMDD'")
+):
+    """下载多只股票的CSV压缩包，每只股票一个文件，压缩包边生成边发送"""
+    symbol_list = _symbol_list(symbols)
+
+    return StreamingResponse(
+        iter_zip_archive(symbol_list, start_date, end_date),
+        media_type="application/zip",
+        headers=_attachment(export_filename("stocks", "zip"))
+    )
+
+def _attachment(filename):
+    """下载文件的响应头"""
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+@router.get("/combined")
+async def download_stocks_combined(
+    symbols: str = Query(..., description="股票代码，用逗号分隔，如 '000895,600000'"),
+    format: str = Query("parquet", description="导出格式：parquet 或 arrow"),
+    start_date: Optional[str] = Query(None, description="开始日期，格式 'YYYYMMDD'"),
+    end_date: Optional[str] = Query(None, description="结束日期，格式 'YYYYMMDD'"),
+    columns: Optional[str] = Query(None, description="导出的列，用逗号分隔，如 '收盘价,成交量' 或 'close,volume'")
+):
+    """下载多只股票合并在一个文件中的Parquet或Arrow IPC数据，带股票代码列，边生成边发送"""
+    symbol_list = _symbol_list(symbols)
+    try:
+        if format == "csv":
+            raise ExportFormatError("多只股票的CSV请使用 /zip 接口")
+        check_format(format)
+        column_list = resolve_columns(_split(columns))
+    except ExportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        iter_columnar_export(symbol_list, format, start_date, end_date, column_list),
+        media_type=MEDIA_TYPES[format],
+        headers=_attachment(export_filename("stocks", EXPORT_FORMATS[format]))
+    )
+
+def _split(value):
+    """逗号分隔的查询参数转为列表"""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def _symbol_list(symbols):
+    """解析并校验多只股票导出的股票代码列表"""
+    symbol_list = _split(symbols) or []
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="至少需要一个股票代码")
+    if len(symbol_list) > settings.BATCH_MAX_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"一次最多导出 {settings.BATCH_MAX_SYMBOLS} 只股票"
+        )
+    return symbol_list
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.responses import FastJSONResponse
+from app.models.schemas import ScreenerResponse
+from app.services.screener import ConditionError, compile_condition, screener_index
+
+router = APIRouter()
+
+@router.get("/screen", response_model=ScreenerResponse)
+async def screen_stocks(
+    condition: str = Query(..., description="筛选条件，如 'MA_bullish and MACD_gold_cross and RSI6 < 50'"),
+    limit: int = Query(100, ge=1, le=10000, description="最多返回的条数")
+):
+    """在本地存储的全市场数据上，按最新交易日的指标和信号筛选股票"""
+    try:
+        evaluate = compile_condition(condition)
+        await screener_index.ensure_built()
+        total, items = screener_index.screen(evaluate, limit)
+        stats = screener_index.stats()
+        return FastJSONResponse({"count": total, "updated_at": stats["built_at"], "items": items})
+    except ConditionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
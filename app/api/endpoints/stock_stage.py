@@ -1,21 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Optional
+import asyncio
 
+from app.core.responses import FastJSONResponse, dumps, etag_response
 from app.models.schemas import TrendSignalResponse
-from app.services.stage_by_tech import analyze_stock, get_trend_signals
+from app.services.live_indicators import live_trend_signals
+from app.services.response_cache import response_cache
+from app.services.stage_by_tech import CursorError, analyze_stock_checked, get_trend_signals, page_signals
 
 router = APIRouter()
 
 @router.get("/stage", response_model=TrendSignalResponse)
 async def get_stock_stage(
+    request: Request,
     symbol: str = Query("000895", description="股票代码"),
     start_date: str = Query("20240530", description="开始日期，格式 'YYYYMMDD'"),
-    end_date: str = Query("20250605", description="结束日期，格式 'YYYYMMDD'")
+    end_date: str = Query("20250605", description="结束日期，格式 'YYYYMMDD'"),
+    live: bool = Query(False, description="盘中模式：忽略结束日期，用实时行情生成当日的临时K线"),
+    lookback: int = Query(5, ge=1, description="返回最近多少根K线的信号，最多到请求区间内的全部历史"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数，为空时不分页"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor")
 ):
+    """
+    获取股票每日的趋势阶段信号，按日期升序
+
+    返回最近 lookback 根K线，可以用 limit 和 cursor 分页。
+    非盘中模式的结果在新的K线定型前不变，会被缓存并带ETag返回，条件请求命中时返回304
+    """
     try:
-        data = analyze_stock(symbol, start_date, end_date)
-        result_list = get_trend_signals(data)  # 返回 List[dict] 或 List[TrendSignalItem]
-        if not result_list:
-            raise HTTPException(status_code=404, detail=f"无法获取股票 {symbol} 的数据")
-        return {"signals": result_list}
+        if live:
+            result_list = await live_trend_signals(symbol, start_date, lookback=lookback)
+            if not result_list:
+                raise HTTPException(status_code=404, detail=f"无法获取股票 {symbol} 的数据")
+            page, next_cursor = page_signals(result_list, cursor, limit)
+            return FastJSONResponse({"signals": page, "next_cursor": next_cursor})
+
+        key = response_cache.key("stage", symbol, start_date, end_date, lookback, limit, cursor)
+        cached = response_cache.get(key)
+        if cached is None:
+            data, last_bar = await analyze_stock_checked(symbol, start_date, end_date)
+            if data is None:
+                raise HTTPException(status_code=404, detail=f"无法获取股票 {symbol} 的数据")
+            result_list = await asyncio.to_thread(get_trend_signals, data, lookback)
+            page, next_cursor = page_signals(result_list, cursor, limit)
+            body = dumps({"signals": page, "next_cursor": next_cursor})
+            cached = response_cache.put(key, body, last_bar)
+        return etag_response(request, *cached)
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
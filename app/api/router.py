@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import stock_analysis, realtime_data, stock_export, stock_stage
+from app.api.endpoints import backtest, stock_analysis, realtime_data, stock_export, stock_screener, stock_stage
 
 api_router = APIRouter(prefix="/api")
 
@@ -8,4 +8,6 @@ api_router = APIRouter(prefix="/api")
 api_router.include_router(stock_analysis.router, prefix="/stock", tags=["股票分析"])
 api_router.include_router(stock_stage.router, prefix="/stage", tags=["股票策略"])
 api_router.include_router(realtime_data.router, prefix="/realtime", tags=["实时数据"])
-api_router.include_router(stock_export.router, prefix="/export", tags=["数据导出"])
\ No newline at end of file
+api_router.include_router(stock_export.router, prefix="/export", tags=["数据导出"])
+api_router.include_router(stock_screener.router, prefix="/screener", tags=["股票筛选"])
+api_router.include_router(backtest.router, prefix="/backtest", tags=["策略回测"])
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,6 +10,61 @@ class Settings(BaseSettings):
     
     # 数据目录
     OUTPUT_DIR: str = "./output"
+    # 本地行情存储目录（按股票代码和复权类型保存日线数据）
+    PRICE_STORE_DIR: str = "./data/prices"
+    # 收盘后多久认为当日K线已定型（分钟）
+    BAR_SETTLE_MINUTES: int = 30
+    # 进程内行情缓存的字节上限
+    FRAME_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # 执行akshare阻塞调用的线程数上限
+    UPSTREAM_MAX_WORKERS: int = 8
+    # 上游限流：每秒补充的令牌数和令牌桶容量
+    UPSTREAM_RATE_PER_SECOND: float = 2.0
+    UPSTREAM_BURST: int = 5
+    # 失败重试的初始退避时间（秒），每次重试翻倍
+    UPSTREAM_RETRY_BACKOFF_SECONDS: float = 1.0
+    # 熔断：连续失败多少次后打开，打开多少秒后试探恢复
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: float = 30.0
+    # 上游数据源：akshare（直接调用）、record（调用akshare并录制响应）、replay（只回放录制的响应）
+    UPSTREAM_PROVIDER: str = "akshare"
+    UPSTREAM_RECORDING_DIR: str = "./data/recordings"
+    # 回放时注入的固定延迟和随机抖动（秒），以及调用失败的比例；指定种子时注入的结果可复现
+    UPSTREAM_REPLAY_LATENCY_SECONDS: float = 0.0
+    UPSTREAM_REPLAY_JITTER_SECONDS: float = 0.0
+    UPSTREAM_REPLAY_ERROR_RATE: float = 0.0
+    UPSTREAM_REPLAY_SEED: Optional[int] = None
+    # 全市场行情快照的有效期（秒），以及刷新失败时旧快照最多还能使用多久（秒）
+    MARKET_SNAPSHOT_TTL_SECONDS: float = 30.0
+    MARKET_SNAPSHOT_MAX_AGE_SECONDS: float = 300.0
+    # 实时盘口推送：每只股票的轮询间隔，以及无数据时发送心跳的间隔（秒）
+    REALTIME_POLL_SECONDS: float = 3.0
+    REALTIME_HEARTBEAT_SECONDS: float = 15.0
+    
+    # 股票代码表的本地文件和刷新间隔（小时）
+    SYMBOL_DIRECTORY_PATH: str = "./data/symbols.json"
+    SYMBOL_DIRECTORY_REFRESH_HOURS: int = 24
+    
+    # 批量分析配置
+    BATCH_MAX_SYMBOLS: int = 500
+    BATCH_CONCURRENCY: int = 16
+    
+    # 选股：构建指标表时读取的历史天数，以及检查本地存储变化的间隔（秒）
+    SCREENER_LOOKBACK_DAYS: int = 365
+    SCREENER_REFRESH_SECONDS: int = 300
+    
+    # 盘中模式：进程内最多缓存多少只股票的指标递推状态
+    LIVE_STATE_CACHE_SIZE: int = 1000
+    
+    # 分析接口的响应缓存最多保存多少条响应
+    RESPONSE_CACHE_SIZE: int = 2000
+    
+    # 回测：进程池的进程数（0表示CPU核数），以及每个任务处理的股票数
+    BACKTEST_WORKERS: int = 0
+    BACKTEST_CHUNK_SYMBOLS: int = 200
+    
+    # 是否在响应头中加入各处理阶段耗时的 Server-Timing（/metrics 不受影响）
+    SERVER_TIMING_HEADER: bool = True
     
     # 服务器配置
     HOST: str = "0.0.0.0"
@@ -23,4 +79,6 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # 确保输出目录存在
-os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
+os.makedirs(settings.PRICE_STORE_DIR, exist_ok=True)
+os.makedirs(os.path.dirname(settings.SYMBOL_DIRECTORY_PATH) or ".", exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,250 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+
+from app.core.config import settings
+
+# 耗时直方图的桶上限（秒），覆盖从命中缓存的亚毫秒级到上游超时的十秒级
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """只增不减的计数器，按标签值分别计数"""
+
+    type = "counter"
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+class Histogram:
+    """
+    累积桶直方图，与 Prometheus 的 histogram 类型相同
+
+    每组标签值保存各桶的计数、总和与次数，观测一次只做一次二分查找和几次加法。
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        # 第一个不小于 value 的桶，超出所有桶时落在 +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.label_names, labels, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total)}"
+            yield f"{self.name}_count{label_text} {count}"
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表，按 Prometheus 文本格式输出
+
+    除了直接记录的计数器和直方图，还可以注册收集函数，在输出时读取各缓存已有的统计。
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name, help, label_names=()):
+        return self._register(Counter(name, help, label_names))
+
+    def histogram(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, label_names, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector):
+        """
+        注册收集函数
+
+        collector() 返回 [(指标名, 类型, 说明, [(标签字典, 值), ...]), ...]，类型为 counter 或 gauge
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        """返回 Prometheus 文本格式（version 0.0.4）的全部指标"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# 全局指标注册表和各处理阶段的耗时直方图
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("stock_stage_seconds", "各处理阶段的耗时（秒）", ["stage"])
+request_seconds = metrics.histogram(
+    "stock_http_request_seconds", "HTTP请求的耗时（秒），流式响应计到最后一块发送完", ["method", "route", "status"]
+)
+
+# 当前请求各阶段的累计耗时 {阶段: [秒数, 次数]}，由 ServerTimingMiddleware 在每个请求开始时设置；
+# asyncio.to_thread 会复制上下文，线程中记录的阶段也会计入同一个请求
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+def record_stage(stage, seconds):
+    """记录一个阶段的耗时：计入直方图，在请求中时同时计入该请求的 Server-Timing"""
+    stage_seconds.observe(seconds, stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        entry = stages.get(stage)
+        if entry is None:
+            stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+class timed:
+    """
+    记录阶段耗时，既可以作为上下文管理器，也可以作为同步函数的装饰器
+
+        with timed("fetch"):
+            ...
+
+        @timed("oscillators")
+        def calculate_oscillator_indicators(...):
+            ...
+
+    阶段可以嵌套，外层阶段的耗时包含内层阶段。
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_stage(self.stage, time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - start)
+        return wrapper
+
+def server_timing(stages, total):
+    """生成 Server-Timing 头的值，耗时单位为毫秒；同一阶段出现多次时注明次数"""
+    parts = []
+    for stage, (seconds, count) in stages.items():
+        desc = f';desc="x{count}"' if count > 1 else ""
+        parts.append(f"{stage};dur={seconds * 1000:.2f}{desc}")
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+class ServerTimingMiddleware:
+    """
+    记录每个HTTP请求的耗时，并在响应头中加入 Server-Timing
+
+    纯ASGI中间件，不缓冲响应体，流式响应照常逐块发送；Server-Timing 随响应头发出，
+    只包含发送响应头之前完成的阶段，total 为此时的耗时。请求耗时直方图以路由模板为标签，
+    如 /api/export/download/{symbol}，不会因股票代码不同而产生大量标签。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stages = {}
+        token = _request_stages.set(stages)
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if settings.SERVER_TIMING_HEADER:
+                    value = server_timing(stages, time.perf_counter() - start)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            request_seconds.observe(time.perf_counter() - start, scope["method"], path, str(status[0]))
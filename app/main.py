@@ -1,14 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.openapi.docs import get_swagger_ui_html
 
 from app.api.router import api_router
 from app.core.logging import setup_logging
+from app.core.metrics import ServerTimingMiddleware, metrics
+from app.services.backtest import shutdown_pool as shutdown_backtest_pool
+from app.services.frame_cache import frame_cache
+from app.services.live_indicators import live_states
+from app.services.market_snapshot import market_snapshot
+from app.services.realtime_hub import realtime_hub
+from app.services.response_cache import response_cache
+from app.services.screener import screener_index
+from app.services.symbol_directory import symbol_directory
+from app.services.upstream import upstream_stats
 
 # 配置日志
 setup_logging()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动和停止后台任务"""
+    tasks = [
+        # 加载股票代码表并每日刷新
+        asyncio.create_task(symbol_directory.run_refresher()),
+        # 本地行情存储变化后重建选股指标表
+        asyncio.create_task(screener_index.run_refresher()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await realtime_hub.close()
+    # 关闭回测进程池
+    await asyncio.to_thread(shutdown_backtest_pool)
+
 # 创建FastAPI应用
 app = FastAPI(
     title="股票分析数据平台",
@@ -27,6 +57,8 @@ app = FastAPI(
         "name": "MIT License",
         "url": "https://opensource.org/licenses/MIT",
     },
+    # 后台任务
+    lifespan=lifespan,
 )
 
 # 配置CORS
@@ -37,6 +69,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 记录请求耗时并加入 Server-Timing 响应头
+app.add_middleware(ServerTimingMiddleware)
 
 # 注册API路由
 app.include_router(api_router)
@@ -92,6 +126,49 @@ async def home():
 async def health_check():
     return {"status": "ok"}
 
+def _cache_stats():
+    """进程内各缓存的统计，供缓存统计路由和 /metrics 使用"""
+    return {
+        "frame_cache": frame_cache.stats(),
+        "symbol_directory": symbol_directory.stats(),
+        "market_snapshot": market_snapshot.stats(),
+        "screener": screener_index.stats(),
+        "live_states": live_states.stats(),
+        "response_cache": response_cache.stats(),
+    }
+
+# 缓存统计路由
+@app.get("/admin/cache/stats")
+async def cache_stats():
+    """返回进程内缓存的命中、未命中、淘汰次数和占用字节数"""
+    return _cache_stats()
+
+@metrics.register_collector
+def _cache_metrics():
+    """有命中统计的缓存的命中、未命中次数和命中率"""
+    caches = {name: stats for name, stats in _cache_stats().items() if "hits" in stats and "misses" in stats}
+    return [
+        ("stock_cache_hits_total", "counter", "缓存命中次数",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("stock_cache_misses_total", "counter", "缓存未命中次数",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("stock_cache_hit_ratio", "gauge", "缓存命中率",
+         [({"cache": name}, stats["hits"] / (stats["hits"] + stats["misses"]) if stats["hits"] + stats["misses"] else 0.0)
+          for name, stats in caches.items()]),
+    ]
+
+# Prometheus 指标路由
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """各处理阶段和HTTP请求的耗时直方图、上游调用和重试次数、缓存命中率，Prometheus 文本格式"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 上游状态路由
+@app.get("/admin/upstream/stats")
+async def upstream_status():
+    """返回上游限流器、熔断器以及实时盘口轮询的状态"""
+    return {**upstream_stats(), "realtime_hub": realtime_hub.stats()}
+
 # 启动应用
 if __name__ == "__main__":
     import uvicorn
@@ -7,6 +7,11 @@ class StockAnalysisRequest(BaseModel):
     start_date: str = Field(..., description="开始日期，格式 'YYYYMMDD'")
     end_date: str = Field(..., description="结束日期，格式 'YYYYMMDD'")
 
+class BatchAnalysisRequest(BaseModel):
+    symbols: List[str] = Field(..., min_length=1, description="股票代码列表，如 ['000895', '600000']")
+    start_date: str = Field(..., description="开始日期，格式 'YYYYMMDD'")
+    end_date: str = Field(..., description="结束日期，格式 'YYYYMMDD'")
+
 class RealtimeDataRequest(BaseModel):
     symbol: str = Field(..., description="股票代码，如 '000895'")
 
@@ -29,7 +34,7 @@ class IndicatorStats(BaseModel):
 
 class IndicatorItem(BaseModel):
     名称: str
-    值: float
+    值: Optional[float]
     信号: str
 
 class OscillatorIndicators(BaseModel):
@@ -46,6 +51,10 @@ class StockAnalysisResponse(BaseModel):
     移动平均线: MovingAverages
     总体统计: IndicatorStats
 
+class BatchAnalysisResponse(BaseModel):
+    results: Dict[str, StockAnalysisResponse] = Field(..., description="分析成功的股票，键为股票代码")
+    errors: Dict[str, str] = Field(..., description="分析失败的股票，键为股票代码，值为错误信息")
+
 class RealtimeDataResponse(BaseModel):
     股票代码: str
     数据时间: str
@@ -80,4 +89,44 @@ class TrendSignalItem(BaseModel):
     MA_bullish: bool = Field(..., description="均线多头排列")
 
 class TrendSignalResponse(BaseModel):
-    signals: List[TrendSignalItem] = Field(..., description="最近5天的技术指标趋势列表")
\ No newline at end of file
+    signals: List[TrendSignalItem] = Field(..., description="最近 lookback 天的技术指标趋势列表，按日期升序")
+    next_cursor: Optional[str] = Field(None, description="下一页的游标，作为 cursor 参数传入；没有下一页时为空")
+
+class ScreenerItem(TrendSignalItem):
+    symbol: str = Field(..., description="股票代码")
+
+class ScreenerResponse(BaseModel):
+    count: int = Field(..., description="满足条件的股票总数")
+    updated_at: Optional[str] = Field(None, description="指标表的构建时间")
+    items: List[ScreenerItem] = Field(..., description="满足条件的股票在最新交易日的指标")
+
+class BacktestRequest(BaseModel):
+    symbols: Optional[List[str]] = Field(None, description="股票代码列表，为空时使用本地存储中的全部股票")
+    signals: Optional[List[str]] = Field(None, description="要回测的信号，为空时回测 MACD_gold_cross、KDJ_gold_cross、RSI_rebound、MA_bullish")
+    start_date: Optional[str] = Field(None, description="开仓开始日期，格式 'YYYYMMDD'")
+    end_date: Optional[str] = Field(None, description="开仓结束日期，格式 'YYYYMMDD'")
+    hold_days: int = Field(5, description="最多持有的交易日数")
+    take_profit: Optional[float] = Field(None, description="止盈比例，如 0.1 表示上涨10%卖出")
+    stop_loss: Optional[float] = Field(None, description="止损比例，如 0.05 表示下跌5%卖出")
+    fee_rate: float = Field(0.0003, description="买卖双向的佣金费率")
+    stamp_tax: float = Field(0.001, description="卖出时的印花税率")
+
+class BacktestSummary(BaseModel):
+    trades: int = Field(..., description="交易笔数")
+    win_rate: Optional[float] = Field(None, description="胜率（扣除费用后收益为正的交易占比）")
+    avg_return: Optional[float] = Field(None, description="单笔平均收益率")
+    median_return: Optional[float] = Field(None, description="单笔收益率中位数")
+    best_return: Optional[float] = Field(None, description="单笔最高收益率")
+    worst_return: Optional[float] = Field(None, description="单笔最低收益率")
+    avg_hold_days: Optional[float] = Field(None, description="平均持有交易日数")
+    total_return: float = Field(..., description="等权组合累计收益率")
+    annual_return: Optional[float] = Field(None, description="等权组合年化收益率")
+    max_drawdown: float = Field(..., description="等权组合最大回撤")
+    sharpe: Optional[float] = Field(None, description="等权组合年化夏普比率（无风险利率为0）")
+
+class BacktestResponse(BaseModel):
+    symbols: int = Field(..., description="参与回测的股票数")
+    start_date: Optional[str] = Field(None, description="开仓开始日期")
+    end_date: Optional[str] = Field(None, description="开仓结束日期")
+    params: Dict[str, Any] = Field(..., description="持有规则和费率")
+    results: Dict[str, BacktestSummary] = Field(..., description="各信号的回测指标，键为信号名")
@@ -0,0 +1,388 @@
+import argparse
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.services import price_store
+from app.services.panel_indicators import build_panel, stage_indicators
+
+# 可以回测的信号：stage_by_tech.get_trend_signals 中的四个信号
+BACKTEST_SIGNALS = ["MACD_gold_cross", "KDJ_gold_cross", "RSI_rebound", "MA_bullish"]
+
+# 年化时每年的交易日数
+TRADING_DAYS_PER_YEAR = 252
+
+class BacktestError(ValueError):
+    """回测参数无效"""
+
+def check_params(signals, hold_days, take_profit=None, stop_loss=None, fee_rate=0.0, stamp_tax=0.0):
+    """
+    检查回测参数，返回要回测的信号列表
+
+    异常:
+    BacktestError: 参数无效
+    """
+    signals = list(signals) if signals else list(BACKTEST_SIGNALS)
+    unknown = [name for name in signals if name not in BACKTEST_SIGNALS]
+    if unknown:
+        raise BacktestError(f"未知的信号: {', '.join(unknown)}，可选: {', '.join(BACKTEST_SIGNALS)}")
+    if hold_days < 1:
+        raise BacktestError("持有天数至少为1")
+    if take_profit is not None and take_profit <= 0:
+        raise BacktestError("止盈比例必须大于0")
+    if stop_loss is not None and not 0 < stop_loss < 1:
+        raise BacktestError("止损比例必须在0和1之间")
+    if fee_rate < 0 or stamp_tax < 0:
+        raise BacktestError("手续费和印花税不能为负")
+    return signals
+
+def simulate_trades(close, signal, n_valid, in_range, params, exit_signal=None):
+    """
+    在压紧后的收盘价上模拟一个信号的全部交易
+
+    信号出现当日以收盘价买入，之后逐日检查止盈止损（以及卖出信号），最多持有 hold_days 个交易日后以收盘价卖出；
+    数据不足时在最后一个交易日卖出。每个信号都独立成交，同一只股票的持仓可以重叠。
+
+    参数:
+    close (ndarray): (T, N) 收盘价，每列的有效数据在前 n_valid 行
+    signal (ndarray): (T, N) 信号
+    n_valid (ndarray): (N,) 每列的有效行数
+    in_range (ndarray): (T, N) 是否在回测区间内（只在区间内开仓）
+    params (dict): 持有规则和费率
+    exit_signal (ndarray): (T, N) 卖出信号，出现当日以收盘价卖出，为None时不使用
+
+    返回:
+    tuple: (开仓行, 开仓列, 持有的交易日数, 扣除费用后的收益率)
+    """
+    hold_days = params["hold_days"]
+    rows = np.arange(close.shape[0])[:, None]
+    # 至少还有一个交易日才能卖出
+    entries = signal & in_range & (rows + 1 < n_valid[None, :])
+    entry_row, entry_col = np.nonzero(entries)
+    if len(entry_row) == 0:
+        return entry_row, entry_col, np.empty(0, dtype=int), np.empty(0)
+
+    # (交易数, hold_days)：买入后每个交易日相对买入价的涨跌幅
+    offsets = np.arange(1, hold_days + 1)
+    path_rows = entry_row[:, None] + offsets[None, :]
+    available = path_rows < n_valid[entry_col][:, None]
+    path = close[np.minimum(path_rows, close.shape[0] - 1), entry_col[:, None]]
+    path = path / close[entry_row, entry_col][:, None] - 1
+
+    exit_hit = ~available
+    # 持有到期或数据用完时卖出
+    exit_hit[:, -1] = True
+    if params["take_profit"] is not None:
+        exit_hit |= available & (path >= params["take_profit"])
+    if params["stop_loss"] is not None:
+        exit_hit |= available & (path <= -params["stop_loss"])
+    if exit_signal is not None:
+        exit_hit |= available & exit_signal[np.minimum(path_rows, close.shape[0] - 1), entry_col[:, None]]
+    first = np.argmax(exit_hit, axis=1)
+    # 第一个不可用的位置表示数据用完，退回到前一个交易日卖出
+    first = np.where(available[np.arange(len(first)), first], first, first - 1)
+
+    gross = path[np.arange(len(first)), first]
+    buy_cost = params["fee_rate"]
+    sell_cost = params["fee_rate"] + params["stamp_tax"]
+    returns = (1 + gross) * (1 - sell_cost) / (1 + buy_cost) - 1
+    return entry_row, entry_col, first + 1, returns
+
+def _daily_returns(close, entry_row, entry_col, held, params):
+    """
+    计算等权组合在每个压紧位置上的收益分子和持仓数
+
+    每笔交易从买入后的第一个交易日到卖出日计入组合，当日收益为收盘价涨跌幅；
+    买入费用计在第一个持有日，卖出费用计在卖出日。组合当日收益 = 分子之和 / 持仓数之和。
+    """
+    steps = close.shape[0]
+    # 差分数组统计每个位置的持仓笔数
+    diff = np.zeros((steps + 1, close.shape[1]))
+    np.add.at(diff, (entry_row + 1, entry_col), 1)
+    np.add.at(diff, (entry_row + held + 1, entry_col), -1)
+    holding = np.cumsum(diff, axis=0)[:steps]
+
+    costs = np.zeros(close.shape)
+    np.add.at(costs, (entry_row + 1, entry_col), params["fee_rate"])
+    np.add.at(costs, (entry_row + held, entry_col), params["fee_rate"] + params["stamp_tax"])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = close / np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]]) - 1
+    numerator = np.where(holding > 0, holding * np.nan_to_num(change) - costs, 0.0)
+    return numerator, holding
+
+def load_compact_history(symbols, start_date=None, end_date=None, adjust="qfq"):
+    """
+    从本地存储读取一组股票的全部历史数据，按股票压紧为 (交易日, 股票) 数组
+
+    与 compute_panel_signals 相同：每只股票的有效数据按时间顺序排在前部，停牌日不参与计算。
+
+    返回:
+    dict: dates（面板的交易日）、symbols、order（压紧位置对应的面板日期下标）、n_valid（每只股票的有效行数）、
+          is_valid（压紧位置是否有数据）、in_range（是否在开仓区间内）以及 close/high/low/volume
+    """
+    frames = {}
+    for symbol in symbols:
+        df, _ = price_store.load_history(symbol, adjust)
+        if not df.empty:
+            frames[symbol] = df
+    panel = build_panel(frames)
+    dates = np.asarray(panel.dates, dtype="datetime64[ns]")
+    if not panel.symbols:
+        return {"dates": dates, "symbols": []}
+
+    valid = panel.valid.T
+    order = np.argsort(~valid, axis=0, kind="stable")
+    history = {
+        field: np.take_along_axis(panel[field].T, order, axis=0)
+        for field in ("close", "high", "low", "volume")
+    }
+    n_valid = valid.sum(axis=0)
+    is_valid = np.arange(len(dates))[:, None] < n_valid[None, :]
+
+    compact_dates = dates[order]
+    in_range = is_valid.copy()
+    if start_date:
+        in_range &= compact_dates >= np.datetime64(pd.Timestamp(start_date))
+    if end_date:
+        in_range &= compact_dates <= np.datetime64(pd.Timestamp(end_date))
+
+    history.update({
+        "dates": dates,
+        "symbols": panel.symbols,
+        "order": order,
+        "n_valid": n_valid,
+        "is_valid": is_valid,
+        "in_range": in_range,
+    })
+    return history
+
+def backtest_chunk(symbols, signals, params, start_date=None, end_date=None, adjust="qfq"):
+    """
+    回测一组股票，可以在子进程中执行
+
+    每只股票读取全部本地历史数据计算指标（保证指标有足够的预热数据），只在 [start_date, end_date] 内开仓。
+
+    返回:
+    dict: dates 为这组股票的交易日，以及每个信号的 returns、held（每笔交易）
+          和 numerator、holding（按交易日汇总的组合收益分子和持仓数）
+    """
+    history = load_compact_history(symbols, start_date, end_date, adjust)
+    dates = history["dates"]
+    result = {"dates": dates, "symbols": len(history["symbols"])}
+    if not history["symbols"]:
+        for name in signals:
+            result[name] = {
+                "returns": np.empty(0), "held": np.empty(0, dtype=int),
+                "numerator": np.empty(0), "holding": np.empty(0),
+            }
+        return result
+
+    indicators = stage_indicators(history["close"], history["high"], history["low"], history["volume"])
+    order, is_valid = history["order"], history["is_valid"]
+    for name in signals:
+        entry_row, entry_col, held, returns = simulate_trades(
+            history["close"], indicators[name] & is_valid, history["n_valid"], history["in_range"], params
+        )
+        numerator, holding = _daily_returns(history["close"], entry_row, entry_col, held, params)
+        # 按交易日汇总到面板的日期轴
+        numerator_by_date = np.zeros(len(dates))
+        holding_by_date = np.zeros(len(dates))
+        np.add.at(numerator_by_date, order[is_valid], numerator[is_valid])
+        np.add.at(holding_by_date, order[is_valid], holding[is_valid])
+        result[name] = {
+            "returns": returns,
+            "held": held,
+            "numerator": numerator_by_date,
+            "holding": holding_by_date,
+        }
+    return result
+
+def _merge(chunks, signals):
+    """合并各组股票的回测结果，组合收益按日期对齐相加"""
+    dates = np.unique(np.concatenate([chunk["dates"] for chunk in chunks]))
+    merged = {"dates": dates, "symbols": sum(chunk["symbols"] for chunk in chunks)}
+    for name in signals:
+        numerator = np.zeros(len(dates))
+        holding = np.zeros(len(dates))
+        for chunk in chunks:
+            columns = np.searchsorted(dates, chunk["dates"])
+            numerator[columns] += chunk[name]["numerator"]
+            holding[columns] += chunk[name]["holding"]
+        merged[name] = {
+            "returns": np.concatenate([chunk[name]["returns"] for chunk in chunks]),
+            "held": np.concatenate([chunk[name]["held"] for chunk in chunks]),
+            "numerator": numerator,
+            "holding": holding,
+        }
+    return merged
+
+def summarize(returns, held, numerator, holding):
+    """
+    计算一个信号的回测指标
+
+    返回:
+    dict: 交易笔数、胜率、单笔收益率统计，以及等权组合的累计收益、年化收益、最大回撤和夏普比率
+    """
+    summary = {"trades": int(len(returns))}
+    if len(returns) == 0:
+        return {
+            **summary, "win_rate": None, "avg_return": None, "median_return": None,
+            "best_return": None, "worst_return": None, "avg_hold_days": None,
+            "total_return": 0.0, "annual_return": None, "max_drawdown": 0.0, "sharpe": None,
+        }
+
+    summary.update({
+        "win_rate": round(float(np.mean(returns > 0)), 4),
+        "avg_return": round(float(np.mean(returns)), 6),
+        "median_return": round(float(np.median(returns)), 6),
+        "best_return": round(float(np.max(returns)), 6),
+        "worst_return": round(float(np.min(returns)), 6),
+        "avg_hold_days": round(float(np.mean(held)), 2),
+    })
+
+    # 等权组合：从第一个持仓日到最后一个持仓日，空仓日收益为0
+    active = np.nonzero(holding > 0)[0]
+    daily = np.divide(numerator, holding, out=np.zeros(len(holding)), where=holding > 0)
+    daily = daily[active[0]:active[-1] + 1]
+    equity = np.cumprod(1 + daily)
+    drawdown = 1 - equity / np.maximum.accumulate(np.maximum(equity, 1.0))
+    total = float(equity[-1] - 1)
+    std = float(np.std(daily, ddof=1)) if len(daily) > 1 else 0.0
+    summary.update({
+        "total_return": round(total, 6),
+        "annual_return": round(float((1 + total) ** (TRADING_DAYS_PER_YEAR / len(daily)) - 1), 6),
+        "max_drawdown": round(float(np.max(drawdown)), 6),
+        "sharpe": round(float(np.mean(daily) / std * np.sqrt(TRADING_DAYS_PER_YEAR)), 4) if std > 0 else None,
+    })
+    return summary
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """返回回测和参数扫描共用的进程池，第一次使用时创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = settings.BACKTEST_WORKERS or os.cpu_count() or 1
+            # 服务进程中有多个线程，用 forkserver 启动子进程，避免 fork 复制线程持有的锁
+            context = multiprocessing.get_context("forkserver")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+def shutdown_pool():
+    """关闭回测和参数扫描共用的进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+def run_backtest(symbols=None, signals=None, start_date=None, end_date=None, hold_days=5,
+                 take_profit=None, stop_loss=None, fee_rate=0.0003, stamp_tax=0.001,
+                 adjust="qfq", parallel=True):
+    """
+    在本地存储的历史数据上回测 stage_by_tech 的信号，不请求上游
+
+    股票按 BACKTEST_CHUNK_SYMBOLS 只一组分给进程池中的多个进程并行计算，只有一组时在当前进程中计算。
+
+    参数:
+    symbols (list): 股票代码列表，为None时使用本地存储中的全部股票
+    signals (list): 要回测的信号，为None时回测全部 BACKTEST_SIGNALS
+    start_date (str): 开仓的开始日期，格式 'YYYYMMDD'，为None时不限制
+    end_date (str): 开仓的结束日期，格式 'YYYYMMDD'，为None时不限制
+    hold_days (int): 最多持有的交易日数
+    take_profit (float): 止盈比例，如 0.1 表示上涨10%卖出，为None时不止盈
+    stop_loss (float): 止损比例，如 0.05 表示下跌5%卖出，为None时不止损
+    fee_rate (float): 买卖双向的佣金费率
+    stamp_tax (float): 卖出时的印花税率
+    adjust (str): 复权类型
+    parallel (bool): 是否使用进程池
+
+    返回:
+    dict: 股票数、回测参数以及每个信号的回测指标
+    """
+    signals = check_params(signals, hold_days, take_profit, stop_loss, fee_rate, stamp_tax)
+    params = {
+        "hold_days": hold_days,
+        "take_profit": take_profit,
+        "stop_loss": stop_loss,
+        "fee_rate": fee_rate,
+        "stamp_tax": stamp_tax,
+    }
+    if symbols is None:
+        symbols = price_store.list_symbols(adjust)
+    symbols = list(dict.fromkeys(symbols))
+
+    size = settings.BACKTEST_CHUNK_SYMBOLS
+    groups = [symbols[i:i + size] for i in range(0, len(symbols), size)] or [[]]
+    logging.info(f"回测 {len(symbols)} 只股票的信号 {', '.join(signals)}，分为 {len(groups)} 组")
+    if parallel and len(groups) > 1:
+        pool = get_pool()
+        futures = [
+            pool.submit(backtest_chunk, group, signals, params, start_date, end_date, adjust)
+            for group in groups
+        ]
+        chunks = [future.result() for future in futures]
+    else:
+        chunks = [backtest_chunk(group, signals, params, start_date, end_date, adjust) for group in groups]
+
+    merged = _merge(chunks, signals)
+    return {
+        "symbols": merged["symbols"],
+        "start_date": start_date,
+        "end_date": end_date,
+        "params": params,
+        "results": {
+            name: summarize(
+                merged[name]["returns"], merged[name]["held"],
+                merged[name]["numerator"], merged[name]["holding"]
+            )
+            for name in signals
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='在本地历史数据上回测趋势信号')
+    parser.add_argument('--symbols', help='股票代码，用逗号分隔，默认使用本地存储中的全部股票', default=None)
+    parser.add_argument('--signals', help='要回测的信号，用逗号分隔，默认全部', default=None)
+    parser.add_argument('--start_date', help='开仓开始日期 (YYYYMMDD)', default=None)
+    parser.add_argument('--end_date', help='开仓结束日期 (YYYYMMDD)', default=None)
+    parser.add_argument('--hold_days', type=int, help='最多持有的交易日数', default=5)
+    parser.add_argument('--take_profit', type=float, help='止盈比例，如 0.1', default=None)
+    parser.add_argument('--stop_loss', type=float, help='止损比例，如 0.05', default=None)
+    parser.add_argument('--fee_rate', type=float, help='双向佣金费率', default=0.0003)
+    parser.add_argument('--stamp_tax', type=float, help='卖出印花税率', default=0.001)
+
+    args = parser.parse_args()
+
+    try:
+        result = run_backtest(
+            args.symbols.split(',') if args.symbols else None,
+            args.signals.split(',') if args.signals else None,
+            args.start_date,
+            args.end_date,
+            args.hold_days,
+            args.take_profit,
+            args.stop_loss,
+            args.fee_rate,
+            args.stamp_tax,
+        )
+    except BacktestError as e:
+        print(f"参数错误: {e}")
+        return
+    finally:
+        shutdown_pool()
+
+    print(f"共回测 {result['symbols']} 只股票")
+    print(pd.DataFrame(result["results"]).T.to_string())
+
+if __name__ == "__main__":
+    main()
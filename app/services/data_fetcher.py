@@ -1,10 +1,16 @@
 import pandas as pd
 import akshare as ak
-import time
+import asyncio
 import urllib3
-import random
 import datetime
+from app.core.config import settings
 from app.core.logging import logging
+from app.core.metrics import timed
+from app.services import price_store
+from app.services.frame_cache import frame_cache
+from app.services.market_calendar import settled_date
+from app.services.market_snapshot import market_snapshot
+from app.services.upstream import CircuitOpenError, call_upstream, upstream_retries
 
 # 尝试导入备选库
 try:
@@ -13,6 +19,14 @@ except ImportError:
     bs = None
 
 def fetch_stock_data(symbol, start_date=None, end_date=None, adjust="qfq", retry_count=3, use_alternative=True):
+    """
+    fetch_stock_data_async 的同步版本，供命令行和脚本使用，不能在事件循环中调用
+    """
+    return asyncio.run(
+        fetch_stock_data_async(symbol, start_date, end_date, adjust, retry_count, use_alternative)
+    )
+
+async def fetch_stock_data_async(symbol, start_date=None, end_date=None, adjust="qfq", retry_count=3, use_alternative=True):
     """
     使用akshare获取股票历史数据，如果失败则尝试使用备选方案
     
@@ -27,6 +41,19 @@ def fetch_stock_data(symbol, start_date=None, end_date=None, adjust="qfq", retry
     返回:
     pandas.DataFrame: 包含股票数据的DataFrame
     """
+    df, _ = await fetch_stock_data_checked(symbol, start_date, end_date, adjust, retry_count, use_alternative)
+    return df
+
+async def fetch_stock_data_checked(symbol, start_date=None, end_date=None, adjust="qfq", retry_count=3, use_alternative=True):
+    """
+    与 fetch_stock_data_async 相同，同时返回数据是否完整覆盖请求区间
+
+    区间有部分补拉失败（如熔断期间只返回本地已有的旧数据）或使用了备选数据源（当日快照）时视为不完整，
+    这样的结果不应被长期缓存。
+
+    返回:
+    tuple: (DataFrame, 是否完整)
+    """
     # 设置默认日期范围
     if start_date is None:
         start_date = (datetime.datetime.now() - datetime.timedelta(days=365)).strftime("%Y%m%d")
@@ -35,28 +62,224 @@ def fetch_stock_data(symbol, start_date=None, end_date=None, adjust="qfq", retry
     
     logging.info(f"开始获取股票 {symbol} 从 {start_date} 到 {end_date} 的数据")
     
-    # 首先尝试使用akshare的stock_zh_a_hist获取数据
-    df = _fetch_with_akshare_hist(symbol, start_date, end_date, adjust, retry_count)
+    # 优先使用进程内缓存，未命中时读本地存储，只用akshare的stock_zh_a_hist补拉缺失的区间
+    with timed("fetch"):
+        # 进程内缓存只在其覆盖区间包含请求区间时命中，命中即为完整
+        df = frame_cache.get(symbol, adjust, start_date, end_date)
+        complete = df is not None
+        if df is None:
+            df, available = await _fetch_with_store(symbol, start_date, end_date, adjust, retry_count)
+            if available is not None and not df.empty:
+                complete = available[0] <= start_date and end_date <= available[1]
+                _cache_settled(symbol, adjust, df, available)
+        if not df.empty:
+            df = _slice_dates(df, start_date, end_date)
     
     # 如果获取失败，尝试使用备选方案
     if df.empty and use_alternative:
         # 尝试使用akshare的stock_zh_a_spot_em获取当日数据
         logging.info(f"尝试使用stock_zh_a_spot_em获取股票 {symbol} 的当日数据")
-        df_spot = _fetch_with_akshare_spot(symbol)
+        df_spot = await _fetch_with_akshare_spot(symbol)
         
         if not df_spot.empty:
-            return df_spot
+            return df_spot, False
     
     if df.empty:
         logging.warning(f"无法获取股票 {symbol} 的数据，所有尝试均失败")
     else:
         logging.info(f"成功获取股票 {symbol} 的数据，共 {len(df)} 条记录")
     
-    return df
+    return df, complete and not df.empty
 
-def _fetch_with_akshare_hist(symbol, start_date, end_date, adjust="qfq", retry_count=3):
+def _cache_settled(symbol, adjust, df, available):
+    """
+    只把已定型的部分写入进程内缓存
+
+    盘中未定型的当日K线不进缓存，覆盖区间也截止到已定型的日期，
+    请求区间包含当日时不会命中缓存，每次都重新获取最新的K线。
+    """
+    settled = settled_date()
+    covered_end = min(available[1], settled)
+    if available[0] > covered_end:
+        return
+    if last_bar_date(df) > settled:
+        df = df[df.index <= datetime.datetime.strptime(settled, "%Y%m%d").date()]
+    if not df.empty:
+        frame_cache.put(symbol, adjust, df, (available[0], covered_end))
+
+def last_bar_date(df):
+    """DataFrame 最后一根K线的日期，格式 'YYYYMMDD'"""
+    return pd.Timestamp(df.index[-1]).strftime("%Y%m%d")
+
+async def _fetch_with_store(symbol, start_date, end_date, adjust="qfq", retry_count=3):
+    """
+    读取本地存储的历史数据，只补拉请求区间中本地尚未覆盖的部分，合并后写回存储
+
+    前复权等数据在除权除息后会整体改写历史价格，补拉时在与本地数据相接的一端多取一根已保存的K线，
+    收盘价不一致说明复权基准已经变化，此时重新获取全部历史并替换本地存储，避免新旧两种基准拼接。
+
+    返回:
+    tuple: (完整的DataFrame, 该DataFrame完整覆盖的日期区间)，
+           有区间补拉失败时覆盖区间只包含本地存储的部分
+    """
+    with timed("store_load"):
+        stored_df, stored_covered = await asyncio.to_thread(price_store.load_history, symbol, adjust)
+    covered = stored_covered
+    settled = settled_date()
+
+    frames = [stored_df]
+    updated = False
+    complete = True
+    for gap_start, gap_end in _missing_ranges(start_date, end_date, covered):
+        # 区间内没有工作日时无需请求上游
+        if _has_weekday(gap_start, gap_end):
+            logging.info(f"补拉股票 {symbol} 从 {gap_start} 到 {gap_end} 的数据")
+            anchor = _anchor_date(stored_df, stored_covered, gap_start, gap_end)
+            fetch_start, fetch_end = gap_start, gap_end
+            if anchor is not None:
+                fetch_start, fetch_end = min(fetch_start, anchor), max(fetch_end, anchor)
+            gap_df = await _fetch_with_akshare_hist(symbol, fetch_start, fetch_end, adjust, retry_count)
+            if gap_df is None:
+                logging.warning(f"补拉股票 {symbol} 从 {gap_start} 到 {gap_end} 的数据失败")
+                complete = False
+                continue
+            if anchor is not None and not _same_close(stored_df, gap_df, anchor):
+                logging.warning(f"股票 {symbol} 的复权价格已变化，重新获取全部历史")
+                return await _refetch_history(
+                    symbol, stored_df, stored_covered, start_date, end_date, adjust, retry_count
+                )
+            if not gap_df.empty:
+                frames.append(gap_df)
+                updated = True
+
+        # 只有已定型的日期才记入覆盖区间，未收盘的当日K线下次仍会重新获取；
+        # 上游成功返回但区间内没有K线（节假日、停牌、上市前）时同样记入，下次不再请求
+        covered = _extend_covered(covered, gap_start, min(gap_end, settled))
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        if covered is not None and covered != stored_covered:
+            # 区间内确实没有K线，只记录覆盖区间
+            with timed("store_save"):
+                await asyncio.to_thread(
+                    price_store.save_history, symbol, adjust, stored_df, covered[0], covered[1]
+                )
+        return pd.DataFrame(), None
+
+    df = frames[0]
+    if updated:
+        df = pd.concat(frames)
+        # 同一日期以新获取的数据为准
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+
+    if covered is not None and covered != stored_covered:
+        with timed("store_save"):
+            await asyncio.to_thread(price_store.save_history, symbol, adjust, df, covered[0], covered[1])
+
+    # 请求区间全部补齐时，可用区间为请求区间与本地覆盖区间的并集；否则只有已覆盖的部分
+    if complete:
+        return df, _extend_covered(stored_covered, start_date, end_date)
+    return df, covered
+
+async def _refetch_history(symbol, stored_df, stored_covered, start_date, end_date, adjust, retry_count):
+    """
+    复权基准变化后重新获取本地已覆盖区间和请求区间的全部历史，替换本地存储
+
+    重新获取失败时只返回本地的旧数据且不给出可用区间，这样的结果不会被缓存，下次请求会再次尝试。
+    """
+    range_start = min(start_date, stored_covered[0])
+    range_end = max(end_date, stored_covered[1])
+    df = await _fetch_with_akshare_hist(symbol, range_start, range_end, adjust, retry_count)
+    if df is None or df.empty:
+        logging.warning(f"重新获取股票 {symbol} 的全部历史失败，暂时使用本地数据")
+        return stored_df, None
+
+    covered = (range_start, min(range_end, settled_date()))
+    with timed("store_save"):
+        await asyncio.to_thread(price_store.save_history, symbol, adjust, df, covered[0], covered[1])
+    return df, (range_start, range_end)
+
+def _anchor_date(stored_df, stored_covered, gap_start, gap_end):
+    """
+    补拉区间与本地数据相接一端的已保存K线日期（'YYYYMMDD'），本地没有K线时返回None
+
+    补拉区间在本地数据之后时取覆盖区间内的最后一根K线，在之前时取第一根；
+    覆盖区间之外的K线（盘中保存的未定型K线）价格还会变化，不能用于比较
+    """
+    if stored_df.empty or stored_covered is None:
+        return None
+    dates = pd.to_datetime(pd.Index(stored_df.index)).strftime("%Y%m%d")
+    dates = dates[(dates >= stored_covered[0]) & (dates <= stored_covered[1])]
+    if dates.empty:
+        return None
+    if gap_start > dates[-1]:
+        return dates[-1]
+    if gap_end < dates[0]:
+        return dates[0]
+    return None
+
+def _same_close(stored_df, fetched_df, date_str):
+    """判断本地和新获取的数据在某日的收盘价是否一致，新数据中缺少这一天时视为不一致"""
+    date = datetime.datetime.strptime(date_str, "%Y%m%d").date()
+    if date not in fetched_df.index:
+        return False
+    stored = float(stored_df.loc[date, "close"])
+    fetched = float(fetched_df.loc[date, "close"])
+    return abs(stored - fetched) <= 1e-6 * max(1.0, abs(stored))
+
+def _missing_ranges(start_date, end_date, covered):
+    """
+    计算请求区间中本地尚未覆盖的部分，返回 [(开始日期, 结束日期), ...]
+    """
+    if covered is None:
+        return [(start_date, end_date)]
+
+    covered_start, covered_end = covered
+    ranges = []
+    if start_date < covered_start:
+        ranges.append((start_date, _shift_date(covered_start, -1)))
+    if end_date > covered_end:
+        # 请求区间与已覆盖区间不相连时也从覆盖终点补起，保证覆盖区间连续
+        ranges.append((_shift_date(covered_end, 1), end_date))
+    return ranges
+
+def _extend_covered(covered, start_date, end_date):
+    """将 [start_date, end_date] 并入已覆盖区间"""
+    if start_date > end_date:
+        return covered
+    if covered is None:
+        return (start_date, end_date)
+    return (min(covered[0], start_date), max(covered[1], end_date))
+
+def _shift_date(date_str, days):
+    """将 'YYYYMMDD' 格式的日期前后移动若干天"""
+    date = datetime.datetime.strptime(date_str, "%Y%m%d") + datetime.timedelta(days=days)
+    return date.strftime("%Y%m%d")
+
+def _has_weekday(start_date, end_date):
+    """判断区间内是否包含工作日"""
+    start = datetime.datetime.strptime(start_date, "%Y%m%d").date()
+    end = datetime.datetime.strptime(end_date, "%Y%m%d").date()
+    if start > end:
+        return False
+    return bool(pd.bdate_range(start, end).size)
+
+def _slice_dates(df, start_date, end_date):
+    """截取 [start_date, end_date] 区间内的数据"""
+    start = datetime.datetime.strptime(start_date, "%Y%m%d").date()
+    end = datetime.datetime.strptime(end_date, "%Y%m%d").date()
+    mask = (df.index >= start) & (df.index <= end)
+    return df[mask]
+
+async def _fetch_with_akshare_hist(symbol, start_date, end_date, adjust="qfq", retry_count=3):
     """
     使用akshare的stock_zh_a_hist获取股票历史数据
+
+    上游成功返回的空结果不是失败：区间内的日期都已定型时直接返回，
+    包含未定型的日期时（数据可能尚未发布）按指数退避重试，用完重试次数后仍返回空结果。
+
+    返回:
+    DataFrame: 以日期为索引的日线数据，可以为空；调用失败（包括熔断）时返回None
     """
     try:
         # 禁用SSL警告
@@ -65,11 +288,9 @@ def _fetch_with_akshare_hist(symbol, start_date, end_date, adjust="qfq", retry_c
         # 添加重试机制
         for attempt in range(retry_count):
             try:
-                # 随机延时，避免被限流
-                time.sleep(random.uniform(1, 3))
-                
-                # 使用akshare获取A股历史数据
-                df = ak.stock_zh_a_hist(
+                # 使用akshare获取A股历史数据（由共享的令牌桶限流）
+                df = await call_upstream(
+                    ak.stock_zh_a_hist,
                     symbol=symbol, 
                     period="daily", 
                     start_date=start_date, 
@@ -93,41 +314,50 @@ def _fetch_with_akshare_hist(symbol, start_date, end_date, adjust="qfq", retry_c
                     df.set_index("date", inplace=True)
                     
                     return df
-                else:
-                    logging.warning(f"尝试 {attempt+1}/{retry_count} 获取股票数据返回空DataFrame")
+
+                if end_date <= settled_date() or attempt + 1 >= retry_count:
+                    logging.info(f"股票 {symbol} 从 {start_date} 到 {end_date} 没有K线")
+                    return pd.DataFrame()
+                logging.warning(f"尝试 {attempt+1}/{retry_count} 获取股票数据返回空DataFrame")
+                upstream_retries.inc("stock_zh_a_hist")
+                await asyncio.sleep(settings.UPSTREAM_RETRY_BACKOFF_SECONDS * 2 ** attempt)
                 
+            except CircuitOpenError as e:
+                # 熔断期间不再重试，由调用方使用本地已有的数据
+                logging.warning(f"获取股票 {symbol} 数据被拒绝: {e}")
+                break
             except Exception as e:
                 logging.error(f"尝试 {attempt+1}/{retry_count} 获取股票数据失败: {e}")
-                time.sleep(random.uniform(2, 5))  # 随机等待2-5秒后重试
+                if attempt + 1 < retry_count:
+                    # 指数退避后重试
+                    upstream_retries.inc("stock_zh_a_hist")
+                    await asyncio.sleep(settings.UPSTREAM_RETRY_BACKOFF_SECONDS * 2 ** attempt)
         
         # 如果所有尝试都失败
-        return pd.DataFrame()
+        return None
         
     except Exception as e:
         logging.error(f"使用akshare获取股票历史数据时出错: {e}")
-        return pd.DataFrame()
+        return None
 
-def _fetch_with_akshare_spot(symbol):
+async def _fetch_with_akshare_spot(symbol):
     """
-    使用akshare的stock_zh_a_spot_em获取股票当日数据
+    从共享的全市场行情快照（stock_zh_a_spot_em）中获取股票当日数据
     """
     try:
-        # 获取所有A股实时行情
-        df_spot_all = ak.stock_zh_a_spot_em()
-        
-        # 筛选指定股票
-        df_spot = df_spot_all[df_spot_all['代码'] == symbol]
+        # 在快照中查找指定股票
+        row = await market_snapshot.get(symbol)
         
-        if not df_spot.empty:
+        if row is not None:
             # 提取需要的列并重命名
             today = datetime.datetime.now().strftime("%Y-%m-%d")
             df_result = pd.DataFrame({
                 'date': [today],
-                'open': [df_spot['开盘'].values[0]],
-                'close': [df_spot['最新价'].values[0]],
-                'high': [df_spot['最高'].values[0]],
-                'low': [df_spot['最低'].values[0]],
-                'volume': [df_spot['成交量'].values[0]]
+                'open': [row['开盘']],
+                'close': [row['最新价']],
+                'high': [row['最高']],
+                'low': [row['最低']],
+                'volume': [row['成交量']]
             })
             
             # 设置日期为索引
@@ -0,0 +1,111 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.services.market_calendar import next_settle_time
+
+class FrameCache:
+    """
+    进程内的行情数据缓存
+
+    以 (股票代码, 复权类型) 为键保存一段连续日期的日线数据，任意子区间的请求
+    都通过切片返回；按总字节数做LRU淘汰，条目在下一次收盘结算时过期。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # key -> (DataFrame, (开始日期, 结束日期), 字节数, 过期时间)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes = 0
+
+    def get(self, symbol, adjust, start_date, end_date):
+        """
+        返回覆盖 [start_date, end_date] 的缓存数据，未命中时返回None
+
+        返回的是缓存中完整的DataFrame，调用方需自行切片，且不能原地修改
+        """
+        key = (symbol, adjust)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and datetime.datetime.now() >= entry[3]:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None or not (entry[1][0] <= start_date and end_date <= entry[1][1]):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, symbol, adjust, df, covered):
+        """
+        写入缓存
+
+        参数:
+        symbol (str): 股票代码
+        adjust (str): 复权类型
+        df (DataFrame): 以日期为索引的日线数据
+        covered (tuple): df 完整覆盖的日期区间 ('YYYYMMDD', 'YYYYMMDD')
+        """
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            logging.warning(f"股票 {symbol} 的数据({nbytes}字节)超过缓存上限，不写入缓存")
+            return
+
+        key = (symbol, adjust)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (df, covered, nbytes, next_settle_time())
+            self.bytes += nbytes
+
+            # 按最近最少使用的顺序淘汰，直到总字节数回到上限以内
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, symbol, adjust=None):
+        """删除某只股票的缓存，adjust为None时删除所有复权类型"""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == symbol and (adjust is None or key[1] == adjust):
+                    self._remove(key)
+
+    def clear(self):
+        """清空缓存（统计计数保留）"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry[2]
+
+# 全局行情缓存
+frame_cache = FrameCache(settings.FRAME_CACHE_MAX_BYTES)
@@ -0,0 +1,248 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.core.logging import logging
+
+# 各指标需要的最少数据条数，与 tech_indicators 中各 calculate_* 函数的检查一致
+MIN_LENGTHS = {
+    "rsi": 15,
+    "stoch": 14,
+    "cci": 20,
+    "adx": 15,
+    "ao": 34,
+    "williams_r": 10,
+    "macd": 35,
+    "stoch_rsi": 31,
+    "cmf": 14,
+    "bbp": 20,
+    "uo": 29,
+}
+
+# 每个最少长度检查对应的指标
+_GUARDED_KEYS = {
+    "rsi": ["rsi"],
+    "stoch": ["stoch_k", "stoch_d"],
+    "cci": ["cci"],
+    "adx": ["adx"],
+    "ao": ["ao"],
+    "williams_r": ["williams_r"],
+    "macd": ["macd", "macd_signal", "macd_hist"],
+    "stoch_rsi": ["stoch_rsi_k", "stoch_rsi_d"],
+    "cmf": ["cmf"],
+    "bbp": ["bbp"],
+    "uo": ["uo"],
+}
+
+# 移动平均线周期
+MA_PERIODS = [10, 20, 30, 50, 100, 200]
+
+def shift(values, periods=1):
+    """沿时间维（第0维）平移，空出的位置填NaN，等价于 pandas shift"""
+    out = np.full(values.shape, np.nan)
+    if periods < values.shape[0]:
+        out[periods:] = values[:-periods]
+    return out
+
+def rolling(values, window, reducer):
+    """
+    沿时间维做滚动窗口计算，等价于 pandas rolling(window)（min_periods=window）
+
+    参数:
+    values (ndarray): 形状为 (T,) 或 (T, N) 的数组
+    window (int): 窗口长度
+    reducer (callable): 形如 np.sum(array, axis=-1) 的归约函数
+
+    返回:
+    ndarray: 与 values 形状相同，前 window-1 个位置为NaN，窗口内有NaN时结果为NaN
+    """
+    out = np.full(values.shape, np.nan)
+    if window <= values.shape[0]:
+        windows = sliding_window_view(values, window, axis=0)
+        out[window - 1:] = reducer(windows, axis=-1)
+    return out
+
+def rolling_sum(values, window):
+    return rolling(values, window, np.sum)
+
+def rolling_mean(values, window):
+    return rolling(values, window, np.mean)
+
+def rolling_min(values, window):
+    return rolling(values, window, np.min)
+
+def rolling_max(values, window):
+    return rolling(values, window, np.max)
+
+def rolling_std(values, window):
+    return rolling(values, window, lambda w, axis: np.std(w, axis=axis, ddof=1))
+
+def ewm_mean(values, adjust=False, **kwargs):
+    """
+    指数加权平均，参数同 pandas ewm（span/com/alpha/min_periods/adjust），默认 adjust=False
+
+    递推式无法用纯NumPy向量化且保持结果一致，这里直接调用 pandas 编译好的 ewm 实现，
+    (T, N) 数组按列一次算完，没有Python层面的逐行循环。
+    """
+    frame = pd.DataFrame(values) if values.ndim == 2 else pd.Series(values)
+    return frame.ewm(adjust=adjust, **kwargs).mean().to_numpy()
+
+def gains_losses(close):
+    """返回收盘价变动中的上涨和下跌部分，首个位置为0，与 Series.where 的写法一致"""
+    delta = close - shift(close)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    return gain, loss
+
+def true_range(high, low, prev_close):
+    """真实波幅：max(最高-最低, |最高-昨收|, |最低-昨收|)，忽略NaN"""
+    return np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+def compute_indicators(high, low, close, volume):
+    """
+    一次性计算 tech_indicators 中用到的全部指标
+
+    真实波幅、RSI、昨收等中间结果只算一次，在多个指标之间共享。
+
+    参数:
+    high, low, close, volume (ndarray): 形状为 (T,) 的浮点数组
+
+    返回:
+    dict: 指标名到完整序列的映射
+    """
+    # 与 pandas 一致，除以零得到 inf/NaN 而不报警告
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _compute_indicators(high, low, close, volume)
+
+def _compute_indicators(high, low, close, volume):
+    prev_close = shift(close)
+    high_diff = high - shift(high)
+    low_diff = low - shift(low)
+    tr = true_range(high, low, prev_close)
+    result = {}
+
+    # RSI(14)，随机RSI复用同一条RSI；与 calculate_rsi 一致使用 adjust=True
+    gain, loss = gains_losses(close)
+    avg_gain = ewm_mean(gain, adjust=True, com=13, min_periods=14)
+    avg_loss = ewm_mean(loss, adjust=True, com=13, min_periods=14)
+    avg_loss = np.where(avg_loss == 0, 0.000001, avg_loss)
+    rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+    result["rsi"] = rsi
+
+    # Stochastic(14, 3, 3)
+    low_min = rolling_min(low, 14)
+    high_max = rolling_max(high, 14)
+    stoch_k = rolling_mean(100 * ((close - low_min) / (high_max - low_min)), 3)
+    result["stoch_k"] = stoch_k
+    result["stoch_d"] = rolling_mean(stoch_k, 3)
+
+    # CCI(20)
+    tp = (high + low + close) / 3
+    tp_ma = rolling_mean(tp, 20)
+    md = rolling_mean(np.abs(tp - tp_ma), 20)
+    md = np.where(md == 0, 0.000001, md)
+    result["cci"] = (tp - tp_ma) / (0.015 * md)
+
+    # ADX(14)
+    plus_dm = np.where((high_diff > 0) & (high_diff > -low_diff), high_diff, 0.0)
+    minus_dm = np.where((low_diff < 0) & (-low_diff > high_diff), -low_diff, 0.0)
+    smoothed_tr = rolling_sum(tr, 14)
+    plus_di = 100 * (rolling_sum(plus_dm, 14) / smoothed_tr)
+    minus_di = 100 * (rolling_sum(minus_dm, 14) / smoothed_tr)
+    dx = 100 * (np.abs(plus_di - minus_di) / (plus_di + minus_di))
+    result["adx"] = rolling_mean(dx, 14)
+
+    # AO
+    median_price = (high + low) / 2
+    result["ao"] = rolling_mean(median_price, 5) - rolling_mean(median_price, 34)
+
+    # Williams %R(10)
+    highest_high = rolling_max(high, 10)
+    lowest_low = rolling_min(low, 10)
+    result["williams_r"] = -100 * ((highest_high - close) / (highest_high - lowest_low))
+
+    # MACD(12, 26, 9)
+    macd_line = ewm_mean(close, span=12) - ewm_mean(close, span=26)
+    signal_line = ewm_mean(macd_line, span=9)
+    result["macd"] = macd_line
+    result["macd_signal"] = signal_line
+    result["macd_hist"] = macd_line - signal_line
+
+    # Stochastic RSI(3, 3, 14, 14)
+    rsi_min = rolling_min(rsi, 14)
+    rsi_max = rolling_max(rsi, 14)
+    stoch_rsi = 100 * ((rsi - rsi_min) / (rsi_max - rsi_min))
+    stoch_rsi_k = rolling_mean(stoch_rsi, 3)
+    result["stoch_rsi_k"] = stoch_rsi_k
+    result["stoch_rsi_d"] = rolling_mean(stoch_rsi_k, 3)
+
+    # Chaikin Money Flow(14)
+    mfm = ((close - low) - (high - close)) / (high - low)
+    mfm = np.where(np.isinf(mfm), 0.0, mfm)
+    result["cmf"] = rolling_sum(mfm * volume, 14) / rolling_sum(volume, 14)
+
+    # Bollinger Bands %B(20)
+    sma20 = rolling_mean(close, 20)
+    std20 = rolling_std(close, 20)
+    upper_band = sma20 + (2 * std20)
+    lower_band = sma20 - (2 * std20)
+    result["bbp"] = (close - lower_band) / (upper_band - lower_band)
+
+    # Ultimate Oscillator(7, 14, 28)，与ADX共享真实波幅
+    bp = close - np.fmin(low, prev_close)
+    avg7 = rolling_sum(bp, 7) / rolling_sum(tr, 7)
+    avg14 = rolling_sum(bp, 14) / rolling_sum(tr, 14)
+    avg28 = rolling_sum(bp, 28) / rolling_sum(tr, 28)
+    result["uo"] = 100 * ((4 * avg7) + (2 * avg14) + avg28) / 7
+
+    # 移动平均线
+    for period in MA_PERIODS:
+        result[f"sma_{period}"] = rolling_mean(close, period)
+        result[f"ema_{period}"] = ewm_mean(close, span=period)
+
+    return result
+
+def latest_indicator_values(data):
+    """
+    计算全部指标并返回最新一根K线上的值
+
+    数据长度不足的指标返回NaN，与 tech_indicators 中各函数的行为一致。
+
+    参数:
+    data (DataFrame): 包含 high、low、close、volume 列
+
+    返回:
+    dict: 指标名到最新值的映射
+    """
+    series = compute_indicators(
+        data["high"].to_numpy(dtype=float),
+        data["low"].to_numpy(dtype=float),
+        data["close"].to_numpy(dtype=float),
+        data["volume"].to_numpy(dtype=float),
+    )
+    values = {name: column[-1] for name, column in series.items()}
+    return apply_min_lengths(values, len(data))
+
+def apply_min_lengths(values, length):
+    """
+    数据长度不足的指标置为NaN，与 tech_indicators 中各函数的行为一致
+
+    参数:
+    values (dict): 指标名到最新值的映射，原地修改
+    length (int): 参与计算的K线条数
+
+    返回:
+    dict: 修改后的 values
+    """
+    insufficient = [name for name, min_length in MIN_LENGTHS.items() if length < min_length]
+    if insufficient:
+        logging.warning(f"数据长度({length})不足以计算: {', '.join(insufficient)}")
+    for name in insufficient:
+        for key in _GUARDED_KEYS[name]:
+            if key in values:
+                values[key] = float("nan")
+    for period in MA_PERIODS:
+        if length < period:
+            values[f"sma_{period}"] = float("nan")
+            values[f"ema_{period}"] = float("nan")
+    return values
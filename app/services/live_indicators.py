@@ -0,0 +1,254 @@
+import asyncio
+import datetime
+import threading
+from collections import OrderedDict
+
+import akshare as ak
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.services import price_store
+from app.services.data_fetcher import fetch_stock_data_async
+from app.services.indicator_engine import MA_PERIODS, apply_min_lengths, compute_indicators
+from app.services.market_calendar import has_provisional_bar, settled_date
+from app.services.market_snapshot import market_snapshot
+from app.services.online_indicators import advance_state, restore_state
+from app.services.stage_by_tech import format_signal_item, get_trend_signals
+from app.services.upstream import call_upstream
+
+# 计算有限窗口指标时使用的尾部K线数，需覆盖最长的窗口链（CCI 20+20、ADX 1+14+14、AO 34）
+LIVE_TAIL_BARS = 64
+
+# 依赖全部历史（EMA类）的指标，由递推状态给出
+_STATE_KEYS = (
+    ["rsi", "stoch_rsi_k", "stoch_rsi_d", "macd", "macd_signal", "macd_hist"]
+    + [f"sma_{period}" for period in MA_PERIODS]
+    + [f"ema_{period}" for period in MA_PERIODS]
+)
+
+class LiveStateCache:
+    """
+    进程内的指标递推状态缓存
+
+    每只股票的状态推进到已定型的最后一根K线；盘中每次轮询只在状态的副本上
+    加入一根临时K线，不重算历史。缓存未命中时先读本地保存的状态，再不行才从头递推。
+
+    EMA类指标与递推起点有关，状态按 (股票代码, 复权类型, 历史数据的第一个日期) 分别保存，
+    不同开始日期的请求各自增量递推，不会互相触发重建。每个键有自己的锁，
+    全局锁只保护字典本身，递推和读写文件时不阻塞其他股票。
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._states = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def compute(self, symbol, adjust, history, bar=None, date=None):
+        """
+        返回最近几根K线的指标，以及加入临时K线后的指标
+
+        参数:
+        symbol (str): 股票代码
+        adjust (str): 复权类型
+        history (DataFrame): 已定型的日线数据
+        bar (dict): 临时K线（open/high/low/close/volume），为None时不加入
+        date (str): 临时K线的日期，格式 'YYYYMMDD'
+
+        返回:
+        tuple: (最近K线的 [(日期, 指标), ...], 临时K线的指标或None)
+        """
+        key = (symbol, adjust, pd.Timestamp(history.index[0]).strftime("%Y%m%d"))
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                state = self._states.pop(key, None)
+                if state is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if state is None:
+                state = restore_state(symbol, adjust)
+                if state is not None and state.first_date != key[2]:
+                    # 本地状态属于另一个起点，不能用于增量递推
+                    state = None
+            state, changed = advance_state(state, history)
+            if changed:
+                _persist_state(symbol, adjust, state)
+
+            recent = list(state.recent)
+            row = None
+            if bar is not None:
+                row = state.preview(bar["close"], bar["high"], bar["low"], bar["volume"], date)
+
+            with self._lock:
+                self._states[key] = state
+                while len(self._states) > self.max_entries:
+                    evicted, _ = self._states.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+        return recent, row
+
+    def stats(self):
+        return {
+            "entries": len(self._states),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+def _persist_state(symbol, adjust, state):
+    """
+    保存推进后的状态
+
+    本地只保存一份状态，与 online_indicators.load_indicator_state 共用；
+    已保存的状态属于另一个起点时不覆盖，避免不同开始日期的请求轮流改写。
+    """
+    saved = price_store.load_state(symbol, adjust)
+    if saved is not None and saved.get("first_date") != state.first_date:
+        return
+    price_store.save_state(symbol, adjust, state.to_dict())
+
+async def fetch_live_bar(symbol):
+    """
+    用实时行情构造当日的临时K线
+
+    优先使用个股盘口（stock_bid_ask_em），失败时使用共享的全市场快照；
+    没有有效的最新价或今开（如未开盘、停牌）时返回None。
+    """
+    try:
+        df = await call_upstream(ak.stock_bid_ask_em, symbol=symbol)
+        quote = dict(zip(df["item"], df["value"]))
+        bar = {
+            "open": quote["今开"],
+            "high": quote["最高"],
+            "low": quote["最低"],
+            "close": quote["最新"],
+            "volume": quote["总手"],
+        }
+    except Exception as e:
+        logging.warning(f"获取股票 {symbol} 的盘口数据失败，改用全市场快照: {e}")
+        row = await market_snapshot.get(symbol)
+        if row is None:
+            return None
+        bar = {
+            "open": row["开盘"],
+            "high": row["最高"],
+            "low": row["最低"],
+            "close": row["最新价"],
+            "volume": row["成交量"],
+        }
+
+    try:
+        bar = {name: float(value) for name, value in bar.items()}
+    except (TypeError, ValueError):
+        return None
+    # 未开盘或停牌时今开为0或缺失，不构造临时K线
+    if not (bar["close"] > 0 and bar["open"] > 0):
+        return None
+    return bar
+
+def is_stale_bar(bar, history):
+    """
+    判断实时行情是否只是最后一个交易日的旧数据
+
+    盘口和快照都不带交易日期；没有节假日数据时，工作日休市期间的行情仍是上一个交易日的，
+    与历史数据最后一根K线完全相同，这样的行情不能当作当日K线。
+    """
+    last = history.iloc[-1]
+    return all(
+        abs(bar[name] - float(last[name])) <= 1e-6 * max(1.0, abs(bar[name]))
+        for name in ("open", "high", "low", "close", "volume")
+    )
+
+async def _load_live(symbol, start_date, adjust):
+    """
+    读取已定型的历史数据，并在盘中加入当日的临时K线
+
+    历史数据只请求到已定型的日期，覆盖区间完整后后续轮询都命中缓存，不会重复请求上游。
+
+    返回:
+    tuple: (历史DataFrame, 临时K线或None, 最近K线的指标, 临时K线的指标或None)
+    """
+    history = await fetch_stock_data_async(symbol, start_date, settled_date(), adjust, use_alternative=False)
+    if history.empty:
+        return history, None, [], None
+
+    bar = None
+    today = datetime.date.today()
+    if has_provisional_bar() and history.index[-1] < today:
+        bar = await fetch_live_bar(symbol)
+        if bar is not None and is_stale_bar(bar, history):
+            logging.info(f"股票 {symbol} 的实时行情与最后一根K线相同，今日可能休市")
+            bar = None
+
+    recent, row = await asyncio.to_thread(
+        live_states.compute, symbol, adjust, history, bar, today.strftime("%Y%m%d")
+    )
+    return history, bar, recent, row
+
+async def live_trend_signals(symbol, start_date, adjust="qfq", lookback=5):
+    """
+    盘中模式的趋势信号：最近 lookback 根K线，最后一根为当日的临时K线
+
+    返回格式与 stage_by_tech.get_trend_signals 相同；不在交易时段时只返回已定型的K线。
+    lookback 不超过递推状态中保存的K线数时直接取状态中的指标，否则在历史数据加上临时K线后整体计算。
+    """
+    history, bar, recent, row = await _load_live(symbol, start_date, adjust)
+    if row is not None:
+        recent = recent + [(datetime.date.today().strftime("%Y%m%d"), row)]
+
+    if lookback is not None and lookback <= len(recent):
+        return [
+            format_signal_item(pd.Timestamp(date).strftime("%Y-%m-%d"), values)
+            for date, values in recent[-lookback:]
+        ]
+
+    data = history
+    if row is not None:
+        provisional = pd.DataFrame([bar], index=pd.Index([datetime.date.today()], name="date"))
+        data = pd.concat([history, provisional])
+    if data.empty:
+        return []
+    return await asyncio.to_thread(get_trend_signals, data, lookback)
+
+async def live_stock_data(symbol, start_date, adjust="qfq"):
+    """
+    盘中模式的分析数据：历史数据加上当日临时K线，以及该K线上的全部指标
+
+    依赖全部历史的指标取自递推状态；其余有限窗口的指标只在最后 LIVE_TAIL_BARS 根K线上计算。
+
+    返回:
+    tuple: (DataFrame, indicator_engine.latest_indicator_values 格式的指标)；
+           没有数据时返回 (空DataFrame, None)
+    """
+    history, bar, recent, row = await _load_live(symbol, start_date, adjust)
+    if history.empty or not recent:
+        return history, None
+
+    data = history
+    if row is not None:
+        provisional = pd.DataFrame([bar], index=pd.Index([datetime.date.today()], name="date"))
+        data = pd.concat([history, provisional])
+    else:
+        row = recent[-1][1]
+
+    tail = data.iloc[-LIVE_TAIL_BARS:]
+    series = await asyncio.to_thread(
+        compute_indicators,
+        tail["high"].to_numpy(dtype=float),
+        tail["low"].to_numpy(dtype=float),
+        tail["close"].to_numpy(dtype=float),
+        tail["volume"].to_numpy(dtype=float),
+    )
+    values = {name: column[-1] for name, column in series.items()}
+    for name in _STATE_KEYS:
+        values[name] = row[name]
+    return data, apply_min_lengths(values, len(data))
+
+# 全局递推状态缓存
+live_states = LiveStateCache(settings.LIVE_STATE_CACHE_SIZE)
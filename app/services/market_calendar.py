@@ -0,0 +1,50 @@
+import datetime
+
+from app.core.config import settings
+
+# A股开盘、收盘时间
+MARKET_OPEN = datetime.time(9, 30)
+MARKET_CLOSE = datetime.time(15, 0)
+
+def settle_time(date):
+    """返回某日K线定型的时间：收盘后再等待 BAR_SETTLE_MINUTES 分钟"""
+    close = datetime.datetime.combine(date, MARKET_CLOSE)
+    return close + datetime.timedelta(minutes=settings.BAR_SETTLE_MINUTES)
+
+def settled_date(now=None):
+    """返回K线已定型的最近日期（'YYYYMMDD'）：收盘结算后为当日，否则为前一日"""
+    now = now or datetime.datetime.now()
+    if now >= settle_time(now.date()):
+        return now.strftime("%Y%m%d")
+    return (now - datetime.timedelta(days=1)).strftime("%Y%m%d")
+
+def next_settle_time(now=None):
+    """返回下一个交易日（工作日）K线定型的时间，用于缓存过期"""
+    now = now or datetime.datetime.now()
+    date = now.date()
+    while date.weekday() >= 5 or now >= settle_time(date):
+        date += datetime.timedelta(days=1)
+        now = datetime.datetime.combine(date, datetime.time.min)
+    return settle_time(date)
+
+def has_provisional_bar(now=None):
+    """
+    当前是否处于当日K线已开始但尚未定型的时段（工作日开盘后到定型前）
+
+    没有节假日数据，节假日按工作日处理
+    """
+    now = now or datetime.datetime.now()
+    if now.weekday() >= 5:
+        return False
+    return now.time() >= MARKET_OPEN and now < settle_time(now.date())
+
+def last_trading_date(now=None):
+    """
+    返回K线已定型的最近一个交易日（'YYYYMMDD'），周末回退到周五
+
+    没有节假日数据，节假日按工作日处理
+    """
+    date = datetime.datetime.strptime(settled_date(now), "%Y%m%d").date()
+    while date.weekday() >= 5:
+        date -= datetime.timedelta(days=1)
+    return date.strftime("%Y%m%d")
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import akshare as ak
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.services.upstream import call_upstream
+
+class MarketSnapshot:
+    """
+    全市场实时行情快照
+
+    ak.stock_zh_a_spot_em 每次都会下载整个市场的行情，这里在进程内共享一份
+    以 '代码' 为索引的快照，ttl 秒内的查询都直接读字典；同一时间最多只有一个刷新请求。
+    """
+
+    def __init__(self, ttl, max_age):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.refreshes = 0
+        self.failures = 0
+        self.expired = 0
+        self._rows = {}
+        self._fetched_at = None
+        # 最近一次刷新成功的时间，快照的实际年龄以它为准
+        self._updated_at = None
+        self._refresh_task = None
+
+    async def get(self, symbol):
+        """
+        返回某只股票的行情（列名到值的字典），快照中没有时返回None
+
+        刷新失败时继续使用旧快照，直到下一个 ttl 周期再重试；
+        旧快照超过 max_age 秒后不再返回，避免上游长时间故障时把几天前的行情当作当日数据
+        """
+        if self._is_stale():
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh())
+            # shield：某个请求被取消时不影响其他等待同一次刷新的请求
+            await asyncio.shield(self._refresh_task)
+        if self._updated_at is None:
+            return None
+        if time.monotonic() - self._updated_at > self.max_age:
+            self.expired += 1
+            return None
+        return self._rows.get(symbol)
+
+    def stats(self):
+        age = None if self._updated_at is None else round(time.monotonic() - self._updated_at, 1)
+        return {
+            "symbols": len(self._rows),
+            "age_seconds": age,
+            "ttl": self.ttl,
+            "max_age": self.max_age,
+            "expired": self.expired,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+    def _is_stale(self):
+        return self._fetched_at is None or time.monotonic() - self._fetched_at >= self.ttl
+
+    async def _refresh(self):
+        try:
+            df = await call_upstream(ak.stock_zh_a_spot_em)
+            self._rows = df.drop_duplicates("代码").set_index("代码").to_dict("index")
+            self._updated_at = time.monotonic()
+            self.refreshes += 1
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"刷新全市场行情快照失败: {e}")
+        finally:
+            # 失败也记录时间，避免上游故障期间每个请求都重新下载
+            self._fetched_at = time.monotonic()
+
+# 全局行情快照
+market_snapshot = MarketSnapshot(
+    settings.MARKET_SNAPSHOT_TTL_SECONDS, settings.MARKET_SNAPSHOT_MAX_AGE_SECONDS
+)
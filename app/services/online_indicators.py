@@ -0,0 +1,404 @@
+import copy
+import math
+from collections import deque
+
+import pandas as pd
+
+from app.core.logging import logging
+from app.services import price_store
+from app.services.indicator_engine import MA_PERIODS
+
+class _Component:
+    """可序列化的递推状态：属性原样写入字典，deque 转为列表"""
+
+    def to_dict(self):
+        return {
+            name: list(value) if isinstance(value, deque) else value
+            for name, value in vars(self).items()
+        }
+
+    def load(self, data):
+        for name, value in data.items():
+            current = getattr(self, name)
+            if isinstance(current, deque):
+                value = deque(
+                    (tuple(item) if isinstance(item, list) else item for item in value),
+                    maxlen=current.maxlen,
+                )
+            setattr(self, name, value)
+        return self
+
+class EWMean(_Component):
+    """
+    pandas ewm(...).mean() 的逐条递推版本
+
+    按 pandas 的 ewm 实现逐步照搬（包括NaN的处理和常数序列的特判），
+    结果与批量计算逐位一致。参数同 pandas：span/com/alpha 三选一。
+    """
+
+    def __init__(self, span=None, com=None, alpha=None, adjust=False, min_periods=0):
+        # 与 pandas 一样先换算成质心，再由质心得到 alpha
+        if span is not None:
+            com = (span - 1) / 2
+        elif alpha is not None:
+            com = (1 - alpha) / alpha
+        self.alpha = 1. / (1. + float(com))
+        self.adjust = adjust
+        self.min_periods = max(int(min_periods), 1)
+        self.weighted = math.nan
+        self.old_wt = 1.
+        self.nobs = 0
+
+    def update(self, value):
+        is_observation = value == value
+        self.nobs += is_observation
+        if self.weighted == self.weighted:
+            self.old_wt *= 1. - self.alpha
+            if is_observation:
+                new_wt = 1. if self.adjust else self.alpha
+                # 常数序列保持原值，避免浮点误差
+                if self.weighted != value:
+                    self.weighted = self.old_wt * self.weighted + new_wt * value
+                    self.weighted /= (self.old_wt + new_wt)
+                if self.adjust:
+                    self.old_wt += new_wt
+                else:
+                    self.old_wt = 1.
+        elif is_observation:
+            self.weighted = value
+        return self.weighted if self.nobs >= self.min_periods else math.nan
+
+class RollingMean(_Component):
+    """
+    pandas rolling(window).mean() 的逐条递推版本
+
+    与 pandas 一样用带补偿的累加和增删窗口两端的值，每根K线只做常数次运算。
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.sum = 0.
+        self.compensation_add = 0.
+        self.compensation_remove = 0.
+        self.nobs = 0
+        self.neg_ct = 0
+        self.same_count = 0
+        self.prev_value = None
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            self._remove(self.values[0])
+        self.values.append(value)
+        self._add(value)
+
+        if self.nobs < self.window:
+            return math.nan
+        result = self.sum / self.nobs
+        if self.same_count >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.
+        return result
+
+    def _add(self, value):
+        if self.prev_value is None:
+            self.prev_value = value
+        if value != value:
+            return
+        self.nobs += 1
+        y = value - self.compensation_add
+        t = self.sum + y
+        self.compensation_add = t - self.sum - y
+        self.sum = t
+        if math.copysign(1., value) < 0:
+            self.neg_ct += 1
+        if value == self.prev_value:
+            self.same_count += 1
+        else:
+            self.same_count = 1
+        self.prev_value = value
+
+    def _remove(self, value):
+        if value != value:
+            return
+        self.nobs -= 1
+        y = -value - self.compensation_remove
+        t = self.sum + y
+        self.compensation_remove = t - self.sum - y
+        self.sum = t
+        if math.copysign(1., value) < 0:
+            self.neg_ct -= 1
+
+class RollingExtreme(_Component):
+    """
+    pandas rolling(window).min()/max() 的逐条递推版本
+
+    单调队列中只保留可能成为极值的 (序号, 值)，每根K线均摊常数时间。
+    """
+
+    def __init__(self, window, is_max):
+        self.window = window
+        self.is_max = is_max
+        self.queue = deque()
+        self.recent = deque(maxlen=window)
+        self.seq = 0
+        self.nobs = 0
+
+    def update(self, value):
+        if len(self.recent) == self.window and self.recent[0] == self.recent[0]:
+            self.nobs -= 1
+        self.recent.append(value)
+
+        if value == value:
+            self.nobs += 1
+            key = value
+        else:
+            key = -math.inf if self.is_max else math.inf
+        while self.queue:
+            back = self.queue[-1][1]
+            if back != back or (key >= back if self.is_max else key <= back):
+                self.queue.pop()
+            else:
+                break
+        self.queue.append((self.seq, value))
+        # 移出窗口左侧的元素
+        while self.queue[0][0] <= self.seq - self.window:
+            self.queue.popleft()
+        self.seq += 1
+
+        return self.queue[0][1] if self.nobs >= self.window else math.nan
+
+def _divide(a, b):
+    """按 IEEE 规则做除法：除以零得到 inf 或 NaN，与 pandas/NumPy 一致"""
+    if b == 0:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1., b)
+    return a / b
+
+# stage_by_tech 中RSI的周期
+STAGE_RSI_PERIODS = (6, 12, 24)
+# stage_by_tech 中均线和均量的周期
+STAGE_MA_WINDOWS = (5, 10, 20)
+STAGE_VOL_MA_WINDOWS = (5, 10)
+# 状态中保留最近几根K线的指标，与 get_trend_signals 返回的条数一致
+RECENT_BARS = 5
+
+class IndicatorState:
+    """
+    单只股票的指标递推状态
+
+    覆盖 stage_by_tech 的RSI、KDJ、MACD、均线和均量，以及 tech_indicators 的
+    RSI(14)、随机RSI、MACD 和各周期 SMA/EMA。每来一根K线调用一次 update，计算量与历史长度无关；
+    preview 在副本上推进，用于盘中尚未定型的K线。
+    """
+
+    def __init__(self):
+        self.first_date = None
+        self.last_date = None
+        self.bars = 0
+        self.prev_close = math.nan
+        # 上一根K线的指标，用于判断金叉和反弹
+        self.prev = {"DIF": math.nan, "DEA": math.nan, "K": math.nan, "D": math.nan, "RSI6": math.nan}
+        # 最近几根K线的 (日期, 指标)
+        self.recent = deque(maxlen=RECENT_BARS)
+
+        components = {}
+        for period in STAGE_RSI_PERIODS:
+            components[f"gain_{period}"] = RollingMean(period)
+            components[f"loss_{period}"] = RollingMean(period)
+        components["low_min"] = RollingExtreme(9, is_max=False)
+        components["high_max"] = RollingExtreme(9, is_max=True)
+        components["k"] = EWMean(alpha=1 / 3)
+        components["d"] = EWMean(alpha=1 / 3)
+        components["ema12"] = EWMean(span=12)
+        components["ema26"] = EWMean(span=26)
+        components["dea"] = EWMean(span=9)
+        for window in STAGE_MA_WINDOWS:
+            components[f"ma_{window}"] = RollingMean(window)
+        for window in STAGE_VOL_MA_WINDOWS:
+            components[f"vol_ma_{window}"] = RollingMean(window)
+        # tech_indicators.calculate_rsi 使用 adjust=True 的EMA
+        components["rsi_gain"] = EWMean(com=13, adjust=True, min_periods=14)
+        components["rsi_loss"] = EWMean(com=13, adjust=True, min_periods=14)
+        components["rsi_min"] = RollingExtreme(14, is_max=False)
+        components["rsi_max"] = RollingExtreme(14, is_max=True)
+        components["stoch_rsi_k"] = RollingMean(3)
+        components["stoch_rsi_d"] = RollingMean(3)
+        for period in MA_PERIODS:
+            components[f"sma_{period}"] = RollingMean(period)
+            components[f"ema_{period}"] = EWMean(span=period)
+        self.components = components
+
+    def update(self, close, high, low, volume, date=None):
+        """
+        加入一根新K线并返回它的指标
+
+        返回:
+        dict: TrendSignalItem 中的字段（日期除外，数值缺失为NaN），
+              以及 rsi、stoch_rsi_k、stoch_rsi_d、macd、macd_signal、macd_hist、
+              sma_{周期}、ema_{周期}
+        """
+        c = self.components
+        close, high, low, volume = float(close), float(high), float(low), float(volume)
+        row = {"close": close, "volume": volume}
+
+        # 涨跌幅，与 Series.where 一致：首根为0，跌幅中的0为 -0.0
+        delta = close - self.prev_close
+        gain = delta if delta > 0 else 0.
+        loss = -(delta if delta < 0 else 0.)
+
+        for period in STAGE_RSI_PERIODS:
+            rs = _divide(c[f"gain_{period}"].update(gain), c[f"loss_{period}"].update(loss))
+            row[f"RSI{period}"] = 100 - (100 / (1 + rs))
+
+        low_min = c["low_min"].update(low)
+        high_max = c["high_max"].update(high)
+        rsv = _divide(close - low_min, high_max - low_min) * 100
+        k = c["k"].update(rsv)
+        d = c["d"].update(k)
+        row["K"], row["D"], row["J"] = k, d, 3 * k - 2 * d
+
+        dif = c["ema12"].update(close) - c["ema26"].update(close)
+        dea = c["dea"].update(dif)
+        row["DIF"], row["DEA"], row["MACD_HIST"] = dif, dea, dif - dea
+
+        for window in STAGE_MA_WINDOWS:
+            row[f"MA{window}"] = c[f"ma_{window}"].update(close)
+        for window in STAGE_VOL_MA_WINDOWS:
+            row[f"VOL_MA{window}"] = c[f"vol_ma_{window}"].update(volume)
+
+        prev = self.prev
+        row["MACD_gold_cross"] = prev["DIF"] < prev["DEA"] and dif > dea
+        row["KDJ_gold_cross"] = prev["K"] < prev["D"] and k > d
+        row["RSI_rebound"] = prev["RSI6"] < 30 and row["RSI6"] >= 30
+        row["MA_bullish"] = row["MA5"] > row["MA10"] and row["MA10"] > row["MA20"] and close > row["MA20"]
+
+        avg_gain = c["rsi_gain"].update(gain)
+        avg_loss = c["rsi_loss"].update(loss)
+        if avg_loss == 0:
+            avg_loss = 0.000001
+        rsi = 100 - (100 / (1 + _divide(avg_gain, avg_loss)))
+        rsi_min = c["rsi_min"].update(rsi)
+        rsi_max = c["rsi_max"].update(rsi)
+        stoch_rsi_k = c["stoch_rsi_k"].update(100 * _divide(rsi - rsi_min, rsi_max - rsi_min))
+        row["rsi"] = rsi
+        row["stoch_rsi_k"] = stoch_rsi_k
+        row["stoch_rsi_d"] = c["stoch_rsi_d"].update(stoch_rsi_k)
+        row["macd"], row["macd_signal"], row["macd_hist"] = dif, dea, dif - dea
+        for period in MA_PERIODS:
+            row[f"sma_{period}"] = c[f"sma_{period}"].update(close)
+            row[f"ema_{period}"] = c[f"ema_{period}"].update(close)
+
+        self.prev = {"DIF": dif, "DEA": dea, "K": k, "D": d, "RSI6": row["RSI6"]}
+        self.prev_close = close
+        self.bars += 1
+        if date is not None:
+            date = _date_key(date)
+            if self.first_date is None:
+                self.first_date = date
+            self.last_date = date
+        self.recent.append((self.last_date, row))
+        return row
+
+    def preview(self, close, high, low, volume, date=None):
+        """在副本上加入一根K线并返回其指标，自身状态不变"""
+        return copy.deepcopy(self).update(close, high, low, volume, date)
+
+    def to_dict(self):
+        return {
+            "first_date": self.first_date,
+            "last_date": self.last_date,
+            "bars": self.bars,
+            "prev_close": self.prev_close,
+            "prev": self.prev,
+            "recent": [list(item) for item in self.recent],
+            "components": {name: comp.to_dict() for name, comp in self.components.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.first_date = data["first_date"]
+        state.last_date = data["last_date"]
+        state.bars = data["bars"]
+        state.prev_close = data["prev_close"]
+        state.prev = data["prev"]
+        state.recent.extend(tuple(item) for item in data["recent"])
+        for name, comp in state.components.items():
+            comp.load(data["components"][name])
+        return state
+
+def _date_key(date):
+    """把 datetime.date / Timestamp / 字符串统一为 'YYYYMMDD'"""
+    return pd.Timestamp(date).strftime("%Y%m%d")
+
+def advance_state(state, df):
+    """
+    把状态推进到 df 的最后一根K线
+
+    state 必须是从 df 的第一根K线开始递推的，且最后一根K线仍在 df 中、收盘价不变，
+    此时只递推新增的部分；否则（包括 state 为None，以及除权后复权价格被改写）从头重建。
+
+    参数:
+    state (IndicatorState): 已有的状态，可以为None
+    df (DataFrame): 以日期为索引、包含 close/high/low/volume 列的日线数据
+
+    返回:
+    tuple: (推进后的 IndicatorState, 是否有变化)
+    """
+    dates = [_date_key(d) for d in df.index]
+    columns = [df[name].to_numpy(dtype=float) for name in ("close", "high", "low", "volume")]
+    start = 0
+    if state is not None and dates and state.first_date == dates[0] and state.last_date in dates:
+        start = dates.index(state.last_date) + 1
+        if start != state.bars or columns[0][start - 1] != state.prev_close:
+            state = None
+    else:
+        state = None
+    if state is None:
+        state = IndicatorState()
+        start = 0
+
+    if start >= len(df):
+        return state, False
+    for i in range(start, len(df)):
+        state.update(columns[0][i], columns[1][i], columns[2][i], columns[3][i], dates[i])
+    return state, True
+
+def restore_state(symbol, adjust="qfq"):
+    """读取保存的指标状态，没有或无法解析时返回None"""
+    saved = price_store.load_state(symbol, adjust)
+    if saved is None:
+        return None
+    try:
+        return IndicatorState.from_dict(saved)
+    except (KeyError, TypeError, ValueError) as e:
+        logging.warning(f"股票 {symbol} 的指标状态无法解析，将重新计算: {e}")
+        return None
+
+def load_indicator_state(symbol, adjust="qfq"):
+    """
+    读取本地存储的历史数据和指标状态，并把状态推进到最后一根K线
+
+    状态与历史数据保存在一起；历史数据新增了K线时只递推新增的部分，
+    历史起点变化或状态文件损坏时从头重建。
+
+    参数:
+    symbol (str): 股票代码
+    adjust (str): 复权类型
+
+    返回:
+    tuple: (历史DataFrame, IndicatorState)；没有本地数据时返回 (空DataFrame, None)
+    """
+    df, _ = price_store.load_history(symbol, adjust)
+    if df.empty:
+        return df, None
+
+    state, changed = advance_state(restore_state(symbol, adjust), df)
+    if changed:
+        price_store.save_state(symbol, adjust, state.to_dict())
+    return df, state
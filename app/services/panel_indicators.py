@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+
+from app.core.logging import logging
+from app.services import price_store
+from app.services.indicator_engine import ewm_mean, rolling_max, rolling_mean, rolling_min, shift
+
+# 面板中保存的行情字段
+PANEL_FIELDS = ["close", "high", "low", "volume"]
+
+class Panel:
+    """
+    全市场行情面板
+
+    每个字段是形状为 (股票数, 交易日数) 的数组，所有股票按同一组交易日对齐；
+    停牌或尚未上市的日期为NaN，valid 标记每只股票在每个交易日是否有数据。
+    """
+
+    def __init__(self, symbols, dates, fields):
+        self.symbols = symbols
+        self.dates = dates
+        self.fields = fields
+        self.valid = ~np.isnan(fields["close"])
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    @property
+    def shape(self):
+        return (len(self.symbols), len(self.dates))
+
+def build_panel(frames):
+    """
+    将多只股票的日线数据对齐为面板
+
+    参数:
+    frames (dict): {股票代码: 以日期为索引、包含 close/high/low/volume 列的DataFrame}
+
+    返回:
+    Panel
+    """
+    frames = {symbol: df for symbol, df in frames.items() if not df.empty}
+    if not frames:
+        return Panel([], pd.DatetimeIndex([]), {f: np.empty((0, 0)) for f in PANEL_FIELDS})
+
+    # 所有股票交易日的并集作为面板的日期轴
+    symbol_dates = {
+        symbol: pd.to_datetime(pd.Index(df.index)).values for symbol, df in frames.items()
+    }
+    dates = np.unique(np.concatenate(list(symbol_dates.values())))
+
+    symbols = list(frames)
+    # (字段, 股票, 交易日)
+    cube = np.full((len(PANEL_FIELDS), len(symbols), len(dates)), np.nan)
+    for row, symbol in enumerate(symbols):
+        columns = np.searchsorted(dates, symbol_dates[symbol])
+        cube[:, row, columns] = frames[symbol][PANEL_FIELDS].to_numpy(dtype=float).T
+    fields = {field: cube[i] for i, field in enumerate(PANEL_FIELDS)}
+    return Panel(symbols, pd.DatetimeIndex(dates), fields)
+
+def load_panel(symbols=None, adjust="qfq", start_date=None, end_date=None):
+    """
+    从本地行情存储读取数据并构建面板，不请求上游
+
+    参数:
+    symbols (list): 股票代码列表，为None时读取本地存储中的全部股票
+    adjust (str): 复权类型
+    start_date (str): 开始日期，格式 'YYYYMMDD'，为None时不限制
+    end_date (str): 结束日期，格式 'YYYYMMDD'，为None时不限制
+
+    返回:
+    Panel
+    """
+    if symbols is None:
+        symbols = price_store.list_symbols(adjust)
+
+    frames = {}
+    for symbol in symbols:
+        df, _ = price_store.load_history(symbol, adjust)
+        if df.empty:
+            continue
+        dates = pd.to_datetime(pd.Index(df.index))
+        mask = np.ones(len(df), dtype=bool)
+        if start_date:
+            mask &= dates >= pd.Timestamp(start_date)
+        if end_date:
+            mask &= dates <= pd.Timestamp(end_date)
+        frames[symbol] = df[mask]
+
+    logging.info(f"从本地存储构建面板，共 {len(frames)} 只股票")
+    return build_panel(frames)
+
+def stage_indicators(close, high, low, volume):
+    """
+    按 stage_by_tech 的公式计算均线、EMA、MACD、KDJ、RSI以及趋势信号
+
+    参数:
+    close, high, low, volume (ndarray): 形状为 (T,) 或 (T, N) 的数组，时间在第0维，
+        每一列都必须是不含缺口的连续序列（可以在末尾补NaN）
+
+    返回:
+    dict: 字段名到与输入同形状数组的映射，字段与 TrendSignalItem 一致，另含 EMA12、EMA26
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = {}
+
+        # RSI：涨跌幅的简单移动平均
+        delta = close - shift(close)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        for period in (6, 12, 24):
+            rs = rolling_mean(gain, period) / rolling_mean(loss, period)
+            result[f"RSI{period}"] = 100 - (100 / (1 + rs))
+
+        # KDJ
+        low_min = rolling_min(low, 9)
+        high_max = rolling_max(high, 9)
+        rsv = (close - low_min) / (high_max - low_min) * 100
+        k = ewm_mean(rsv, alpha=1 / 3)
+        d = ewm_mean(k, alpha=1 / 3)
+        result["K"], result["D"], result["J"] = k, d, 3 * k - 2 * d
+
+        # MACD
+        ema12 = ewm_mean(close, span=12)
+        ema26 = ewm_mean(close, span=26)
+        dif = ema12 - ema26
+        dea = ewm_mean(dif, span=9)
+        result["EMA12"], result["EMA26"] = ema12, ema26
+        result["DIF"], result["DEA"], result["MACD_HIST"] = dif, dea, dif - dea
+
+        # 均线和均量
+        for window in (5, 10, 20):
+            result[f"MA{window}"] = rolling_mean(close, window)
+        result["VOL_MA5"] = rolling_mean(volume, 5)
+        result["VOL_MA10"] = rolling_mean(volume, 10)
+
+        # 信号：与前一根K线比较
+        result["MACD_gold_cross"] = (shift(dif) < shift(dea)) & (dif > dea)
+        result["KDJ_gold_cross"] = (shift(k) < shift(d)) & (k > d)
+        rsi6 = result["RSI6"]
+        result["RSI_rebound"] = (shift(rsi6) < 30) & (rsi6 >= 30)
+        result["MA_bullish"] = (
+            (result["MA5"] > result["MA10"])
+            & (result["MA10"] > result["MA20"])
+            & (close > result["MA20"])
+        )
+    return result
+
+def compute_panel_signals(panel):
+    """
+    对面板中所有股票一次性计算 stage_by_tech 的指标和信号
+
+    停牌日不参与计算：先把每只股票的有效数据按时间顺序压紧到数组前部，
+    计算完成后再放回原来的交易日位置，因此每只股票的结果与单独调用
+    get_trend_signals 时一致。
+
+    参数:
+    panel (Panel): 行情面板
+
+    返回:
+    dict: 字段名到 (股票数, 交易日数) 数组的映射；无数据的位置数值为NaN、信号为False
+    """
+    if not panel.symbols:
+        return {}
+
+    valid = panel.valid.T
+    # 有效数据排在前面，组内保持时间顺序
+    order = np.argsort(~valid, axis=0, kind="stable")
+    compact = {
+        field: np.take_along_axis(panel[field].T, order, axis=0) for field in PANEL_FIELDS
+    }
+
+    compact_result = stage_indicators(
+        compact["close"], compact["high"], compact["low"], compact["volume"]
+    )
+    compact_result["close"] = compact["close"]
+    compact_result["volume"] = compact["volume"]
+
+    signals = {}
+    for name, values in compact_result.items():
+        out = np.empty_like(values)
+        np.put_along_axis(out, order, values, axis=0)
+        out[~valid] = False if out.dtype == bool else np.nan
+        signals[name] = out.T
+    return signals
+
+def latest_signals(panel, signals):
+    """
+    取每只股票最后一个有效交易日的指标和信号
+
+    返回:
+    DataFrame: 以股票代码为索引，列为 date 以及 compute_panel_signals 的各字段
+    """
+    if not panel.symbols:
+        return pd.DataFrame()
+
+    valid = panel.valid
+    has_data = valid.any(axis=1)
+    # 每行最后一个True的位置
+    last = valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    rows = np.arange(len(panel.symbols))
+
+    latest = {"date": np.asarray(panel.dates)[last]}
+    for name, values in signals.items():
+        latest[name] = values[rows, last]
+    df = pd.DataFrame(latest, index=pd.Index(panel.symbols, name="symbol"))
+    return df[has_data]
@@ -0,0 +1,337 @@
+import argparse
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.services import price_store
+from app.services.backtest import get_pool, load_compact_history, shutdown_pool, simulate_trades
+from app.services.indicator_engine import (
+    ewm_mean,
+    gains_losses,
+    rolling_max,
+    rolling_mean,
+    rolling_min,
+    rolling_sum,
+    shift,
+    true_range,
+)
+
+# 默认的参数网格，包含 tech_indicators 中的默认值：
+# RSI(14) 30/70、Stochastic(14, 3) 20/80、CCI(20) ±100、Williams %R(10) -80/-20、UO(7, 14, 28) 30/70
+SWEEP_GRIDS = {
+    "rsi": {"period": [6, 9, 14, 21], "low": [20, 25, 30, 35], "high": [65, 70, 75, 80]},
+    "stoch": {"k_period": [9, 14, 21], "slowing": [1, 3, 5], "low": [10, 20, 30], "high": [70, 80, 90]},
+    "cci": {"period": [14, 20, 30], "threshold": [80, 100, 150, 200]},
+    "williams_r": {"period": [10, 14, 21], "low": [-90, -80, -70], "high": [-30, -20, -10]},
+    "uo": {"short": [5, 7], "mid": [10, 14], "long": [20, 28], "low": [25, 30, 35], "high": [65, 70, 75]},
+}
+
+# 可以用来排序的指标
+SWEEP_METRICS = ["avg_return", "win_rate", "profit_factor", "sharpe", "trades"]
+
+class SweepError(ValueError):
+    """参数网格或排序指标无效"""
+
+def expand_grid(grids):
+    """
+    展开参数网格
+
+    参数:
+    grids (dict): {指标: {参数名: [取值, ...]}}，参数名必须与 SWEEP_GRIDS 中的一致
+
+    返回:
+    list: [{"indicator": 指标, 参数名: 取值, ...}, ...]
+    """
+    configs = []
+    for indicator, grid in grids.items():
+        if indicator not in SWEEP_GRIDS:
+            raise SweepError(f"未知的指标: {indicator}，可选: {', '.join(SWEEP_GRIDS)}")
+        names = list(SWEEP_GRIDS[indicator])
+        if set(grid) != set(names):
+            raise SweepError(f"指标 {indicator} 的参数必须是: {', '.join(names)}")
+        for values in itertools.product(*(grid[name] for name in names)):
+            config = {"indicator": indicator, **dict(zip(names, values))}
+            if _is_consistent(config):
+                configs.append(config)
+    return configs
+
+def _is_consistent(config):
+    """剔除自相矛盾的组合，如买入阈值不低于卖出阈值"""
+    if "low" in config and config["low"] >= config["high"]:
+        return False
+    if config["indicator"] == "uo":
+        return config["short"] < config["mid"] < config["long"]
+    return True
+
+class _Intermediates:
+    """
+    一组股票上计算指标时共享的中间序列
+
+    以 (名称, 参数) 为键缓存：同一周期的RSI在不同阈值之间共享，
+    Stochastic 和 Williams %R 共享同一周期的最高价/最低价滚动极值，UO 的各窗口累加值在组合之间共享。
+    """
+
+    def __init__(self, history):
+        self.close = history["close"]
+        self.high = history["high"]
+        self.low = history["low"]
+        self._cache = {}
+        self.hits = 0
+
+    def get(self, key, compute):
+        if key in self._cache:
+            self.hits += 1
+        else:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def rsi(self, period):
+        """与 tech_indicators.calculate_rsi 相同的RSI序列"""
+        def compute():
+            gain, loss = self.get(("gains_losses",), lambda: gains_losses(self.close))
+            avg_gain = ewm_mean(gain, adjust=True, com=period - 1, min_periods=period)
+            avg_loss = ewm_mean(loss, adjust=True, com=period - 1, min_periods=period)
+            avg_loss = np.where(avg_loss == 0, 0.000001, avg_loss)
+            return 100 - (100 / (1 + avg_gain / avg_loss))
+        return self.get(("rsi", period), compute)
+
+    def lowest(self, period):
+        return self.get(("lowest", period), lambda: rolling_min(self.low, period))
+
+    def highest(self, period):
+        return self.get(("highest", period), lambda: rolling_max(self.high, period))
+
+    def stoch_k(self, k_period, slowing):
+        """与 tech_indicators.calculate_stochastic 相同的 %K 序列"""
+        def raw():
+            low_min, high_max = self.lowest(k_period), self.highest(k_period)
+            return 100 * ((self.close - low_min) / (high_max - low_min))
+
+        def compute():
+            values = self.get(("stoch_raw", k_period), raw)
+            return rolling_mean(values, slowing) if slowing > 1 else values
+        return self.get(("stoch_k", k_period, slowing), compute)
+
+    def cci(self, period):
+        """与 tech_indicators.calculate_cci 相同的CCI序列"""
+        def compute():
+            tp = self.get(("tp",), lambda: (self.high + self.low + self.close) / 3)
+            tp_ma = rolling_mean(tp, period)
+            md = rolling_mean(np.abs(tp - tp_ma), period)
+            md = np.where(md == 0, 0.000001, md)
+            return (tp - tp_ma) / (0.015 * md)
+        return self.get(("cci", period), compute)
+
+    def williams_r(self, period):
+        """与 tech_indicators.calculate_williams_r 相同的 Williams %R 序列"""
+        def compute():
+            highest_high, lowest_low = self.highest(period), self.lowest(period)
+            return -100 * ((highest_high - self.close) / (highest_high - lowest_low))
+        return self.get(("williams_r", period), compute)
+
+    def uo(self, short, mid, long):
+        """与 tech_indicators.calculate_ultimate_oscillator 相同的UO序列"""
+        def average(window):
+            def compute():
+                prev_close = self.get(("prev_close",), lambda: shift(self.close))
+                tr = self.get(("tr",), lambda: true_range(self.high, self.low, prev_close))
+                bp = self.get(("bp",), lambda: self.close - np.fmin(self.low, prev_close))
+                return rolling_sum(bp, window) / rolling_sum(tr, window)
+            return self.get(("uo_average", window), compute)
+
+        return 100 * ((4 * average(short)) + (2 * average(mid)) + average(long)) / 7
+
+def signal_zones(intermediates, config):
+    """
+    返回某组参数下的指标序列以及买入、卖出阈值
+
+    与 tech_indicators 的信号规则一致：低于买入阈值为“买入”，高于卖出阈值为“卖出”；
+    CCI 以 -threshold/threshold 为阈值。
+    """
+    indicator = config["indicator"]
+    if indicator == "rsi":
+        values = intermediates.rsi(config["period"])
+    elif indicator == "stoch":
+        values = intermediates.stoch_k(config["k_period"], config["slowing"])
+    elif indicator == "cci":
+        values = intermediates.cci(config["period"])
+        return values, -config["threshold"], config["threshold"]
+    elif indicator == "williams_r":
+        values = intermediates.williams_r(config["period"])
+    else:
+        values = intermediates.uo(config["short"], config["mid"], config["long"])
+    return values, config["low"], config["high"]
+
+def sweep_chunk(symbols, configs, params, start_date=None, end_date=None, adjust="qfq"):
+    """
+    在一组股票上评估全部参数组合，可以在子进程中执行
+
+    指标进入买入区间的当日买入，进入卖出区间、触发止盈止损或持有到期时卖出。
+    只返回每个组合的可加统计量，合并各组股票的结果时直接相加，进程间传输的数据量与股票数无关。
+
+    返回:
+    tuple: (股票数, (组合数, 6) 数组)，列为交易笔数、盈利笔数、收益和、收益平方和、总盈利、总亏损
+    """
+    stats = np.zeros((len(configs), 6))
+    history = load_compact_history(symbols, start_date, end_date, adjust)
+    if not history["symbols"]:
+        return 0, stats
+
+    intermediates = _Intermediates(history)
+    is_valid = history["is_valid"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, config in enumerate(configs):
+            values, low, high = signal_zones(intermediates, config)
+            buy = values < low
+            # 只在进入买入区间的当日开仓，停留在区间内的后续日期不重复开仓
+            entries = buy & ~(shift(values) < low) & is_valid
+            _, _, _, returns = simulate_trades(
+                history["close"], entries, history["n_valid"], history["in_range"], params,
+                exit_signal=values > high,
+            )
+            stats[i] = [
+                len(returns),
+                np.sum(returns > 0),
+                np.sum(returns),
+                np.sum(returns ** 2),
+                np.sum(returns[returns > 0]),
+                -np.sum(returns[returns < 0]),
+            ]
+    logging.debug(f"参数扫描 {len(symbols)} 只股票，中间序列复用 {intermediates.hits} 次")
+    return len(history["symbols"]), stats
+
+def rank_configs(configs, stats, metric="avg_return", min_trades=30):
+    """
+    由可加统计量计算各组合的指标并排序
+
+    参数:
+    configs (list): expand_grid 的结果
+    stats (ndarray): 各组合的统计量
+    metric (str): 排序指标，SWEEP_METRICS 之一
+    min_trades (int): 交易笔数少于该值的组合不参与排名
+
+    返回:
+    DataFrame: 按 metric 从高到低排序的各组合参数和指标
+    """
+    trades, wins, total, squares, profit, loss = stats.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / trades
+        variance = (squares - trades * mean ** 2) / (trades - 1)
+        std = np.sqrt(np.maximum(variance, 0))
+        # 不同指标的参数名不同，缺少的参数为空；整数参数保持整数显示
+        ranked = pd.DataFrame(configs).convert_dtypes()
+        ranked["trades"] = trades.astype(int)
+        ranked["win_rate"] = wins / trades
+        ranked["avg_return"] = mean
+        ranked["profit_factor"] = np.where(loss > 0, profit / loss, np.nan)
+        # 单笔收益的均值/标准差，衡量收益的稳定性
+        ranked["sharpe"] = np.where(std > 0, mean / std, np.nan)
+
+    ranked = ranked[ranked["trades"] >= min_trades]
+    return ranked.sort_values(metric, ascending=False, na_position="last").reset_index(drop=True)
+
+def run_sweep(grids=None, symbols=None, metric="avg_return", start_date=None, end_date=None,
+              hold_days=10, take_profit=None, stop_loss=None, fee_rate=0.0003, stamp_tax=0.001,
+              min_trades=30, adjust="qfq", parallel=True):
+    """
+    在本地存储的历史数据上扫描 tech_indicators 的周期和阈值，不请求上游
+
+    股票按 BACKTEST_CHUNK_SYMBOLS 只一组分给回测进程池，每组股票的数据只读取、压紧一次，
+    全部参数组合在同一份数据和同一组中间序列上评估。
+
+    参数:
+    grids (dict): 参数网格，为None时使用 SWEEP_GRIDS
+    symbols (list): 股票代码列表，为None时使用本地存储中的全部股票
+    metric (str): 排序指标
+    其余参数同 backtest.run_backtest
+
+    返回:
+    tuple: (参与扫描的股票数, 排序后的DataFrame)
+    """
+    if metric not in SWEEP_METRICS:
+        raise SweepError(f"未知的排序指标: {metric}，可选: {', '.join(SWEEP_METRICS)}")
+    if hold_days < 1:
+        raise SweepError("持有天数至少为1")
+    configs = expand_grid(grids or SWEEP_GRIDS)
+    params = {
+        "hold_days": hold_days,
+        "take_profit": take_profit,
+        "stop_loss": stop_loss,
+        "fee_rate": fee_rate,
+        "stamp_tax": stamp_tax,
+    }
+    if symbols is None:
+        symbols = price_store.list_symbols(adjust)
+    symbols = list(dict.fromkeys(symbols))
+
+    size = settings.BACKTEST_CHUNK_SYMBOLS
+    groups = [symbols[i:i + size] for i in range(0, len(symbols), size)] or [[]]
+    logging.info(f"参数扫描：{len(configs)} 组参数，{len(symbols)} 只股票，分为 {len(groups)} 组")
+    if parallel and len(groups) > 1:
+        pool = get_pool()
+        futures = [
+            pool.submit(sweep_chunk, group, configs, params, start_date, end_date, adjust)
+            for group in groups
+        ]
+        results = [future.result() for future in futures]
+    else:
+        results = [sweep_chunk(group, configs, params, start_date, end_date, adjust) for group in groups]
+
+    count = sum(result[0] for result in results)
+    stats = np.sum([result[1] for result in results], axis=0)
+    return count, rank_configs(configs, stats, metric, min_trades)
+
+def main():
+    parser = argparse.ArgumentParser(description='在本地历史数据上并行扫描技术指标的周期和阈值')
+    parser.add_argument('--grid', help='参数网格JSON文件，格式同 SWEEP_GRIDS，默认使用内置网格', default=None)
+    parser.add_argument('--indicators', help='只扫描这些指标，用逗号分隔，如 rsi,cci', default=None)
+    parser.add_argument('--symbols', help='股票代码，用逗号分隔，默认使用本地存储中的全部股票', default=None)
+    parser.add_argument('--metric', help='排序指标', choices=SWEEP_METRICS, default='avg_return')
+    parser.add_argument('--start_date', help='开仓开始日期 (YYYYMMDD)', default=None)
+    parser.add_argument('--end_date', help='开仓结束日期 (YYYYMMDD)', default=None)
+    parser.add_argument('--hold_days', type=int, help='最多持有的交易日数', default=10)
+    parser.add_argument('--take_profit', type=float, help='止盈比例，如 0.1', default=None)
+    parser.add_argument('--stop_loss', type=float, help='止损比例，如 0.05', default=None)
+    parser.add_argument('--min_trades', type=int, help='参与排名的最少交易笔数', default=30)
+    parser.add_argument('--top', type=int, help='输出前多少组参数', default=20)
+    parser.add_argument('--output', help='把完整的排名保存为CSV文件', default=None)
+
+    args = parser.parse_args()
+
+    grids = SWEEP_GRIDS
+    if args.grid:
+        with open(args.grid, encoding='utf-8') as f:
+            grids = json.load(f)
+    if args.indicators:
+        grids = {name: grid for name, grid in grids.items() if name in args.indicators.split(',')}
+
+    try:
+        count, ranked = run_sweep(
+            grids,
+            args.symbols.split(',') if args.symbols else None,
+            args.metric,
+            args.start_date,
+            args.end_date,
+            args.hold_days,
+            args.take_profit,
+            args.stop_loss,
+            min_trades=args.min_trades,
+        )
+    except SweepError as e:
+        print(f"参数错误: {e}")
+        return
+    finally:
+        shutdown_pool()
+
+    print(f"共扫描 {count} 只股票，{len(ranked)} 组参数满足最少交易笔数")
+    print(ranked.head(args.top).to_string())
+    if args.output:
+        ranked.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"完整排名已保存到: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging import logging
+
+# 写文件时加锁，避免同一进程内并发写同一只股票
+_write_lock = threading.Lock()
+
+def _store_path(symbol, adjust):
+    """返回某只股票、某种复权类型对应的存储文件路径"""
+    adjust_name = adjust if adjust else "none"
+    return os.path.join(settings.PRICE_STORE_DIR, f"{symbol}_{adjust_name}.npz")
+
+def load_history(symbol, adjust="qfq"):
+    """
+    读取本地保存的历史日线数据
+
+    参数:
+    symbol (str): 股票代码
+    adjust (str): 复权类型
+
+    返回:
+    tuple: (DataFrame, 已覆盖区间)，已覆盖区间为 ('YYYYMMDD', 'YYYYMMDD')；
+           没有本地数据时返回 (空DataFrame, None)
+    """
+    path = _store_path(symbol, adjust)
+    if not os.path.exists(path):
+        return pd.DataFrame(), None
+
+    try:
+        with np.load(path, allow_pickle=False) as store:
+            columns = [str(c) for c in store["__columns__"]]
+            covered = tuple(str(d) for d in store["__covered__"])
+            data = {col: store[f"col_{i}"] for i, col in enumerate(columns)}
+            dates = store["__date__"]
+    except Exception as e:
+        logging.error(f"读取股票 {symbol} 的本地数据失败: {e}")
+        return pd.DataFrame(), None
+
+    # 日期索引还原为 datetime.date，和 akshare 返回的格式保持一致
+    index = pd.Index(dates.astype(object), name="date")
+    df = pd.DataFrame(data, index=index, columns=columns)
+    return df, covered
+
+def save_history(symbol, adjust, df, covered_start, covered_end):
+    """
+    按列保存历史日线数据，并记录已覆盖的日期区间
+
+    参数:
+    symbol (str): 股票代码
+    adjust (str): 复权类型
+    df (DataFrame): 以日期为索引的日线数据
+    covered_start (str): 已覆盖区间起点，格式 'YYYYMMDD'
+    covered_end (str): 已覆盖区间终点，格式 'YYYYMMDD'
+    """
+    arrays = {
+        "__columns__": np.array([str(c) for c in df.columns]),
+        "__covered__": np.array([covered_start, covered_end]),
+        "__date__": pd.to_datetime(pd.Index(df.index)).values.astype("datetime64[D]"),
+    }
+    for i, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        # 字符串列转为定长unicode数组，避免使用pickle
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays[f"col_{i}"] = values
+
+    path = _store_path(symbol, adjust)
+    tmp_path = path[:-len(".npz")] + ".tmp.npz"
+    with _write_lock:
+        try:
+            np.savez(tmp_path, **arrays)
+            # 先写临时文件再替换，读到的永远是完整文件
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"保存股票 {symbol} 的本地数据失败: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+def _state_path(symbol, adjust):
+    """指标状态放在存储目录的 state 子目录中，写状态不会改变存储目录的修改时间"""
+    adjust_name = adjust if adjust else "none"
+    return os.path.join(settings.PRICE_STORE_DIR, "state", f"{symbol}_{adjust_name}.json")
+
+def load_state(symbol, adjust="qfq"):
+    """读取与历史数据一起保存的指标递推状态，没有时返回None"""
+    path = _state_path(symbol, adjust)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"读取股票 {symbol} 的指标状态失败: {e}")
+        return None
+
+def save_state(symbol, adjust, state):
+    """
+    保存指标递推状态
+
+    参数:
+    symbol (str): 股票代码
+    adjust (str): 复权类型
+    state (dict): 可以JSON序列化的状态
+    """
+    path = _state_path(symbol, adjust)
+    tmp_path = path + ".tmp"
+    with _write_lock:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"保存股票 {symbol} 的指标状态失败: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+def list_symbols(adjust="qfq"):
+    """列出本地已保存数据的股票代码"""
+    suffix = f"_{adjust if adjust else 'none'}.npz"
+    if not os.path.isdir(settings.PRICE_STORE_DIR):
+        return []
+    return sorted(
+        name[:-len(suffix)]
+        for name in os.listdir(settings.PRICE_STORE_DIR)
+        if name.endswith(suffix) and not name.endswith(".tmp.npz")
+    )
+
+def last_modified():
+    """返回存储目录的最后修改时间（纳秒），有文件新增或替换时会变化"""
+    try:
+        return os.stat(settings.PRICE_STORE_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return None
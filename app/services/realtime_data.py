@@ -1,7 +1,11 @@
 import akshare as ak
 import pandas as pd
+import asyncio
 import json
 
+from app.core.responses import frame_records
+from app.services.upstream import call_upstream
+
 # 设置pandas显示选项
 pd.set_option('display.float_format', '{:.2f}'.format)
 pd.set_option('display.max_columns', None)
@@ -9,17 +13,24 @@ pd.set_option('display.width', 1000)
 pd.set_option('display.colheader_justify', 'center')
 
 def get_stock_realtime_data(symbol="000895"):
+    """get_stock_realtime_data_async 的同步版本"""
+    return asyncio.run(get_stock_realtime_data_async(symbol))
+
+async def get_stock_realtime_data_async(symbol="000895"):
     """获取股票实时盘口数据并返回JSON格式"""
+    result = await fetch_realtime_snapshot(symbol)
+    
+    # 返回JSON字符串
+    return json.dumps(result, ensure_ascii=False, indent=2)
+
+async def fetch_realtime_snapshot(symbol="000895"):
+    """获取股票实时盘口数据，返回可以JSON序列化的字典"""
     # 获取股票实时盘口数据
-    stock_bid_ask_em_df = ak.stock_bid_ask_em(symbol=symbol)
+    stock_bid_ask_em_df = await call_upstream(ak.stock_bid_ask_em, symbol=symbol)
     
-    # 将DataFrame转换为字典，然后转为JSON格式
-    # 处理float64类型，确保可以被JSON序列化
-    result = {
+    # 直接转换为字典，缺失值转为None，由调用方一次编码
+    return {
         "股票代码": symbol,
         "数据时间": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "盘口数据": json.loads(stock_bid_ask_em_df.to_json(orient="records", force_ascii=False))
+        "盘口数据": frame_records(stock_bid_ask_em_df)
     }
-    
-    # 返回JSON字符串
-    return json.dumps(result, ensure_ascii=False, indent=2)
\ No newline at end of file
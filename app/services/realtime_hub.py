@@ -0,0 +1,104 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.services.realtime_data import fetch_realtime_snapshot
+
+# 每个订阅者最多积压的消息数，消费过慢时丢弃最旧的
+SUBSCRIBER_QUEUE_SIZE = 16
+
+class RealtimeHub:
+    """
+    实时盘口推送中心
+
+    每只被订阅的股票只有一个后台轮询任务，获取到的盘口快照广播给所有订阅者；
+    订阅按引用计数，最后一个订阅者离开时停止轮询。
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.polls = 0
+        self.failures = 0
+        self._subscribers = {}
+        self._pollers = {}
+        self._latest = {}
+
+    @asynccontextmanager
+    async def subscription(self, symbol):
+        """
+        订阅某只股票的盘口推送，返回接收消息的队列
+
+        消息为 (事件类型, 数据)：("snapshot", 盘口快照) 或 ("error", 错误信息)
+        """
+        queue = self.subscribe(symbol)
+        try:
+            yield queue
+        finally:
+            self.unsubscribe(symbol, queue)
+
+    def subscribe(self, symbol):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(symbol, set()).add(queue)
+        # 新订阅者先收到最近一次的快照，不必等下一次轮询
+        if symbol in self._latest:
+            queue.put_nowait(("snapshot", self._latest[symbol]))
+        if symbol not in self._pollers:
+            self._pollers[symbol] = asyncio.create_task(self._poll(symbol))
+            logging.info(f"开始轮询股票 {symbol} 的盘口数据")
+        return queue
+
+    def unsubscribe(self, symbol, queue):
+        subscribers = self._subscribers.get(symbol)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[symbol]
+            self._latest.pop(symbol, None)
+            poller = self._pollers.pop(symbol, None)
+            if poller is not None:
+                poller.cancel()
+            logging.info(f"股票 {symbol} 已无订阅者，停止轮询")
+
+    async def close(self):
+        """停止全部轮询任务"""
+        pollers = list(self._pollers.values())
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        self._pollers.clear()
+        self._subscribers.clear()
+        self._latest.clear()
+
+    def stats(self):
+        return {
+            "symbols": {symbol: len(queues) for symbol, queues in self._subscribers.items()},
+            "interval": self.interval,
+            "polls": self.polls,
+            "failures": self.failures,
+        }
+
+    async def _poll(self, symbol):
+        while True:
+            try:
+                snapshot = await fetch_realtime_snapshot(symbol)
+                self.polls += 1
+                self._latest[symbol] = snapshot
+                self._broadcast(symbol, ("snapshot", snapshot))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"轮询股票 {symbol} 的盘口数据失败: {e}")
+                self._broadcast(symbol, ("error", str(e)))
+            await asyncio.sleep(self.interval)
+
+    def _broadcast(self, symbol, message):
+        for queue in self._subscribers.get(symbol, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+# 全局推送中心
+realtime_hub = RealtimeHub(settings.REALTIME_POLL_SECONDS)
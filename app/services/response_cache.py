@@ -0,0 +1,103 @@
+import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.services.market_calendar import last_trading_date, next_settle_time
+
+class ResponseCache:
+    """
+    进程内的接口响应缓存
+
+    以 (接口, 参数, 最后一根K线的日期) 为键保存已编码的JSON响应体及其ETag。
+    请求区间包含最新交易日时，新的交易日K线定型后最后一根K线的日期随之变化，旧条目不再命中；
+    所有条目在下一次收盘结算时过期（前复权价格可能因除权而整体变化，历史区间也需要重新计算）。
+    只缓存由完整、已定型的数据生成的响应，见 put。按条目数做LRU淘汰。
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        # key -> (响应体, ETag, 过期时间)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        # 因数据不完整或未定型而没有缓存的响应数
+        self.rejected = 0
+
+    @staticmethod
+    def key(endpoint, symbol, start_date, end_date, *params):
+        """
+        生成缓存键
+
+        最后一根K线的日期由交易日历推算（请求的结束日期与最近一个已定型交易日中较早的一个），
+        不需要先获取数据；params 为影响响应内容的其他参数（如分页参数）
+        """
+        last_bar = min(end_date, last_trading_date()) if end_date else last_trading_date()
+        return (endpoint, symbol, start_date, end_date, last_bar, *params)
+
+    def get(self, key):
+        """返回 (响应体, ETag)，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and datetime.datetime.now() >= entry[2]:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, body, last_bar):
+        """
+        写入已编码的响应体，返回 (响应体, ETag)
+
+        last_bar 为生成响应的数据实际的最后一根K线日期（'YYYYMMDD'）。
+        数据不完整（备选数据源的当日快照、熔断时只有本地旧数据等）时调用方传入None；
+        last_bar 晚于键中按日历推算的最后一根K线（即包含盘中尚未定型的K线）时同样不缓存。
+        不缓存时仍返回响应体和ETag。
+        """
+        etag = make_etag(body)
+        if last_bar is None or last_bar > key[4]:
+            with self._lock:
+                self.rejected += 1
+            return body, etag
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (body, etag, next_settle_time())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def clear(self):
+        """清空缓存（统计计数保留）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "rejected": self.rejected,
+            }
+
+def make_etag(body):
+    """由响应体生成强ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+# 全局响应缓存
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE)
@@ -0,0 +1,258 @@
+import argparse
+import ast
+import asyncio
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.models.schemas import TrendSignalItem
+from app.services import price_store
+from app.services.panel_indicators import compute_panel_signals, latest_signals, load_panel
+
+# 条件中可以使用的字段：TrendSignalItem 中除日期以外的全部字段
+SCREENER_FIELDS = [name for name in TrendSignalItem.model_fields if name != "date"]
+
+_COMPARE_OPS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+_BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+}
+
+class ConditionError(ValueError):
+    """筛选条件无法解析或使用了不支持的语法"""
+
+def compile_condition(expression):
+    """
+    解析筛选条件，返回可以在列数据上求值的函数
+
+    支持 and/or/not、比较运算（可以连写，如 20 < RSI6 < 50）、四则运算、
+    SCREENER_FIELDS 中的字段名以及数字/布尔常量，例如
+    'MA_bullish and MACD_gold_cross and RSI6 < 50'。
+
+    异常:
+    ConditionError: 条件语法错误或使用了未知字段
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ConditionError(f"筛选条件语法错误: {e.msg}")
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id not in SCREENER_FIELDS:
+            raise ConditionError(f"未知字段 {node.id}，可用字段: {', '.join(SCREENER_FIELDS)}")
+
+    def evaluate(columns):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = _evaluate(tree.body, columns)
+        if np.ndim(result) == 0:
+            raise ConditionError("筛选条件必须引用至少一个字段")
+        return np.asarray(result, dtype=bool)
+
+    return evaluate
+
+def _evaluate(node, columns):
+    if isinstance(node, ast.BoolOp):
+        values = [np.asarray(_evaluate(value, columns), dtype=bool) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        result = values[0]
+        for value in values[1:]:
+            result = combine(result, value)
+        return result
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _evaluate(node.operand, columns)
+        if isinstance(node.op, ast.Not):
+            return np.logical_not(np.asarray(operand, dtype=bool))
+        if isinstance(node.op, ast.USub):
+            return -operand
+        if isinstance(node.op, ast.UAdd):
+            return operand
+
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, columns)
+        result = True
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARE_OPS:
+                break
+            right = _evaluate(comparator, columns)
+            result = np.logical_and(result, _COMPARE_OPS[type(op)](left, right))
+            left = right
+        else:
+            return result
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        return _BINARY_OPS[type(node.op)](
+            _evaluate(node.left, columns), _evaluate(node.right, columns)
+        )
+
+    if isinstance(node, ast.Name):
+        return columns[node.id]
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float)):
+        return node.value
+
+    raise ConditionError(f"不支持的语法: {ast.unparse(node)}")
+
+class ScreenerIndex:
+    """
+    全市场最新K线的指标表
+
+    从本地行情存储构建面板，一次算出所有股票最后一根K线上的指标和信号；
+    本地存储有变化时在后台重建，筛选请求只在这张表上做向量化过滤。
+    """
+
+    def __init__(self, adjust, lookback_days):
+        self.adjust = adjust
+        self.lookback_days = lookback_days
+        self.table = None
+        self.built_at = None
+        self._store_version = None
+        self._lock = threading.Lock()
+        # 冷启动时只让一个请求构建，其余请求等待同一次构建的结果
+        self._build_lock = asyncio.Lock()
+
+    def build(self):
+        """重新构建指标表（CPU密集，需在线程中调用）"""
+        with self._lock:
+            version = price_store.last_modified()
+            start_date = (
+                datetime.datetime.now() - datetime.timedelta(days=self.lookback_days)
+            ).strftime("%Y%m%d")
+            panel = load_panel(adjust=self.adjust, start_date=start_date)
+            self.table = latest_signals(panel, compute_panel_signals(panel))
+            self.built_at = datetime.datetime.now()
+            self._store_version = version
+            logging.info(f"筛选指标表已构建，共 {len(self.table)} 只股票")
+
+    def is_stale(self):
+        return self.table is None or price_store.last_modified() != self._store_version
+
+    async def ensure_built(self):
+        if self.table is not None:
+            return
+        async with self._build_lock:
+            if self.table is None:
+                await asyncio.to_thread(self.build)
+
+    async def run_refresher(self):
+        """后台任务：本地存储有变化时定期重建指标表"""
+        while True:
+            try:
+                if self.is_stale():
+                    await asyncio.to_thread(self.build)
+            except Exception as e:
+                logging.error(f"构建筛选指标表失败: {e}")
+            await asyncio.sleep(settings.SCREENER_REFRESH_SECONDS)
+
+    def screen(self, condition, limit=None):
+        """
+        返回满足条件的股票
+
+        参数:
+        condition (callable): compile_condition 的返回值
+        limit (int): 最多返回的条数
+
+        返回:
+        tuple: (满足条件的总数, 结果列表)
+        """
+        table = self.table
+        if table is None or table.empty:
+            return 0, []
+
+        columns = {name: table[name].to_numpy() for name in SCREENER_FIELDS}
+        matched = table[condition(columns)]
+        total = len(matched)
+        if limit is not None:
+            matched = matched.head(limit)
+        return total, _to_items(matched)
+
+    def stats(self):
+        return {
+            "symbols": 0 if self.table is None else len(self.table),
+            "built_at": self.built_at.strftime("%Y-%m-%d %H:%M:%S") if self.built_at else None,
+        }
+
+def _to_items(table):
+    """将指标表按列转换为 ScreenerItem 的字段列表，NaN转为None"""
+    columns = [
+        table.index.tolist(),
+        pd.to_datetime(table["date"]).dt.strftime("%Y-%m-%d").tolist(),
+    ]
+    for name in SCREENER_FIELDS:
+        column = table[name]
+        if pd.api.types.is_bool_dtype(column):
+            columns.append(column.tolist())
+        elif name == "volume":
+            columns.append(column.astype("int64").tolist())
+        else:
+            values = column.astype(float).tolist()
+            columns.append([None if value != value else value for value in values])
+    keys = ["symbol", "date"] + SCREENER_FIELDS
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+async def sync_universe(symbols=None, start_date=None, end_date=None, concurrency=None):
+    """
+    把全市场（或指定股票）的历史数据同步到本地行情存储，供筛选使用
+
+    已覆盖的区间不会重复请求，每天收盘后运行一次即可只补拉当天的数据。
+    """
+    from app.services.data_fetcher import fetch_stock_data_async
+    from app.services.symbol_directory import symbol_directory
+
+    if symbols is None:
+        symbols = await symbol_directory.symbols()
+    if start_date is None:
+        start_date = (
+            datetime.datetime.now() - datetime.timedelta(days=settings.SCREENER_LOOKBACK_DAYS)
+        ).strftime("%Y%m%d")
+
+    semaphore = asyncio.Semaphore(concurrency or settings.BATCH_CONCURRENCY)
+
+    async def sync_one(symbol):
+        async with semaphore:
+            try:
+                df = await fetch_stock_data_async(symbol, start_date, end_date, use_alternative=False)
+                return not df.empty
+            except Exception as e:
+                logging.error(f"同步股票 {symbol} 失败: {e}")
+                return False
+
+    results = await asyncio.gather(*(sync_one(symbol) for symbol in symbols))
+    logging.info(f"同步完成：成功 {sum(results)} 只，失败 {len(results) - sum(results)} 只")
+    return sum(results)
+
+# 全局筛选指标表
+screener_index = ScreenerIndex("qfq", settings.SCREENER_LOOKBACK_DAYS)
+
+def main():
+    parser = argparse.ArgumentParser(description='同步全市场历史数据到本地存储，或在本地数据上筛选股票')
+    parser.add_argument('--sync', action='store_true', help='先同步全市场历史数据')
+    parser.add_argument('--condition', help="筛选条件，如 'MA_bullish and RSI6 < 50'", default=None)
+    parser.add_argument('--limit', type=int, help='最多输出的条数', default=50)
+
+    args = parser.parse_args()
+
+    if args.sync:
+        asyncio.run(sync_universe())
+    if args.condition:
+        screener_index.build()
+        total, items = screener_index.screen(compile_condition(args.condition), args.limit)
+        print(f"共 {total} 只股票满足条件")
+        print(pd.DataFrame(items).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
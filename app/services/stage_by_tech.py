@@ -1,7 +1,13 @@
 import pandas as pd
 import numpy as np
+import bisect
+import datetime
 import json
-from app.services.data_fetcher import fetch_stock_data
+import asyncio
+from app.core.logging import logging
+from app.core.metrics import timed
+from app.services.data_fetcher import fetch_stock_data_checked, last_bar_date
+from app.services.indicator_engine import shift
 
 def calculate_rsi(series, period=14):
     delta = series.diff()
@@ -33,89 +39,169 @@ def calculate_macd(close):
 def get_ma(df, window):
     return df['close'].rolling(window=window, min_periods=window).mean()
 
-def get_trend_signals(data):
-    data = data.copy()
-    data['RSI6'] = calculate_rsi(data['close'], 6)
-    data['RSI12'] = calculate_rsi(data['close'], 12)
-    data['RSI24'] = calculate_rsi(data['close'], 24)
-    data['K'], data['D'], data['J'] = calculate_kdj(data)
-    data['DIF'], data['DEA'], data['MACD_HIST'] = calculate_macd(data['close'])
-    data['MA5'] = get_ma(data, 5)
-    data['MA10'] = get_ma(data, 10)
-    data['MA20'] = get_ma(data, 20)
-    data['VOL_MA5'] = data['volume'].rolling(window=5, min_periods=5).mean()
-    data['VOL_MA10'] = data['volume'].rolling(window=10, min_periods=10).mean()
-
-    # 这里reset_index会把date变成一列，列名为'date'
-    recent = data.tail(5).reset_index()
-
-    results = []
-    for i in range(len(recent)):
-        row = recent.loc[i]
-        # MACD金叉
-        if i == 0:
-            macd_cross = False
-        else:
-            prev = recent.loc[i-1]
-            macd_cross = (prev['DIF'] < prev['DEA']) and (row['DIF'] > row['DEA'])
-        # KDJ金叉
-        if i == 0:
-            kdj_cross = False
+# TrendSignalItem 中除日期以外的字段（按输出顺序）和其中的信号字段
+SIGNAL_FIELDS = [
+    'close', 'volume', 'MA5', 'MA10', 'MA20', 'VOL_MA5', 'VOL_MA10',
+    'DIF', 'DEA', 'MACD_HIST', 'MACD_gold_cross', 'K', 'D', 'J', 'KDJ_gold_cross',
+    'RSI6', 'RSI12', 'RSI24', 'RSI_rebound', 'MA_bullish',
+]
+SIGNAL_FLAG_FIELDS = {'MACD_gold_cross', 'KDJ_gold_cross', 'RSI_rebound', 'MA_bullish'}
+
+def format_signal_item(date, values):
+    """
+    把一根K线的指标和信号转换为 TrendSignalItem 的字段，NaN转为None
+
+    参数:
+    date: 日期，字符串或 datetime.date/Timestamp
+    values: 包含 SIGNAL_FIELDS 中各字段的映射
+    """
+    item = {'date': date if isinstance(date, str) else date.strftime('%Y-%m-%d')}
+    for name in SIGNAL_FIELDS:
+        value = values[name]
+        if name in SIGNAL_FLAG_FIELDS:
+            item[name] = bool(value)
+        elif name == 'close':
+            item[name] = float(value)
+        elif name == 'volume':
+            item[name] = int(value)
         else:
-            prev = recent.loc[i-1]
-            kdj_cross = (prev['K'] < prev['D']) and (row['K'] > row['D'])
-        # RSI反弹
-        if i == 0:
-            rsi_rebound = False
+            item[name] = float(value) if not np.isnan(value) else None
+    return item
+
+def signal_frame(data):
+    """
+    在全部历史上计算 stage_by_tech 的指标和信号
+
+    信号由前后两根K线的指标比较得出，整列向量化计算；第一根K线没有前一天可比较，交叉类信号为False。
+
+    参数:
+    data (DataFrame): 以日期为索引，包含 close、high、low、volume 列
+
+    返回:
+    DataFrame: 在 data 的基础上增加 SIGNAL_FIELDS 中的各列
+    """
+    close = data['close']
+    columns = {
+        'RSI6': calculate_rsi(close, 6),
+        'RSI12': calculate_rsi(close, 12),
+        'RSI24': calculate_rsi(close, 24),
+    }
+    columns['K'], columns['D'], columns['J'] = calculate_kdj(data)
+    columns['DIF'], columns['DEA'], columns['MACD_HIST'] = calculate_macd(close)
+    columns['MA5'] = get_ma(data, 5)
+    columns['MA10'] = get_ma(data, 10)
+    columns['MA20'] = get_ma(data, 20)
+    columns['VOL_MA5'] = data['volume'].rolling(window=5, min_periods=5).mean()
+    columns['VOL_MA10'] = data['volume'].rolling(window=10, min_periods=10).mean()
+
+    # MACD金叉、KDJ金叉、RSI反弹：与前一根K线比较，NaN参与比较的结果为False
+    dif, dea, k, d, rsi6 = (columns[name].to_numpy() for name in ('DIF', 'DEA', 'K', 'D', 'RSI6'))
+    ma5, ma10, ma20 = (columns[name].to_numpy() for name in ('MA5', 'MA10', 'MA20'))
+    columns['MACD_gold_cross'] = (shift(dif) < shift(dea)) & (dif > dea)
+    columns['KDJ_gold_cross'] = (shift(k) < shift(d)) & (k > d)
+    columns['RSI_rebound'] = (shift(rsi6) < 30) & (rsi6 >= 30)
+    # 多头排列
+    columns['MA_bullish'] = (ma5 > ma10) & (ma10 > ma20) & (close.to_numpy() > ma20)
+
+    # 一次拼接所有新列，避免逐列插入DataFrame的开销
+    return pd.concat([data, pd.DataFrame(columns, index=data.index)], axis=1)
+
+def format_signal_items(frame):
+    """
+    把 signal_frame 的结果按列转换为 TrendSignalItem 的字段列表，NaN转为None
+
+    与逐行调用 format_signal_item 的结果相同，但每列只转换一次
+    """
+    dates = pd.to_datetime(pd.Index(frame.index)).strftime('%Y-%m-%d').tolist()
+    columns = []
+    for name in SIGNAL_FIELDS:
+        column = frame[name]
+        if name in SIGNAL_FLAG_FIELDS:
+            columns.append(column.astype(bool).tolist())
+        elif name == 'close':
+            columns.append(column.astype(float).tolist())
+        elif name == 'volume':
+            columns.append(column.astype('int64').tolist())
         else:
-            prev = recent.loc[i-1]
-            rsi_rebound = (prev['RSI6'] < 30) and (row['RSI6'] >= 30)
-        # 多头排列
-        ma_bullish = (row['MA5'] > row['MA10']) and (row['MA10'] > row['MA20']) and (row['close'] > row['MA20'])
-
-        results.append({
-            'date': row['date'] if isinstance(row['date'], str) else row['date'].strftime('%Y-%m-%d'),
-            'close': float(row['close']),
-            'volume': int(row['volume']),
-            'MA5': float(row['MA5']) if not np.isnan(row['MA5']) else None,
-            'MA10': float(row['MA10']) if not np.isnan(row['MA10']) else None,
-            'MA20': float(row['MA20']) if not np.isnan(row['MA20']) else None,
-            'VOL_MA5': float(row['VOL_MA5']) if not np.isnan(row['VOL_MA5']) else None,
-            'VOL_MA10': float(row['VOL_MA10']) if not np.isnan(row['VOL_MA10']) else None,
-            'DIF': float(row['DIF']) if not np.isnan(row['DIF']) else None,
-            'DEA': float(row['DEA']) if not np.isnan(row['DEA']) else None,
-            'MACD_HIST': float(row['MACD_HIST']) if not np.isnan(row['MACD_HIST']) else None,
-            'MACD_gold_cross': bool(macd_cross),
-            'K': float(row['K']) if not np.isnan(row['K']) else None,
-            'D': float(row['D']) if not np.isnan(row['D']) else None,
-            'J': float(row['J']) if not np.isnan(row['J']) else None,
-            'KDJ_gold_cross': bool(kdj_cross),
-            'RSI6': float(row['RSI6']) if not np.isnan(row['RSI6']) else None,
-            'RSI12': float(row['RSI12']) if not np.isnan(row['RSI12']) else None,
-            'RSI24': float(row['RSI24']) if not np.isnan(row['RSI24']) else None,
-            'RSI_rebound': bool(rsi_rebound),
-            'MA_bullish': bool(ma_bullish)
-        })
-    return results
+            columns.append([None if value != value else value for value in column.astype(float).tolist()])
+    keys = ['date'] + SIGNAL_FIELDS
+    return [dict(zip(keys, row)) for row in zip(dates, *columns)]
+
+@timed("trend_signals")
+def get_trend_signals(data, lookback=5):
+    """
+    返回最近 lookback 根K线的指标和信号，按日期升序
+
+    指标总要在全部历史上计算，只有格式化的行数与 lookback 有关，返回1000条与返回5条的耗时相近。
+
+    参数:
+    data (DataFrame): 以日期为索引，包含 close、high、low、volume 列
+    lookback (int): 返回的K线条数，为None时返回全部历史
+    """
+    frame = signal_frame(data)
+    if lookback is not None:
+        frame = frame.tail(lookback)
+    return format_signal_items(frame)
+
+class CursorError(ValueError):
+    """分页游标无效"""
+
+def page_signals(items, cursor=None, limit=None):
+    """
+    按日期游标对信号列表分页
+
+    参数:
+    items (list): 按日期升序的信号列表
+    cursor (str): 上一页返回的 next_cursor（下一页第一条的日期，格式 'YYYY-MM-DD'），为None时从第一条开始
+    limit (int): 每页条数，为None时不分页
+
+    返回:
+    tuple: (当前页的信号列表, 下一页的游标；没有下一页时为None)
+    """
+    start = 0
+    if cursor:
+        try:
+            cursor = datetime.datetime.strptime(cursor, '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            raise CursorError(f"无效的分页游标: {cursor}")
+        start = bisect.bisect_left([item['date'] for item in items], cursor)
+    if limit is None:
+        return items[start:], None
+    end = start + limit
+    return items[start:end], items[end]['date'] if end < len(items) else None
 
 # 使用方法：
 # data = pd.read_csv('your_data.csv', parse_dates=['date'], index_col='date')
 # print(get_trend_signals(data))
 
 def analyze_stock(symbol, start_date, end_date):
+    """analyze_stock_async 的同步版本，供命令行和脚本使用"""
+    return asyncio.run(analyze_stock_async(symbol, start_date, end_date))
+
+async def analyze_stock_async(symbol, start_date, end_date):
     """分析股票并返回结果"""
+    stock_data, _ = await analyze_stock_checked(symbol, start_date, end_date)
+    return stock_data
+
+async def analyze_stock_checked(symbol, start_date, end_date):
+    """
+    与 analyze_stock_async 相同，同时返回数据最后一根K线的日期
+
+    返回:
+    tuple: (DataFrame或None, 最后一根K线的日期 'YYYYMMDD')；数据不完整时日期为None
+    """
     # 获取股票数据
-    stock_data = fetch_stock_data(symbol, start_date, end_date)
+    stock_data, complete = await fetch_stock_data_checked(symbol, start_date, end_date)
     
     if stock_data.empty:
         logging.error(f"无法获取股票 {symbol} 的数据")
-        return None
+        return None, None
     
     # 检查数据长度是否足够计算技术指标
     if len(stock_data) < 20:
         logging.warning(f"警告：获取的数据长度({len(stock_data)})不足以计算某些技术指标")
 
-    return stock_data
+    return stock_data, last_bar_date(stock_data) if complete else None
 
 # 测试函数
 if __name__ == "__main__":
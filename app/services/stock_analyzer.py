@@ -1,10 +1,16 @@
 import pandas as pd
 import numpy as np
-import akshare as ak
+import asyncio
 
+from app.core.config import settings
 from app.core.logging import logging
+from app.core.metrics import timed
+from app.core.responses import frame_records
 
-from app.services.data_fetcher import fetch_stock_data
+from app.services.data_fetcher import fetch_stock_data_checked, last_bar_date
+from app.services.symbol_directory import symbol_directory
+from app.services.indicator_engine import latest_indicator_values
+from app.services.live_indicators import live_stock_data
 from app.services.tech_indicators import calculate_moving_averages, calculate_oscillator_indicators
 
 def count_signals(df):
@@ -15,13 +21,15 @@ def count_signals(df):
     return buy_count, sell_count, neutral_count
 
 def get_stock_info(symbol, stock_data):
+    """get_stock_info_async 的同步版本"""
+    return asyncio.run(get_stock_info_async(symbol, stock_data))
+
+async def get_stock_info_async(symbol, stock_data):
     """获取股票基本信息"""
-    try:
-        # 获取股票名称
-        stock_info_df = ak.stock_info_a_code_name()
-        stock_name = stock_info_df[stock_info_df['code'] == symbol]['name'].values[0]
-    except Exception as e:
-        logging.warning(f"获取股票名称失败: {e}")
+    # 从本地代码目录获取股票名称
+    stock_name = await symbol_directory.get_name(symbol)
+    if stock_name is None:
+        logging.warning(f"获取股票名称失败: 代码表中没有 {symbol}")
         stock_name = "未知"
     
     # 获取最新价格和日期
@@ -36,11 +44,19 @@ def get_stock_info(symbol, stock_data):
         "日期": str(latest_date)
     }
 
-def calculate_indicators(stock_data):
-    """计算各类技术指标"""
-    # 计算技术指标
-    oscillator_df = calculate_oscillator_indicators(stock_data)
-    ma_df = calculate_moving_averages(stock_data)
+@timed("indicators")
+def calculate_indicators(stock_data, values=None):
+    """
+    计算各类技术指标
+
+    values 为已经算好的最新指标（如盘中模式的结果），为None时重新计算
+    """
+    # 计算技术指标（所有指标一次算完，两张表共用结果）
+    if values is None:
+        with timed("indicator_values"):
+            values = latest_indicator_values(stock_data)
+    oscillator_df = calculate_oscillator_indicators(stock_data, values)
+    ma_df = calculate_moving_averages(stock_data, values)
     
     # 计算震荡指标的信号数量
     oscillator_buy, oscillator_sell, oscillator_neutral = count_signals(oscillator_df)
@@ -58,11 +74,12 @@ def calculate_indicators(stock_data):
     
     return oscillator_df, ma_df, oscillator_counts, ma_counts, total_counts
 
+@timed("result_json")
 def create_result_json(oscillator_df, ma_df, oscillator_counts, ma_counts, total_counts, stock_info):
     """创建结果JSON"""
-    # 转换DataFrame为字典
-    oscillator_indicators = oscillator_df.to_dict('records')
-    ma_indicators = ma_df.to_dict('records')
+    # 转换DataFrame为字典（数据不足时的NaN转为None，保证可以JSON序列化）
+    oscillator_indicators = frame_records(oscillator_df)
+    ma_indicators = frame_records(ma_df)
     
     # 创建结果字典
     result = {
@@ -97,26 +114,87 @@ def create_result_json(oscillator_df, ma_df, oscillator_counts, ma_counts, total
     
     return result
 
-def analyze_stock(symbol, start_date, end_date):
-    """分析股票并返回结果"""
+def analyze_stock(symbol, start_date, end_date, live=False):
+    """analyze_stock_async 的同步版本，供命令行和脚本使用"""
+    return asyncio.run(analyze_stock_async(symbol, start_date, end_date, live))
+
+async def analyze_stock_async(symbol, start_date, end_date, live=False):
+    """
+    分析股票并返回结果
+
+    live 为True时忽略 end_date，在已定型的历史数据后加入当日的临时K线（盘中模式）
+    """
+    result, _ = await analyze_stock_checked(symbol, start_date, end_date, live)
+    return result
+
+async def analyze_stock_checked(symbol, start_date, end_date, live=False):
+    """
+    与 analyze_stock_async 相同，同时返回结果所用数据的最后一根K线日期
+
+    返回:
+    tuple: (结果或None, 最后一根K线的日期 'YYYYMMDD')；盘中模式或数据不完整
+           （部分区间补拉失败、使用了备选数据源）时日期为None，供响应缓存判断能否缓存
+    """
     # 获取股票数据
-    stock_data = fetch_stock_data(symbol, start_date, end_date)
+    values = None
+    complete = False
+    if live:
+        stock_data, values = await live_stock_data(symbol, start_date)
+    else:
+        stock_data, complete = await fetch_stock_data_checked(symbol, start_date, end_date)
     
     if stock_data.empty:
         logging.error(f"无法获取股票 {symbol} 的数据")
-        return None
+        return None, None
     
     # 检查数据长度是否足够计算技术指标
     if len(stock_data) < 20:
         logging.warning(f"警告：获取的数据长度({len(stock_data)})不足以计算某些技术指标(如CCI需要至少20个数据点)")
     
     # 获取股票基本信息
-    stock_info = get_stock_info(symbol, stock_data)
+    with timed("stock_info"):
+        stock_info = await get_stock_info_async(symbol, stock_data)
     
-    # 计算各类指标
-    oscillator_df, ma_df, oscillator_counts, ma_counts, total_counts = calculate_indicators(stock_data)
+    # 计算各类指标（CPU密集，放到线程中执行，不阻塞事件循环）
+    oscillator_df, ma_df, oscillator_counts, ma_counts, total_counts = await asyncio.to_thread(
+        calculate_indicators, stock_data, values
+    )
     
     # 创建结果JSON
     result = create_result_json(oscillator_df, ma_df, oscillator_counts, ma_counts, total_counts, stock_info)
     
-    return result
\ No newline at end of file
+    return result, last_bar_date(stock_data) if complete else None
+
+async def analyze_stocks_async(symbols, start_date, end_date, concurrency=None):
+    """
+    并发分析多只股票
+
+    参数:
+    symbols (list): 股票代码列表，重复的代码只分析一次
+    start_date (str): 开始日期，格式 'YYYYMMDD'
+    end_date (str): 结束日期，格式 'YYYYMMDD'
+    concurrency (int): 同时分析的股票数量上限，默认使用 BATCH_CONCURRENCY
+
+    返回:
+    tuple: (成功结果 {代码: 结果}, 失败信息 {代码: 错误信息})
+    """
+    semaphore = asyncio.Semaphore(concurrency or settings.BATCH_CONCURRENCY)
+
+    async def analyze_one(symbol):
+        if not await symbol_directory.contains(symbol):
+            return symbol, None, f"未知的股票代码 {symbol}"
+        async with semaphore:
+            try:
+                result = await analyze_stock_async(symbol, start_date, end_date)
+            except Exception as e:
+                logging.error(f"批量分析股票 {symbol} 失败: {e}")
+                return symbol, None, str(e)
+        if result is None:
+            return symbol, None, f"无法获取股票 {symbol} 的数据"
+        return symbol, result, None
+
+    outcomes = await asyncio.gather(*(analyze_one(symbol) for symbol in dict.fromkeys(symbols)))
+
+    results = {symbol: result for symbol, result, error in outcomes if error is None}
+    errors = {symbol: error for symbol, result, error in outcomes if error is not None}
+    return results, errors
@@ -1,13 +1,47 @@
 import pandas as pd
 import argparse
+import asyncio
+import codecs
 import os
+import zipfile
 from datetime import datetime
 
+from app.core.config import settings
 from app.core.logging import logging
 
 # 导入自定义模块
-from app.services.data_fetcher import fetch_stock_data
+from app.services.data_fetcher import fetch_stock_data_async
 
+# 尝试导入pyarrow，用于Parquet和Arrow IPC导出
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# 导出文件中的列名，format_stock_data 和列选择共用
+COLUMN_NAMES = {
+    'date': '日期',
+    'open': '开盘价',
+    'close': '收盘价',
+    'high': '最高价',
+    'low': '最低价',
+    'volume': '成交量'
+}
+# 多只股票导出到同一个文件时区分股票的列
+SYMBOL_COLUMN = '股票代码'
+
+# 支持的导出格式及文件扩展名
+EXPORT_FORMATS = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrow'}
+
+# format_stock_data 输出的全部列（stock_zh_a_hist 的字段），用于校验列选择
+EXPORT_COLUMNS = [
+    '日期', '股票代码', '开盘价', '收盘价', '最高价', '最低价', '成交量',
+    '成交额', '振幅', '涨跌幅', '涨跌额', '换手率'
+]
+
+class ExportFormatError(ValueError):
+    """导出格式或列选择无效"""
 
 def calculate_daily_change(data):
     """
@@ -16,7 +50,7 @@ def calculate_daily_change(data):
     # 计算涨跌幅 = (当日收盘价 - 前一日收盘价) / 前一日收盘价 * 100%
     data['涨跌幅'] = data['close'].pct_change() * 100
     # 第一天的涨跌幅设为0
-    data['涨跌幅'].iloc[0] = 0
+    data.iloc[0, data.columns.get_loc('涨跌幅')] = 0
     return data
 
 def format_stock_data(data):
@@ -30,17 +64,11 @@ def format_stock_data(data):
     formatted_data = calculate_daily_change(formatted_data)
     
     # 重命名列
-    formatted_data.rename(columns={
-        'open': '开盘价',
-        'close': '收盘价',
-        'high': '最高价',
-        'low': '最低价',
-        'volume': '成交量'
-    }, inplace=True)
+    formatted_data.rename(columns=COLUMN_NAMES, inplace=True)
     
     # 重置索引，将日期变为列
     formatted_data.reset_index(inplace=True)
-    formatted_data.rename(columns={'date': '日期'}, inplace=True)
+    formatted_data.rename(columns=COLUMN_NAMES, inplace=True)
     
     # 四舍五入到两位小数
     for col in ['开盘价', '收盘价', '最高价', '最低价', '涨跌幅']:
@@ -48,57 +76,371 @@ def format_stock_data(data):
     
     return formatted_data
 
-def export_stock_data(symbol, start_date=None, end_date=None, output_dir='./output'):
+def check_format(file_format):
+    """检查导出格式是否受支持，Parquet/Arrow 需要安装 pyarrow"""
+    if file_format not in EXPORT_FORMATS:
+        raise ExportFormatError(f"不支持的导出格式 {file_format}，可选: {', '.join(EXPORT_FORMATS)}")
+    if file_format != 'csv' and pa is None:
+        raise ExportFormatError("导出 Parquet/Arrow 格式需要安装 pyarrow")
+
+def resolve_columns(columns):
     """
-    导出股票数据为CSV文件
+    把列选择统一为导出文件中的列名
+
+    参数:
+    columns (list): 导出列名（如 '收盘价'）或原始字段名（如 'close'），为空时导出全部列
+
+    返回:
+    list: 导出列名列表；为None表示全部列
+    """
+    if not columns:
+        return None
+    resolved = [COLUMN_NAMES.get(name, name) for name in columns]
+    unknown = [name for name in resolved if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ExportFormatError(f"未知的列: {', '.join(unknown)}，可选: {', '.join(EXPORT_COLUMNS)}")
+    return resolved
+
+def select_columns(formatted_data, columns=None, symbol=None):
+    """
+    按列选择截取导出数据，日期列总是保留
+
+    参数:
+    formatted_data (DataFrame): format_stock_data 的结果
+    columns (list): resolve_columns 的结果
+    symbol (str): 给出时在日期后写入股票代码列，用于多只股票导出到同一个文件
+    """
+    if symbol is not None:
+        formatted_data = formatted_data.drop(columns=[SYMBOL_COLUMN], errors='ignore')
+        formatted_data.insert(1, SYMBOL_COLUMN, symbol)
+    if columns is None:
+        return formatted_data
+    keep = ['日期'] + ([SYMBOL_COLUMN] if symbol is not None else [])
+    # 数据源缺少的列（如当日行情兜底数据）填充为空
+    return formatted_data.reindex(columns=keep + [c for c in columns if c not in keep])
+
+def export_stock_data(symbol, start_date=None, end_date=None, output_dir='./output', file_format='csv', columns=None):
+    """
+    export_stock_data_async 的同步版本，供命令行使用
+    """
+    return asyncio.run(
+        export_stock_data_async(symbol, start_date, end_date, output_dir, file_format, columns)
+    )
+
+async def export_stock_data_async(symbol, start_date=None, end_date=None, output_dir='./output', file_format='csv', columns=None):
+    """
+    导出股票数据为CSV、Parquet或Arrow IPC文件
     
     参数:
     symbol (str): 股票代码
     start_date (str): 开始日期，格式 'YYYYMMDD'
     end_date (str): 结束日期，格式 'YYYYMMDD'
     output_dir (str): 输出目录
+    file_format (str): 导出格式，'csv'、'parquet' 或 'arrow'
+    columns (list): 导出的列，为None时导出全部列
     """
+    check_format(file_format)
+    columns = resolve_columns(columns)
+    
     # 获取股票数据
     logging.info(f"获取股票 {symbol} 从 {start_date} 到 {end_date} 的数据")
-    stock_data = fetch_stock_data(symbol, start_date, end_date)
+    stock_data = await fetch_stock_data_async(symbol, start_date, end_date)
     
     if stock_data.empty:
         logging.error(f"无法获取股票 {symbol} 的数据")
         return False
     
+    # 格式化数据并写文件（阻塞操作，放到线程中执行）
+    output_file = await asyncio.to_thread(
+        _write_export, symbol, stock_data, output_dir, file_format, columns
+    )
+    logging.info(f"股票数据已导出到 {output_file}")
+    
+    return output_file
+
+def _write_export(symbol, stock_data, output_dir, file_format='csv', columns=None):
+    """格式化股票数据并写入文件，返回文件路径"""
     # 格式化数据
-    formatted_data = format_stock_data(stock_data)
+    formatted_data = select_columns(format_stock_data(stock_data), columns)
     
     # 创建输出目录
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
     # 生成输出文件名
-    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(output_dir, f"{symbol}_{current_time}.csv")
+    output_file = os.path.join(output_dir, export_filename(symbol, EXPORT_FORMATS[file_format]))
     
     # 导出为CSV
-    formatted_data.to_csv(output_file, index=False, encoding='utf-8-sig')
-    logging.info(f"股票数据已导出到 {output_file}")
+    if file_format == 'csv':
+        formatted_data.to_csv(output_file, index=False, encoding='utf-8-sig')
+    else:
+        with open(output_file, 'wb') as f:
+            for chunk in _iter_table_bytes([_to_arrow_table(formatted_data)], file_format):
+                f.write(chunk)
     
     return output_file
 
+# 流式导出时每块CSV包含的行数
+CSV_CHUNK_ROWS = 1000
+
+def export_filename(symbol, extension):
+    """生成带时间戳的导出文件名"""
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{symbol}_{current_time}.{extension}"
+
+def iter_csv_chunks(formatted_data, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    逐块生成CSV字节，内容与 to_csv(index=False, encoding='utf-8-sig') 写出的文件相同
+
+    参数:
+    formatted_data (DataFrame): format_stock_data 的结果
+    chunk_rows (int): 每块的行数
+    """
+    yield codecs.BOM_UTF8
+    if formatted_data.empty:
+        yield formatted_data.to_csv(index=False).encode("utf-8")
+        return
+    for start in range(0, len(formatted_data), chunk_rows):
+        chunk = formatted_data.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=start == 0).encode("utf-8")
+
+async def stream_stock_export(symbol, start_date=None, end_date=None, file_format='csv', columns=None):
+    """
+    获取股票数据并返回逐块生成文件字节的迭代器，不写临时文件
+
+    日期范围直接交给数据获取层，只读取和格式化需要的行。
+
+    参数:
+    file_format (str): 导出格式，'csv'、'parquet' 或 'arrow'
+    columns (list): 导出的列，为None时导出全部列
+
+    返回:
+    iterator: 文件字节块；无法获取数据时返回None
+    """
+    check_format(file_format)
+    columns = resolve_columns(columns)
+    stock_data = await fetch_stock_data_async(symbol, start_date, end_date)
+    if stock_data.empty:
+        logging.error(f"无法获取股票 {symbol} 的数据")
+        return None
+
+    formatted_data = await asyncio.to_thread(
+        lambda: select_columns(format_stock_data(stock_data), columns)
+    )
+    if file_format == 'csv':
+        return iter_csv_chunks(formatted_data)
+    table = await asyncio.to_thread(_to_arrow_table, formatted_data)
+    return _iter_table_bytes([table], file_format)
+
+class _StreamWriter:
+    """
+    只能追加写入的缓冲区
+
+    没有 seek，zipfile 会改用数据描述符记录大小和校验值，不回头修改已写出的内容，
+    因此写入的字节可以随时取走发送；pyarrow 的写入器只需要 tell 和 closed。
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _to_arrow_table(formatted_data):
+    """导出数据转为Arrow表，日期列为date类型，不保留索引"""
+    formatted_data = formatted_data.assign(日期=pd.to_datetime(formatted_data['日期']).dt.date)
+    return pa.Table.from_pandas(formatted_data, preserve_index=False)
+
+def _conform(table, schema):
+    """
+    把表转换为目标schema：缺少的列补空值，类型不同的列强制转换
+
+    多只股票写入同一个文件时，各只股票的数据源可能不同（历史数据或当日行情兜底），列和类型不完全一致。
+    """
+    if table.schema.equals(schema):
+        return table
+    arrays = []
+    for field in schema:
+        if field.name in table.column_names:
+            arrays.append(table.column(field.name).cast(field.type))
+        else:
+            arrays.append(pa.nulls(table.num_rows, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+class _TableStream:
+    """
+    把若干Arrow表逐个写成一个Parquet或Arrow IPC文件
+
+    schema 取第一张表的，每张表写成一个行组（Arrow IPC 为一个记录批次），
+    写入后即可取走对应的字节；Parquet 默认记录每个行组日期列的最小最大值，读取端可以按日期跳过行组。
+    """
+
+    def __init__(self, file_format):
+        self.file_format = file_format
+        self._sink = _StreamWriter()
+        self._writer = None
+        self._schema = None
+
+    def _open(self, schema):
+        self._schema = schema
+        if self.file_format == 'parquet':
+            self._writer = pq.ParquetWriter(self._sink, schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def write(self, table):
+        """写入一张表，返回产生的字节"""
+        if self._writer is None:
+            self._open(table.schema)
+        self._writer.write_table(_conform(table, self._schema))
+        return self._sink.drain()
+
+    def close(self):
+        """写出文件尾，返回剩余的字节；没有写入过数据时生成只有日期和股票代码列的空文件"""
+        if self._writer is None:
+            self._open(pa.schema([('日期', pa.date32()), (SYMBOL_COLUMN, pa.string())]))
+        self._writer.close()
+        return self._sink.drain()
+
+def _iter_table_bytes(tables, file_format):
+    """把Arrow表依次写成一个文件，逐块生成字节"""
+    stream = _TableStream(file_format)
+    for table in tables:
+        yield stream.write(table)
+    yield stream.close()
+
+def _zip_member(archive, writer, name, formatted_data):
+    """把一只股票的CSV压缩写入zip，返回这期间产生的字节"""
+    with archive.open(name, mode="w") as member:
+        for chunk in iter_csv_chunks(formatted_data):
+            member.write(chunk)
+    return writer.drain()
+
+async def _iter_stock_frames(symbols, start_date=None, end_date=None):
+    """
+    并发获取多只股票的数据（并发数为 BATCH_CONCURRENCY），按传入顺序逐只生成 (股票代码, 数据)
+
+    重复的代码只获取一次；获取失败的股票生成空DataFrame。
+    """
+    symbols = list(dict.fromkeys(symbols))
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def fetch(symbol):
+        async with semaphore:
+            try:
+                return await fetch_stock_data_async(symbol, start_date, end_date)
+            except Exception as e:
+                logging.error(f"导出股票 {symbol} 时获取数据失败: {e}")
+                return pd.DataFrame()
+
+    tasks = [asyncio.create_task(fetch(symbol)) for symbol in symbols]
+    try:
+        for symbol, task in zip(symbols, tasks):
+            yield symbol, await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def iter_zip_archive(symbols, start_date=None, end_date=None):
+    """
+    流式生成包含多只股票CSV的zip文件
+
+    每压缩完一只股票就发送对应的字节，整个压缩包不落盘。获取失败的股票记录在 errors.txt 中。
+
+    参数:
+    symbols (list): 股票代码列表，重复的代码只导出一次
+    start_date (str): 开始日期，格式 'YYYYMMDD'
+    end_date (str): 结束日期，格式 'YYYYMMDD'
+    """
+    writer = _StreamWriter()
+    errors = []
+    frames = _iter_stock_frames(symbols, start_date, end_date)
+    try:
+        with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            async for symbol, stock_data in frames:
+                if stock_data.empty:
+                    errors.append(f"{symbol}: 无法获取数据")
+                    continue
+                formatted_data = await asyncio.to_thread(format_stock_data, stock_data)
+                yield await asyncio.to_thread(
+                    _zip_member, archive, writer, f"{symbol}.csv", formatted_data
+                )
+            if errors:
+                archive.writestr("errors.txt", "\n".join(errors))
+        # 关闭时写出中央目录
+        yield writer.drain()
+    finally:
+        await frames.aclose()
+
+async def iter_columnar_export(symbols, file_format='parquet', start_date=None, end_date=None, columns=None):
+    """
+    流式生成包含多只股票数据的单个Parquet或Arrow IPC文件
+
+    每只股票写成一个行组，并在日期后增加股票代码列；获取失败的股票跳过。
+    调用前应先用 check_format 和 resolve_columns 校验参数。
+
+    参数:
+    symbols (list): 股票代码列表，重复的代码只导出一次
+    file_format (str): 'parquet' 或 'arrow'
+    start_date (str): 开始日期，格式 'YYYYMMDD'
+    end_date (str): 结束日期，格式 'YYYYMMDD'
+    columns (list): resolve_columns 的结果，为None时导出全部列
+    """
+    stream = _TableStream(file_format)
+    frames = _iter_stock_frames(symbols, start_date, end_date)
+
+    def to_table(symbol, stock_data):
+        return _to_arrow_table(select_columns(format_stock_data(stock_data), columns, symbol))
+
+    try:
+        async for symbol, stock_data in frames:
+            if stock_data.empty:
+                logging.warning(f"股票 {symbol} 没有数据，导出时跳过")
+                continue
+            table = await asyncio.to_thread(to_table, symbol, stock_data)
+            yield await asyncio.to_thread(stream.write, table)
+        yield await asyncio.to_thread(stream.close)
+    finally:
+        await frames.aclose()
+
 def main():
     # 解析命令行参数
-    parser = argparse.ArgumentParser(description='导出股票数据为CSV文件')
+    parser = argparse.ArgumentParser(description='导出股票数据为CSV、Parquet或Arrow IPC文件')
     parser.add_argument('symbol', help='股票代码')
     parser.add_argument('--start_date', help='开始日期 (YYYYMMDD)', default=None)
     parser.add_argument('--end_date', help='结束日期 (YYYYMMDD)', default=None)
     parser.add_argument('--output_dir', help='输出目录', default='./output')
+    parser.add_argument('--format', help='导出格式', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--columns', help='导出的列，用逗号分隔，如 收盘价,成交量', default=None)
     
     args = parser.parse_args()
+    columns = args.columns.split(',') if args.columns else None
     
     # 导出数据
     output_file = export_stock_data(
         args.symbol, 
         args.start_date, 
         args.end_date, 
-        args.output_dir
+        args.output_dir,
+        args.format,
+        columns
     )
     
     if output_file:
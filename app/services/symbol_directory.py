@@ -0,0 +1,143 @@
+import asyncio
+import datetime
+import json
+import os
+
+import akshare as ak
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.services.upstream import call_upstream
+
+class SymbolDirectory:
+    """
+    A股代码与名称的目录
+
+    akshare 的 stock_info_a_code_name 每次都会下载整张代码表，这里只下载一次，
+    以字典建立索引，持久化到磁盘供冷启动使用，并在后台按天刷新。
+    """
+
+    def __init__(self, path, refresh_interval):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.updated_at = None
+        self._names = {}
+        self._lock = asyncio.Lock()
+
+    async def get_name(self, symbol):
+        """返回股票名称，目录中不存在时返回None"""
+        await self.ensure_loaded()
+        return self._names.get(symbol)
+
+    async def contains(self, symbol):
+        """
+        判断股票代码是否存在
+
+        目录无法加载时无从判断，返回True，由后续的数据获取决定是否有效
+        """
+        await self.ensure_loaded()
+        return not self._names or symbol in self._names
+
+    async def symbols(self):
+        """返回全部股票代码"""
+        await self.ensure_loaded()
+        return list(self._names)
+
+    async def ensure_loaded(self):
+        """
+        目录为空时先读磁盘，磁盘上也没有再从上游下载
+
+        磁盘上的目录即使已过期也先使用，由后台任务负责刷新
+        """
+        if self._names:
+            return
+        async with self._lock:
+            if self._names:
+                return
+            await asyncio.to_thread(self._load_from_disk)
+            if not self._names:
+                await self._refresh_locked()
+
+    async def refresh(self):
+        """从上游重新下载代码表"""
+        async with self._lock:
+            await self._refresh_locked()
+
+    def is_stale(self):
+        if self.updated_at is None:
+            return True
+        return datetime.datetime.now() - self.updated_at >= self.refresh_interval
+
+    async def run_refresher(self):
+        """后台任务：启动时加载目录，之后每隔 refresh_interval 刷新一次"""
+        while True:
+            try:
+                await self.ensure_loaded()
+                if self.is_stale():
+                    await self.refresh()
+            except Exception as e:
+                logging.error(f"刷新股票代码表失败: {e}")
+
+            if self.updated_at is None or self.is_stale():
+                # 刷新失败时一分钟后重试
+                delay = 60
+            else:
+                next_refresh = self.updated_at + self.refresh_interval
+                delay = max((next_refresh - datetime.datetime.now()).total_seconds(), 60)
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            "symbols": len(self._names),
+            "updated_at": self.updated_at.strftime("%Y-%m-%d %H:%M:%S") if self.updated_at else None,
+        }
+
+    async def _refresh_locked(self):
+        # akshare 对该函数做了进程内 lru_cache，刷新时需要先清掉
+        if hasattr(ak.stock_info_a_code_name, "cache_clear"):
+            ak.stock_info_a_code_name.cache_clear()
+        try:
+            df = await call_upstream(ak.stock_info_a_code_name)
+        except Exception as e:
+            logging.warning(f"下载股票代码表失败: {e}")
+            return
+
+        names = dict(zip(df["code"].astype(str), df["name"].astype(str)))
+        if not names:
+            logging.warning("下载的股票代码表为空，保留原有目录")
+            return
+
+        self._names = names
+        self.updated_at = datetime.datetime.now()
+        await asyncio.to_thread(self._save_to_disk)
+        logging.info(f"股票代码表已刷新，共 {len(names)} 只股票")
+
+    def _load_from_disk(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._names = data["names"]
+            self.updated_at = datetime.datetime.strptime(data["updated_at"], "%Y-%m-%d %H:%M:%S")
+        except Exception as e:
+            logging.warning(f"读取本地股票代码表失败: {e}")
+
+    def _save_to_disk(self):
+        data = {
+            "updated_at": self.updated_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "names": self._names,
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"保存股票代码表失败: {e}")
+
+# 全局股票代码目录
+symbol_directory = SymbolDirectory(
+    settings.SYMBOL_DIRECTORY_PATH,
+    datetime.timedelta(hours=settings.SYMBOL_DIRECTORY_REFRESH_HOURS),
+)
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from app.core.logging import logging
+from app.core.metrics import timed
+from app.services.indicator_engine import MA_PERIODS, latest_indicator_values
 
 def calculate_rsi(data, period=14):
     """
@@ -273,31 +275,35 @@ def calculate_ultimate_oscillator(data, short_period=7, mid_period=14, long_peri
 
 
 
-def calculate_moving_averages(data):
+@timed("moving_averages")
+def calculate_moving_averages(data, values=None):
     """
     计算SMA和EMA,并生成交易信号
     :param data: DataFrame,需包含 'close' 列
+    :param values: indicator_engine.latest_indicator_values 的结果，为None时重新计算
     :return: 包含MA数据的DataFrame
     """
+    if values is None:
+        values = latest_indicator_values(data)
+    
     ma_data = {
         '名称': [],
         '值': [],
         '信号': []
     }
     
-    periods = [10, 20, 30, 50, 100, 200]
     current_price = data['close'].iloc[-1]
     
-    for period in periods:
+    for period in MA_PERIODS:
         if len(data) >= period:
-            # 计算SMA
-            sma = data['close'].rolling(window=period).mean().iloc[-1]
+            # SMA
+            sma = values[f'sma_{period}']
             ma_data['名称'].append(f'SMA({period})')
             ma_data['值'].append(round(sma, 2))
             ma_data['信号'].append('买入' if current_price > sma else '卖出')
             
-            # 计算EMA
-            ema = data['close'].ewm(span=period, adjust=False).mean().iloc[-1]
+            # EMA
+            ema = values[f'ema_{period}']
             ma_data['名称'].append(f'EMA({period})')
             ma_data['值'].append(round(ema, 2))
             ma_data['信号'].append('买入' if current_price > ema else '卖出')
@@ -308,78 +314,84 @@ def calculate_moving_averages(data):
     
     return pd.DataFrame(ma_data)
 
-def calculate_oscillator_indicators(data):
+@timed("oscillators")
+def calculate_oscillator_indicators(data, values=None):
     """
     计算震荡指标
+    :param data: DataFrame,需包含 'high'、'low'、'close'、'volume' 列
+    :param values: indicator_engine.latest_indicator_values 的结果，为None时重新计算
     """
+    if values is None:
+        values = latest_indicator_values(data)
+    
     oscillator_data = {
         '名称': [],
         '值': [],
         '信号': []
     }
     
-    # 计算RSI
-    rsi = calculate_rsi(data)
+    # RSI
+    rsi = values['rsi']
     oscillator_data['名称'].append('RSI(14)')
     oscillator_data['值'].append(round(rsi, 2))
     oscillator_data['信号'].append('买入' if rsi < 30 else '卖出' if rsi > 70 else '中立')
     
-    # 计算Stochastic
-    k, d = calculate_stochastic(data)
+    # Stochastic
+    k = values['stoch_k']
     oscillator_data['名称'].append('Stochastic %K (14, 3, 3)')
     oscillator_data['值'].append(round(k, 2))
     oscillator_data['信号'].append('买入' if k < 20 else '卖出' if k > 80 else '中立')
     
-    # 计算CCI
-    cci = calculate_cci(data)
+    # CCI
+    cci = values['cci']
     oscillator_data['名称'].append('CCI指标(20)')
     oscillator_data['值'].append(round(cci, 2))
     oscillator_data['信号'].append('买入' if cci < -100 else '卖出' if cci > 100 else '中立')
     
-    # 计算ADX
-    adx = calculate_adx(data)
+    # ADX
+    adx = values['adx']
     oscillator_data['名称'].append('平均趋向指数ADX(14)')
     oscillator_data['值'].append(round(adx, 2))
     oscillator_data['信号'].append('中立')  # ADX通常不直接给出买卖信号
     
-    # 计算AO
-    ao = calculate_ao(data)
+    # AO
+    ao = values['ao']
     oscillator_data['名称'].append('动量震荡指标(AO)')
     oscillator_data['值'].append(round(ao, 2))
     oscillator_data['信号'].append('买入' if ao > 0 else '卖出' if ao < 0 else '中立')
     
-    # 计算Williams %R
-    williams_r = calculate_williams_r(data)
+    # Williams %R
+    williams_r = values['williams_r']
     oscillator_data['名称'].append('威廉指标(10)')
     oscillator_data['值'].append(round(williams_r, 2))
     oscillator_data['信号'].append('买入' if williams_r < -80 else '卖出' if williams_r > -20 else '中立')
     
-    # 计算MACD
-    macd_line, signal_line, histogram = calculate_macd(data)
+    # MACD
+    histogram = values['macd_hist']
     oscillator_data['名称'].append('MACD Level (12, 26)')
     oscillator_data['值'].append(round(histogram, 2))
     oscillator_data['信号'].append('买入' if histogram > 0 else '卖出' if histogram < 0 else '中立')
     
-    # 计算Stochastic RSI
-    k_fast, d_fast = calculate_stoch_rsi(data)
+    # Stochastic RSI
+    k_fast = values['stoch_rsi_k']
     oscillator_data['名称'].append('Stochastic RSI Fast (3, 3, 14, 14)')
     oscillator_data['值'].append(round(k_fast, 2))
     oscillator_data['信号'].append('买入' if k_fast < 20 else '卖出' if k_fast > 80 else '中立')
     
-    # 计算Chaikin Money Flow
-    cmf = calculate_chaikin_money_flow(data)
+    # Chaikin Money Flow
+    cmf = values['cmf']
     oscillator_data['名称'].append('顺势百分比变动 (14)')
     oscillator_data['值'].append(round(cmf, 2))
     oscillator_data['信号'].append('买入' if cmf > 0 else '卖出' if cmf < 0 else '中立')
     
-    # 计算Bollinger Bands %B
-    bbp = calculate_bbp(data)
+    # Bollinger Bands %B
+    bbp = values['bbp']
     oscillator_data['名称'].append('华新力量(BBP)')
     oscillator_data['值'].append(round(bbp, 2))
     oscillator_data['信号'].append('买入' if bbp < 0 else '卖出' if bbp > 1 else '中立')
     
-    # 计算Ultimate Oscillator
-    uo = calculate_ultimate_oscillator(data)
+    # Ultimate Oscillator
+    uo = values['uo']
     oscillator_data['名称'].append('终极震荡指标UO (7, 14, 28)')
     oscillator_data['值'].append(round(uo, 2))
     oscillator_data['信号'].append('买入' if uo < 30 else '卖出' if uo > 70 else '中立')
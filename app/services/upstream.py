@@ -0,0 +1,284 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.logging import logging
+from app.core.metrics import metrics, timed
+from app.services.upstream_providers import create_provider
+
+# akshare 的调用都是阻塞的网络请求，统一放到有界线程池中执行，避免阻塞事件循环
+_executor = ThreadPoolExecutor(
+    max_workers=settings.UPSTREAM_MAX_WORKERS,
+    thread_name_prefix="upstream",
+)
+
+class CircuitOpenError(Exception):
+    """上游处于熔断状态，调用被直接拒绝"""
+
+class TokenBucket:
+    """
+    令牌桶限流器
+
+    以固定速率补充令牌，最多积攒 capacity 个。令牌不足时调用方预约下一个令牌
+    并等待，多个等待者按到达顺序依次放行。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        # 用线程锁而不是asyncio锁，同步包装函数在不同事件循环中调用时也能共享
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        """取得一个令牌，必要时等待"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            return {"rate": self.rate, "capacity": self.capacity, "tokens": round(self._tokens, 2)}
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败 failure_threshold 次后打开，打开期间直接拒绝调用；
+    经过 reset_timeout 秒后进入半开状态，只放行一次试探调用，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """判断当前是否允许调用上游"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            # 半开状态只放行一次试探调用
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("上游调用恢复，熔断器关闭")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """
+        试探调用被取消、没有结果时释放试探名额
+
+        不计成功也不计失败，下一次调用可以继续试探
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"上游连续失败 {self._failures} 次，熔断器打开")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+            }
+
+class SingleFlight:
+    """
+    合并并发的相同调用
+
+    同一个键的调用正在进行时，后来的调用方不再发起新的调用，而是等待进行中的那一次并共享结果（或异常）。
+    调用在独立的任务中执行，某个调用方被取消不会影响其他等待者。
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        执行 func(*args, **kwargs)，相同键的并发调用只执行一次
+
+        多个调用方共享结果时，每个调用方拿到结果的副本（如DataFrame.copy()），
+        调用方就地修改结果不会互相影响。
+        """
+        # 任务绑定在事件循环上，同步包装函数在不同事件循环中的调用不合并
+        key = (asyncio.get_running_loop(), key)
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.calls += 1
+            task = asyncio.create_task(func(*args, **kwargs))
+            entry = self._inflight[key] = [task, 1]
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            entry[1] += 1
+
+        result = await asyncio.shield(entry[0])
+        if entry[1] > 1 and hasattr(result, "copy"):
+            return result.copy()
+        return result
+
+    def stats(self):
+        return {"inflight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
+
+# 所有akshare调用共用的限流器、熔断器和并发调用合并
+rate_limiter = TokenBucket(settings.UPSTREAM_RATE_PER_SECOND, settings.UPSTREAM_BURST)
+circuit_breaker = CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS)
+single_flight = SingleFlight()
+# 上游调用的次数（按结果：ok、error、rejected、cancelled）、耗时和重试次数
+upstream_calls = metrics.counter(
+    "stock_upstream_calls_total", "上游调用次数，rejected 为熔断期间被拒绝的调用", ["function", "outcome"]
+)
+upstream_seconds = metrics.histogram("stock_upstream_seconds", "上游调用的耗时（秒），不含限流等待", ["function"])
+upstream_retries = metrics.counter("stock_upstream_retries_total", "上游调用失败后的重试次数", ["function"])
+
+@metrics.register_collector
+def _upstream_metrics():
+    """并发调用合并和熔断器的状态"""
+    breaker = circuit_breaker.stats()
+    return [
+        ("stock_upstream_coalesced_total", "counter", "与进行中的相同调用合并、未向上游发起的调用次数",
+         [({}, single_flight.coalesced)]),
+        ("stock_upstream_circuit_open", "gauge", "熔断器是否处于打开或半开状态",
+         [({}, int(breaker["state"] != CircuitBreaker.CLOSED))]),
+    ]
+
+# 实际执行调用的数据源，由 settings.UPSTREAM_PROVIDER 选择
+upstream_provider = create_provider()
+
+def set_provider(provider):
+    """
+    替换上游数据源，如压测时改为回放录制的响应
+
+    返回:
+    原来的数据源
+    """
+    global upstream_provider
+    previous, upstream_provider = upstream_provider, provider
+    return previous
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    在上游线程池中执行阻塞调用并等待结果
+
+    参数:
+    func (callable): 阻塞函数
+    *args, **kwargs: 传给 func 的参数
+
+    返回:
+    func 的返回值
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _call_key(func, args, kwargs):
+    """由函数和参数生成合并调用的键，参数不可哈希时返回None"""
+    key = (func, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+async def call_upstream(func, *args, **kwargs):
+    """
+    经过熔断器和限流器调用akshare
+
+    函数和参数都相同的并发调用（如开盘时大量请求同一只股票的 stock_zh_a_hist、
+    stock_bid_ask_em，或同时刷新 stock_info_a_code_name）只向上游发起一次，
+    等待者共享结果，也只占用一个令牌。实际的调用由当前的数据源（upstream_provider）执行，
+    可以是akshare本身，也可以是录制或回放。
+
+    参数:
+    func (callable): akshare 函数，如 ak.stock_zh_a_hist
+    *args, **kwargs: 传给 func 的参数
+
+    返回:
+    func 的返回值
+
+    异常:
+    CircuitOpenError: 上游处于熔断状态
+    """
+    key = _call_key(func, args, kwargs)
+    if key is None:
+        return await _call_guarded(func, *args, **kwargs)
+    return await single_flight.do(key, _call_guarded, func, *args, **kwargs)
+
+async def _call_guarded(func, *args, **kwargs):
+    """经过熔断器和限流器执行一次上游调用"""
+    name = func.__name__
+    if not circuit_breaker.allow():
+        upstream_calls.inc(name, "rejected")
+        raise CircuitOpenError(f"上游熔断中，暂不调用 {name}")
+
+    with timed("upstream_wait"):
+        await rate_limiter.acquire()
+    start = time.perf_counter()
+    try:
+        with timed("upstream"):
+            result = await run_blocking(upstream_provider.call, func, *args, **kwargs)
+    except Exception:
+        circuit_breaker.record_failure()
+        upstream_calls.inc(name, "error")
+        raise
+    except BaseException:
+        # 被取消（如同步包装函数的 asyncio.run 结束时）不代表上游失败，
+        # 但半开状态下的试探名额必须释放，否则熔断器会一直拒绝调用
+        circuit_breaker.release_probe()
+        upstream_calls.inc(name, "cancelled")
+        raise
+    finally:
+        upstream_seconds.observe(time.perf_counter() - start, name)
+    circuit_breaker.record_success()
+    upstream_calls.inc(name, "ok")
+    return result
+
+def upstream_stats():
+    """返回数据源、限流器、熔断器和并发调用合并的状态"""
+    return {
+        "provider": upstream_provider.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "circuit_breaker": circuit_breaker.stats(),
+        "single_flight": single_flight.stats(),
+    }
@@ -0,0 +1,330 @@
+import abc
+import datetime
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging import logging
+
+# 按日期区间请求的接口：区间参数不参与录制的键，同一键下的响应合并保存，回放时按区间截取
+# 接口名 -> (起始日期参数, 结束日期参数, 响应中的日期列)
+RANGED_CALLS = {
+    "stock_zh_a_hist": ("start_date", "end_date", "日期"),
+}
+
+UPSTREAM_PROVIDERS = ("akshare", "record", "replay")
+
+class RecordingNotFoundError(LookupError):
+    """回放时没有对应的录制响应"""
+
+class InjectedUpstreamError(ConnectionError):
+    """回放时按配置的比例注入的上游错误"""
+
+class RecordingStore:
+    """
+    录制的上游响应
+
+    每个键（接口名和参数）对应目录下的 <接口名>/<摘要>.npz 和同名的 .json 说明文件。
+    与本地行情存储一样按列保存为npz，不使用pickle；响应只支持索引为默认整数索引的DataFrame。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # 已读取的录制，回放时不重复读文件
+        self._loaded = {}
+
+    @staticmethod
+    def _key(name, args, kwargs):
+        """返回 (参与录制键的参数, 区间参数)"""
+        kwargs = dict(kwargs)
+        ranged = RANGED_CALLS.get(name)
+        span = None
+        if ranged:
+            span = (kwargs.pop(ranged[0], None), kwargs.pop(ranged[1], None))
+        return {"args": list(args), "kwargs": dict(sorted(kwargs.items()))}, span
+
+    def _path(self, name, key):
+        text = json.dumps(key, ensure_ascii=False, sort_keys=True, default=str)
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=10).hexdigest()
+        return os.path.join(self.directory, name, digest)
+
+    def load(self, name, args=(), kwargs=None):
+        """
+        读取录制的响应
+
+        返回:
+        DataFrame: 响应的副本；区间接口只包含请求区间内的行。没有录制时返回None
+        """
+        key, span = self._key(name, args, kwargs or {})
+        path = self._path(name, key)
+        with self._lock:
+            df = self._loaded.get(path)
+            if df is None:
+                df = _read_frame(path + ".npz")
+                if df is None:
+                    return None
+                self._loaded[path] = df
+        if span is not None:
+            df = _slice_range(df, RANGED_CALLS[name][2], *span)
+        return df.copy()
+
+    def save(self, name, args=(), kwargs=None, result=None):
+        """
+        保存一次调用的响应
+
+        区间接口与已录制的响应按日期合并，重叠的日期以新响应为准。
+        """
+        if not isinstance(result, pd.DataFrame):
+            logging.warning(f"{name} 的响应不是DataFrame，不录制")
+            return
+        key, span = self._key(name, args, kwargs or {})
+        path = self._path(name, key)
+        with self._lock:
+            if span is not None:
+                old = self._loaded.get(path)
+                if old is None:
+                    old = _read_frame(path + ".npz")
+                if old is not None and not old.empty:
+                    date_column = RANGED_CALLS[name][2]
+                    result = (
+                        pd.concat([old, result], ignore_index=True)
+                        .drop_duplicates(subset=date_column, keep="last")
+                        .sort_values(date_column, kind="stable")
+                        .reset_index(drop=True)
+                    )
+            meta = {
+                "function": name,
+                **key,
+                "rows": len(result),
+                "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            }
+            try:
+                _write_frame(path, result, meta)
+            except Exception as e:
+                logging.error(f"录制 {name} 的响应失败: {e}")
+                return
+            self._loaded[path] = result.reset_index(drop=True)
+
+    def put(self, name, result, *args, **kwargs):
+        """直接写入一条录制，如用合成数据准备回放目录"""
+        self.save(name, args, kwargs, result)
+
+    def entries(self):
+        """列出所有录制的说明"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in sorted(os.listdir(self.directory)):
+            folder = os.path.join(self.directory, name)
+            if not os.path.isdir(folder):
+                continue
+            for file_name in sorted(os.listdir(folder)):
+                if file_name.endswith(".json"):
+                    with open(os.path.join(folder, file_name), "r", encoding="utf-8") as f:
+                        entries.append(json.load(f))
+        return entries
+
+def _write_frame(path, df, meta):
+    """按列写入npz（日期列转为datetime64[D]，字符串列转为定长unicode数组）和说明文件"""
+    arrays = {"__columns__": np.array([str(c) for c in df.columns])}
+    kinds = []
+    for i, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            present = values[pd.notna(values)]
+            if len(present) and all(isinstance(v, datetime.date) for v in present):
+                kinds.append("date")
+                values = pd.to_datetime(values).values.astype("datetime64[D]")
+            else:
+                kinds.append("str")
+                arrays[f"null_{i}"] = pd.isna(values)
+                values = np.where(pd.isna(values), "", values).astype(str)
+        else:
+            kinds.append("value")
+        arrays[f"col_{i}"] = values
+    arrays["__kinds__"] = np.array(kinds)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    try:
+        np.savez(tmp_path, **arrays)
+        # 先写临时文件再替换，回放时读到的永远是完整文件
+        os.replace(tmp_path, path + ".npz")
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+
+def _read_frame(path):
+    """读取 _write_frame 写入的DataFrame，文件不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as npz:
+        columns = npz["__columns__"].tolist()
+        kinds = npz["__kinds__"].tolist()
+        data = {}
+        for i, (col, kind) in enumerate(zip(columns, kinds)):
+            values = npz[f"col_{i}"]
+            if kind == "date":
+                values = pd.to_datetime(values).date
+            elif kind == "str":
+                values = values.astype(object)
+                values[npz[f"null_{i}"]] = None
+            data[col] = values
+    return pd.DataFrame(data, columns=columns)
+
+def _slice_range(df, date_column, start_date, end_date):
+    """截取日期列在 [start_date, end_date] 内的行，日期参数格式 'YYYYMMDD'，为None时不限制"""
+    if df.empty:
+        return df
+    dates = pd.to_datetime(df[date_column])
+    mask = np.ones(len(df), dtype=bool)
+    if start_date:
+        mask &= dates >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= dates <= pd.Timestamp(end_date)
+    return df[mask].reset_index(drop=True)
+
+class UpstreamProvider(abc.ABC):
+    """
+    上游数据源
+
+    call_upstream 经过熔断器和限流器后，在上游线程池中调用 provider.call(func, ...)；
+    func 是被调用的akshare函数，数据源可以直接执行它，也可以按函数名和参数给出其他响应。
+    子类必须实现 call，否则实例化时就会报错。
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.calls = 0
+
+    @abc.abstractmethod
+    def call(self, func, *args, **kwargs):
+        """调用上游并返回响应，失败时直接抛出异常，由 call_upstream 计入熔断器"""
+
+    def stats(self):
+        return {"provider": self.name, "calls": self.calls}
+
+class AkshareProvider(UpstreamProvider):
+    """直接调用akshare"""
+
+    name = "akshare"
+
+    def call(self, func, *args, **kwargs):
+        self.calls += 1
+        return func(*args, **kwargs)
+
+class RecordingProvider(UpstreamProvider):
+    """调用内层数据源（默认akshare），并把成功的响应录制到目录"""
+
+    name = "record"
+
+    def __init__(self, store, inner=None):
+        super().__init__()
+        self.store = store
+        self.inner = inner or AkshareProvider()
+
+    def call(self, func, *args, **kwargs):
+        self.calls += 1
+        result = self.inner.call(func, *args, **kwargs)
+        self.store.save(func.__name__, args, kwargs, result)
+        return result
+
+    def stats(self):
+        return {**super().stats(), "directory": self.store.directory}
+
+class ReplayProvider(UpstreamProvider):
+    """
+    只回放录制的响应，不访问网络
+
+    每次调用先等待 latency 加上 0~jitter 秒的随机延迟（在上游线程中阻塞，与真实调用一样占用线程），
+    再按 error_rate 的比例抛出 InjectedUpstreamError，用于确定性地测试限流、重试和熔断。
+    """
+
+    name = "replay"
+
+    def __init__(self, store, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        super().__init__()
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.misses = 0
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, func, *args, **kwargs):
+        name = func.__name__
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.injected_errors += 1
+            raise InjectedUpstreamError(f"回放注入的 {name} 调用错误")
+
+        result = self.store.load(name, args, kwargs)
+        if result is None:
+            with self._lock:
+                self.misses += 1
+            raise RecordingNotFoundError(f"没有 {name}{args or ''} {kwargs} 的录制响应")
+        return result
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "directory": self.store.directory,
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+            "misses": self.misses,
+            "injected_errors": self.injected_errors,
+        }
+
+def create_provider(name=None):
+    """
+    按配置创建上游数据源
+
+    参数:
+    name (str): akshare、record 或 replay，为None时取 settings.UPSTREAM_PROVIDER
+
+    异常:
+    ValueError: 未知的数据源
+    """
+    name = name or settings.UPSTREAM_PROVIDER
+    if name == "akshare":
+        return AkshareProvider()
+    store = RecordingStore(settings.UPSTREAM_RECORDING_DIR)
+    if name == "record":
+        return RecordingProvider(store)
+    if name == "replay":
+        return ReplayProvider(
+            store,
+            latency=settings.UPSTREAM_REPLAY_LATENCY_SECONDS,
+            jitter=settings.UPSTREAM_REPLAY_JITTER_SECONDS,
+            error_rate=settings.UPSTREAM_REPLAY_ERROR_RATE,
+            seed=settings.UPSTREAM_REPLAY_SEED,
+        )
+    raise ValueError(f"未知的上游数据源: {name}，可选 {', '.join(UPSTREAM_PROVIDERS)}")
+
+# 列出录制目录中的响应
+if __name__ == "__main__":
+    for entry in RecordingStore(settings.UPSTREAM_RECORDING_DIR).entries():
+        print(
+            f"{entry['function']:24s} {entry['rows']:6d}行  "
+            f"{entry['args']} {entry['kwargs']}  {entry['recorded_at']}"
+        )
@@ -0,0 +1,266 @@
+"""
+指标和数据处理的微基准：tech_indicators 各函数、震荡/均线指标表、趋势信号和导出格式化
+
+使用 benchmarks.synthetic 生成的数据，不访问网络。结果保存为JSON，可以与其他提交的结果比较。
+
+运行:
+    python -m benchmarks.bench_indicators                       # quick 档，结果写入 benchmarks/results/
+    python -m benchmarks.bench_indicators --preset full         # 100~10万根K线、1~5000只股票
+    python -m benchmarks.bench_indicators --filter rsi --bars 1000 10000
+    python -m benchmarks.bench_indicators --compare benchmarks/results/<旧提交>.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.core.logging import logging
+from app.services import tech_indicators
+from app.services.indicator_engine import latest_indicator_values
+from app.services.panel_indicators import build_panel, compute_panel_signals
+from app.services.stage_by_tech import get_trend_signals
+from app.services.stock_exporter import format_stock_data
+from benchmarks.synthetic import synthetic_ohlcv, synthetic_universe
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# 各档位的K线数、股票数，以及多股票场景下每只股票的K线数
+PRESETS = {
+    "quick": {"bars": [100, 1_000, 10_000], "symbols": [1, 10, 100], "symbol_bars": 250},
+    "full": {"bars": [100, 1_000, 10_000, 100_000], "symbols": [1, 10, 100, 1_000, 5_000], "symbol_bars": 250},
+}
+
+# 单只股票的场景：名称 -> 接收一只股票的DataFrame的函数
+SINGLE_CASES = {
+    "calculate_rsi": tech_indicators.calculate_rsi,
+    "calculate_stochastic": tech_indicators.calculate_stochastic,
+    "calculate_cci": tech_indicators.calculate_cci,
+    "calculate_adx": tech_indicators.calculate_adx,
+    "calculate_ao": tech_indicators.calculate_ao,
+    "calculate_williams_r": tech_indicators.calculate_williams_r,
+    "calculate_macd": tech_indicators.calculate_macd,
+    "calculate_stoch_rsi": tech_indicators.calculate_stoch_rsi,
+    "calculate_chaikin_money_flow": tech_indicators.calculate_chaikin_money_flow,
+    "calculate_bbp": tech_indicators.calculate_bbp,
+    "calculate_ultimate_oscillator": tech_indicators.calculate_ultimate_oscillator,
+    "latest_indicator_values": latest_indicator_values,
+    "calculate_oscillator_indicators": tech_indicators.calculate_oscillator_indicators,
+    "calculate_moving_averages": tech_indicators.calculate_moving_averages,
+    "get_trend_signals": get_trend_signals,
+    "get_trend_signals(lookback=None)": lambda data: get_trend_signals(data, None),
+    "format_stock_data": format_stock_data,
+}
+
+def _panel_signals(frames):
+    return compute_panel_signals(build_panel(frames))
+
+def _trend_signals_loop(frames):
+    for data in frames.values():
+        get_trend_signals(data)
+
+def _format_loop(frames):
+    for data in frames.values():
+        format_stock_data(data)
+
+# 多只股票的场景：名称 -> 接收 {股票代码: DataFrame} 的函数
+MULTI_CASES = {
+    "panel_signals": _panel_signals,
+    "get_trend_signals(per symbol)": _trend_signals_loop,
+    "format_stock_data(per symbol)": _format_loop,
+}
+
+def measure(func, arg, repeat=5, min_time=0.2):
+    """
+    测量 func(arg) 的单次耗时
+
+    先调用一次预热并估计耗时，再确定每轮的调用次数，使每轮至少持续 min_time 秒；
+    单次就超过 min_time 的慢场景只重复3轮。
+
+    返回:
+    dict: number（每轮次数）、repeat（轮数）、best_ms、median_ms
+    """
+    start = time.perf_counter()
+    func(arg)
+    first = time.perf_counter() - start
+
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+    if first >= min_time:
+        repeat = min(repeat, 3)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        timings.append((time.perf_counter() - start) / number * 1000)
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+    }
+
+def _matches(name, filters):
+    return not filters or any(f.lower() in name.lower() for f in filters)
+
+def run(bars=None, symbols=None, symbol_bars=None, preset="quick", filters=None, seed=0,
+        repeat=5, min_time=0.2, progress=None):
+    """
+    运行基准测试
+
+    参数:
+    bars (list): 单只股票场景的K线数，为None时取档位的设置
+    symbols (list): 多只股票场景的股票数，为None时取档位的设置
+    symbol_bars (int): 多只股票场景中每只股票的K线数
+    preset (str): 档位，quick 或 full
+    filters (list): 只运行名称包含其中任一子串的场景
+    seed (int): 合成数据的随机数种子
+    repeat (int): 每个场景的测量轮数
+    min_time (float): 每轮的最短持续时间（秒）
+    progress (callable): 每完成一个场景调用一次，参数为场景ID和结果
+
+    返回:
+    dict: 运行环境信息和 {场景ID: 结果}
+    """
+    settings = PRESETS[preset]
+    bars = bars or settings["bars"]
+    symbols = symbols or settings["symbols"]
+    symbol_bars = symbol_bars or settings["symbol_bars"]
+
+    cases = {}
+
+    def record(case_id, name, func, arg, **params):
+        result = {"name": name, **params, **measure(func, arg, repeat, min_time)}
+        cases[case_id] = result
+        if progress:
+            progress(case_id, result)
+
+    for n in bars:
+        selected = [name for name in SINGLE_CASES if _matches(name, filters)]
+        if not selected:
+            break
+        data = synthetic_ohlcv(n, seed=seed)
+        for name in selected:
+            record(f"{name}[bars={n}]", name, SINGLE_CASES[name], data, bars=n)
+
+    for n in symbols:
+        selected = [name for name in MULTI_CASES if _matches(name, filters)]
+        if not selected:
+            break
+        frames = synthetic_universe(n, symbol_bars, seed=seed)
+        for name in selected:
+            record(f"{name}[symbols={n}]", name, MULTI_CASES[name], frames,
+                   symbols=n, bars=symbol_bars)
+
+    return {
+        "environment": environment(),
+        "config": {
+            "preset": preset, "bars": bars, "symbols": symbols, "symbol_bars": symbol_bars,
+            "filters": filters, "seed": seed, "repeat": repeat, "min_time": min_time,
+        },
+        "cases": cases,
+    }
+
+def _git(*args):
+    try:
+        output = subprocess.run(
+            ["git", *args], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() if output.returncode == 0 else None
+
+def environment():
+    """记录结果对应的提交和运行环境，比较不同机器上的结果时需要参考"""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def compare(baseline, current, threshold=1.2):
+    """
+    比较两次结果中共有场景的 best_ms
+
+    返回:
+    list: [(场景ID, 基准耗时, 当前耗时, 当前/基准, 是否变慢超过 threshold)]，按比值从大到小排列
+    """
+    rows = []
+    for case_id, result in current["cases"].items():
+        base = baseline["cases"].get(case_id)
+        if base is None:
+            continue
+        ratio = result["best_ms"] / base["best_ms"] if base["best_ms"] > 0 else float("inf")
+        rows.append((case_id, base["best_ms"], result["best_ms"], ratio, ratio > threshold))
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows
+
+def default_output(results):
+    """默认的结果文件：benchmarks/results/<提交>[-dirty]-<档位>.json"""
+    env = results["environment"]
+    name = env["commit"] or "nocommit"
+    if env["dirty"]:
+        name += "-dirty"
+    return os.path.join(RESULTS_DIR, f"{name}-{results['config']['preset']}.json")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="指标和数据处理的微基准")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick", help="规模档位")
+    parser.add_argument("--bars", type=int, nargs="+", help="单只股票场景的K线数")
+    parser.add_argument("--symbols", type=int, nargs="+", help="多只股票场景的股票数")
+    parser.add_argument("--symbol-bars", type=int, help="多只股票场景中每只股票的K线数")
+    parser.add_argument("--filter", nargs="+", dest="filters", help="只运行名称包含这些子串的场景")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据的随机数种子")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景的测量轮数")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮的最短持续时间（秒）")
+    parser.add_argument("--output", help="结果文件路径，默认按提交写入 benchmarks/results/")
+    parser.add_argument("--compare", help="与之比较的基准结果文件")
+    parser.add_argument("--threshold", type=float, default=1.2, help="当前/基准耗时超过该比值时视为变慢")
+    args = parser.parse_args(argv)
+
+    # 小数据量时指标函数会记录“数据长度不足”的警告，基准测试中不需要
+    logging.getLogger().setLevel(logging.ERROR)
+
+    def progress(case_id, result):
+        print(f"{case_id:60s} {result['best_ms']:12.4f}ms  (x{result['number']}, {result['repeat']}轮)")
+
+    results = run(
+        bars=args.bars, symbols=args.symbols, symbol_bars=args.symbol_bars, preset=args.preset,
+        filters=args.filters, seed=args.seed, repeat=args.repeat, min_time=args.min_time,
+        progress=progress,
+    )
+
+    output = args.output or default_output(results)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, results, args.threshold)
+        print(f"\n与 {baseline['environment'].get('commit')} 比较（{len(rows)} 个共有场景）:")
+        for case_id, base_ms, current_ms, ratio, slower in rows:
+            mark = "  变慢" if slower else ""
+            print(f"{case_id:60s} {base_ms:12.4f}ms -> {current_ms:12.4f}ms  {ratio:6.2f}x{mark}")
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+响应序列化的微基准：对比原来的 JSON 往返/response_model 路径与 FastJSONResponse
+
+运行: python -m benchmarks.bench_json_response
+"""
+import json
+import timeit
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.responses import FastJSONResponse, frame_records
+from app.models.schemas import StockAnalysisResponse, TrendSignalResponse
+from app.services.stage_by_tech import get_trend_signals
+from app.services.stock_analyzer import calculate_indicators, create_result_json
+
+def _bid_ask_frame():
+    """与 ak.stock_bid_ask_em 结构相同的盘口数据"""
+    items = [f"{side}{i}" for side in ("sell_", "buy_") for i in range(1, 6)]
+    items += [f"{side}{i}_vol" for side in ("sell_", "buy_") for i in range(1, 6)]
+    items += ["最新", "均价", "涨幅", "涨跌", "总手", "金额", "换手", "量比", "最高", "最低", "今开", "昨收"]
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"item": items, "value": rng.uniform(1, 1000, len(items))})
+
+def _ohlcv(length=250):
+    rng = np.random.default_rng(0)
+    close = 10 + np.cumsum(rng.normal(0, 0.2, length))
+    dates = pd.bdate_range("2024-01-01", periods=length).date
+    return pd.DataFrame({
+        "open": close,
+        "high": close + rng.uniform(0, 0.5, length),
+        "low": close - rng.uniform(0, 0.5, length),
+        "close": close,
+        "volume": rng.integers(1000, 100000, length).astype(float),
+    }, index=pd.Index(dates, name="date"))
+
+def _via_response_model(model, content):
+    """FastAPI 对普通返回值的处理：按 response_model 校验、序列化，再 jsonable_encoder 后编码"""
+    validated = model.model_validate(content)
+    return JSONResponse(jsonable_encoder(validated.model_dump(mode="json"))).body
+
+def realtime_old(df):
+    result = {
+        "股票代码": "000895",
+        "数据时间": "2025-06-05 10:00:00",
+        "盘口数据": json.loads(df.to_json(orient="records", force_ascii=False)),
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    # 端点再解析一次，由 JSONResponse 重新编码
+    return JSONResponse(jsonable_encoder(json.loads(text))).body
+
+def realtime_new(df):
+    result = {
+        "股票代码": "000895",
+        "数据时间": "2025-06-05 10:00:00",
+        "盘口数据": frame_records(df),
+    }
+    return FastJSONResponse(result).body
+
+def _equivalent(a, b):
+    """比较两份JSON数据；DataFrame.to_json 默认只保留10位有效数字，浮点数按近似相等比较"""
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_equivalent(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_equivalent(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        return bool(np.isclose(a, b, rtol=1e-9))
+    return a == b
+
+def _measure(func, *args, number):
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=5)) / number * 1e6
+
+def run(number=2000):
+    """返回各场景旧路径、新路径的单次耗时（微秒）"""
+    df = _bid_ask_frame()
+    data = _ohlcv()
+    stock_info = {"代码": "000895", "名称": "双汇发展", "当前价格": 10.0, "日期": "2024-12-13"}
+    analysis = create_result_json(*calculate_indicators(data), stock_info)
+    stage = {"signals": get_trend_signals(data), "next_cursor": None}
+
+    cases = {
+        "realtime/data": (realtime_old, (df,), realtime_new, (df,)),
+        "stock/analysis": (
+            _via_response_model, (StockAnalysisResponse, analysis),
+            lambda content: FastJSONResponse(content).body, (analysis,),
+        ),
+        "stage/stage": (
+            _via_response_model, (TrendSignalResponse, stage),
+            lambda content: FastJSONResponse(content).body, (stage,),
+        ),
+    }
+    results = {}
+    for name, (old, old_args, new, new_args) in cases.items():
+        # 两条路径输出的JSON必须等价
+        assert _equivalent(json.loads(old(*old_args)), json.loads(new(*new_args))), name
+        old_us = _measure(old, *old_args, number=number)
+        new_us = _measure(new, *new_args, number=number)
+        results[name] = {"old_us": round(old_us, 1), "new_us": round(new_us, 1),
+                         "speedup": round(old_us / new_us, 1)}
+    return results
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:16s} 原路径 {result['old_us']:8.1f}us  新路径 {result['new_us']:8.1f}us  "
+              f"节省 {result['old_us'] - result['new_us']:8.1f}us/请求  ({result['speedup']}x)")
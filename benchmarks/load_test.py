@@ -0,0 +1,353 @@
+"""
+HTTP压测：并发请求分析、阶段信号、实时盘口和数据下载接口，统计吞吐量和延迟分位数
+
+默认在进程内通过 httpx 的 ASGITransport 驱动 app.main:app，上游改为回放由合成数据生成的录制响应，
+本地行情存储使用临时目录，不访问网络。压测客户端与应用共用一个事件循环，绝对吞吐量偏低，
+适合在同一台机器上比较不同提交。也可以用 --url 压测单独启动的服务（如 UPSTREAM_PROVIDER=replay）。
+
+运行:
+    python -m benchmarks.load_test                                   # 200只股票，Zipf分布，并发32
+    python -m benchmarks.load_test --concurrency 64 --requests 5000 --distribution uniform
+    python -m benchmarks.load_test --latency 0.05 --error-rate 0.01  # 模拟慢速、偶尔失败的上游
+    python -m benchmarks.load_test --compare benchmarks/results/load-<旧提交>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging import logging
+from benchmarks.bench_indicators import RESULTS_DIR, environment
+from benchmarks.synthetic import synthetic_ohlcv
+
+# 合成日线的日期范围，与请求的日期参数一致
+END_DATE = "20251231"
+
+# 压测的接口：名称 -> (股票代码, 开始日期, 结束日期) 到 (路径, 查询参数) 的映射
+ENDPOINTS = {
+    "analysis": lambda symbol, start, end: (
+        "/api/stock/analysis", {"symbol": symbol, "start_date": start, "end_date": end}),
+    "stage": lambda symbol, start, end: (
+        "/api/stage/stage", {"symbol": symbol, "start_date": start, "end_date": end}),
+    "realtime": lambda symbol, start, end: (
+        "/api/realtime/data", {"symbol": symbol}),
+    "export": lambda symbol, start, end: (
+        f"/api/export/download/{symbol}", {"start_date": start, "end_date": end}),
+}
+
+DEFAULT_MIX = "analysis=4,stage=4,realtime=1,export=1"
+
+def _hist_frame(symbol, bars, seed):
+    """与 ak.stock_zh_a_hist 结构相同的日线数据，日期为截至 END_DATE 的工作日"""
+    data = synthetic_ohlcv(bars, seed=(seed, int(symbol)))
+    dates = pd.bdate_range(end=END_DATE, periods=bars).date
+    return pd.DataFrame({
+        "日期": dates,
+        "股票代码": symbol,
+        "开盘": data["open"].to_numpy(),
+        "收盘": data["close"].to_numpy(),
+        "最高": data["high"].to_numpy(),
+        "最低": data["low"].to_numpy(),
+        "成交量": data["volume"].to_numpy().astype("int64"),
+        "成交额": (data["close"] * data["volume"]).to_numpy(),
+        "振幅": ((data["high"] - data["low"]) / data["close"] * 100).round(2).to_numpy(),
+        "涨跌幅": (data["close"].pct_change().fillna(0) * 100).round(2).to_numpy(),
+        "涨跌额": data["close"].diff().fillna(0).round(2).to_numpy(),
+        "换手率": np.round(np.random.default_rng((seed, int(symbol), 2)).uniform(0.1, 5, bars), 2),
+    })
+
+def _bid_ask_frame(last):
+    """与 ak.stock_bid_ask_em 结构相同的盘口数据"""
+    items = [f"{side}_{i}" for side in ("sell", "buy") for i in range(5, 0, -1)]
+    values = [round(last * (1 + 0.001 * i), 2) for i in range(5, 0, -1)]
+    values += [round(last * (1 - 0.001 * i), 2) for i in range(5, 0, -1)]
+    items += [f"{side}_{i}_vol" for side in ("sell", "buy") for i in range(5, 0, -1)]
+    values += [1000.0 * i for i in range(1, 11)]
+    quote = {"最新": last, "均价": last, "涨幅": 0.5, "涨跌": 0.05, "总手": 123456.0, "金额": last * 12345600,
+             "换手": 1.2, "量比": 1.0, "最高": last * 1.02, "最低": last * 0.98, "今开": last, "昨收": last}
+    return pd.DataFrame({"item": items + list(quote), "value": values + list(quote.values())})
+
+def prepare_recordings(directory, symbols, bars=500, seed=0):
+    """
+    在 directory 中写入 symbols 只合成股票的回放数据
+
+    包括每只股票的 stock_zh_a_hist（qfq）和 stock_bid_ask_em，以及 stock_info_a_code_name、stock_zh_a_spot_em。
+
+    返回:
+    list: 股票代码
+    """
+    from app.services.upstream_providers import RecordingStore
+
+    store = RecordingStore(directory)
+    codes = [f"{600000 + i:06d}" for i in range(symbols)]
+    spot = []
+    for code in codes:
+        hist = _hist_frame(code, bars, seed)
+        store.put("stock_zh_a_hist", hist, symbol=code, period="daily",
+                  start_date=hist["日期"].iloc[0].strftime("%Y%m%d"), end_date=END_DATE, adjust="qfq")
+        last = float(hist["收盘"].iloc[-1])
+        store.put("stock_bid_ask_em", _bid_ask_frame(last), symbol=code)
+        spot.append({"代码": code, "名称": f"合成{code}", "最新价": last, "开盘": last,
+                     "最高": last * 1.02, "最低": last * 0.98, "成交量": 123456.0})
+    store.put("stock_info_a_code_name", pd.DataFrame({"code": codes, "name": [f"合成{c}" for c in codes]}))
+    store.put("stock_zh_a_spot_em", pd.DataFrame(spot))
+    return codes
+
+def parse_mix(text):
+    """解析 'analysis=4,stage=4' 形式的接口权重"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"未知的接口: {name}，可选 {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+def symbol_weights(count, distribution="zipf", zipf_s=1.1):
+    """
+    股票被请求的概率
+
+    zipf 分布下第k热的股票的权重为 1/k^s，少数热门股票占据大部分请求；uniform 下每只股票相同。
+    """
+    if distribution == "uniform":
+        return np.full(count, 1.0 / count)
+    if distribution != "zipf":
+        raise ValueError(f"未知的股票分布: {distribution}")
+    weights = 1.0 / np.arange(1, count + 1) ** zipf_s
+    return weights / weights.sum()
+
+def iter_workload(symbols, mix, distribution="zipf", zipf_s=1.1, start_date="20240101", seed=0):
+    """按接口权重和股票分布无限生成 (接口名, 路径, 查询参数)；种子相同时顺序相同"""
+    rng = np.random.default_rng(seed)
+    names = list(mix)
+    endpoint_p = np.array([mix[name] for name in names])
+    endpoint_p = endpoint_p / endpoint_p.sum()
+    symbol_p = symbol_weights(len(symbols), distribution, zipf_s)
+    while True:
+        # 成批抽样，减少逐个调用随机数生成器的开销
+        endpoints = rng.choice(len(names), size=1024, p=endpoint_p)
+        picks = rng.choice(len(symbols), size=1024, p=symbol_p)
+        for e, s in zip(endpoints, picks):
+            name = names[e]
+            path, params = ENDPOINTS[name](symbols[s], start_date, END_DATE)
+            yield name, path, params
+
+async def drive(client, workload, concurrency, requests=None, duration=None):
+    """
+    以固定并发发送请求，每个工作协程收到响应后立即发送下一个请求
+
+    返回:
+    tuple: (每个请求的 (接口名, 状态码, 耗时秒数) 列表, 总耗时秒数)；请求异常时状态码为0
+    """
+    samples = []
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [requests] if requests else None
+
+    async def worker():
+        while True:
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            name, path, params = next(workload)
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                status = response.status_code
+            except Exception as e:
+                logging.error(f"请求 {path} 失败: {e}")
+                status = 0
+            samples.append((name, status, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+def summarize(samples, elapsed):
+    """按接口和总体统计请求数、错误数、吞吐量和延迟分位数（毫秒）"""
+    groups = {"all": samples}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+
+    summary = {}
+    for name, group in groups.items():
+        latencies = np.array([sample[2] for sample in group]) * 1000
+        errors = sum(1 for sample in group if not 200 <= sample[1] < 400)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+        summary[name] = {
+            "requests": len(group),
+            "errors": errors,
+            "throughput_rps": round(len(group) / elapsed, 2) if elapsed > 0 else None,
+            "mean_ms": round(float(latencies.mean()), 3) if len(latencies) else None,
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(latencies.max()), 3) if len(latencies) else None,
+        }
+    return summary
+
+def setup_stub(symbols, bars, seed, recordings=None, latency=0.0, jitter=0.0, error_rate=0.0,
+               upstream_rate=None):
+    """
+    把进程内的应用切换到回放的上游和临时的本地存储
+
+    返回:
+    list: 可以请求的股票代码
+    """
+    from app.services import upstream
+    from app.services.upstream_providers import RecordingStore, ReplayProvider
+
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    settings.PRICE_STORE_DIR = os.path.join(workdir, "prices")
+    settings.SYMBOL_DIRECTORY_PATH = os.path.join(workdir, "symbols.json")
+    os.makedirs(settings.PRICE_STORE_DIR, exist_ok=True)
+
+    if recordings:
+        codes = sorted({entry["kwargs"]["symbol"] for entry in RecordingStore(recordings).entries()
+                        if entry["function"] == "stock_zh_a_hist"})
+    else:
+        recordings = os.path.join(workdir, "recordings")
+        codes = prepare_recordings(recordings, symbols, bars, seed)
+
+    upstream.set_provider(ReplayProvider(
+        RecordingStore(recordings), latency=latency, jitter=jitter, error_rate=error_rate, seed=seed,
+    ))
+    if upstream_rate:
+        upstream.rate_limiter.rate = upstream_rate
+        upstream.rate_limiter.capacity = upstream_rate
+    return codes
+
+async def run(url=None, symbols=200, bars=500, mix=DEFAULT_MIX, distribution="zipf", zipf_s=1.1,
+              concurrency=32, requests=2000, duration=None, warmup=0, seed=0, recordings=None,
+              latency=0.0, jitter=0.0, error_rate=0.0, upstream_rate=1000.0, start_date="20240101"):
+    """
+    运行一次压测
+
+    返回:
+    dict: 运行环境、压测配置、各接口的统计，以及进程内压测时上游和缓存的状态
+    """
+    config = {
+        "url": url, "symbols": symbols, "bars": bars, "mix": mix, "distribution": distribution,
+        "zipf_s": zipf_s, "concurrency": concurrency, "requests": requests, "duration": duration,
+        "warmup": warmup, "seed": seed, "latency": latency, "jitter": jitter,
+        "error_rate": error_rate, "upstream_rate": upstream_rate, "start_date": start_date,
+    }
+    if url:
+        codes = [f"{600000 + i:06d}" for i in range(symbols)]
+        client = httpx.AsyncClient(base_url=url, timeout=60)
+    else:
+        codes = setup_stub(symbols, bars, seed, recordings, latency, jitter, error_rate, upstream_rate)
+        from app.main import app
+        # 应用导入时会按INFO级别配置日志，压测中只保留错误
+        logging.getLogger().setLevel(logging.ERROR)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=60)
+    config["symbols"] = len(codes)
+
+    workload = iter_workload(codes, parse_mix(mix), distribution, zipf_s, start_date, seed)
+    async with client:
+        if warmup:
+            await drive(client, workload, concurrency, requests=warmup)
+        samples, elapsed = await drive(client, workload, concurrency, requests, duration)
+
+    results = {
+        "environment": environment(),
+        "config": config,
+        "elapsed_seconds": round(elapsed, 3),
+        "endpoints": summarize(samples, elapsed),
+    }
+    if not url:
+        from app.main import cache_stats
+        from app.services.upstream import upstream_stats
+        results["upstream"] = upstream_stats()
+        results["caches"] = await cache_stats()
+    return results
+
+def compare(baseline, current, threshold=1.2):
+    """
+    比较两次压测中共有接口的延迟分位数
+
+    返回:
+    list: [(接口名, 指标, 基准值, 当前值, 当前/基准, 是否变慢超过 threshold)]
+    """
+    rows = []
+    for name, result in current["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if base is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            ratio = result[metric] / base[metric] if base[metric] else float("inf")
+            rows.append((name, metric, base[metric], result[metric], ratio, ratio > threshold))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP接口压测")
+    parser.add_argument("--url", help="压测已启动的服务，如 http://127.0.0.1:8000；默认在进程内回放合成数据")
+    parser.add_argument("--symbols", type=int, default=200, help="股票数")
+    parser.add_argument("--bars", type=int, default=500, help="每只股票的合成K线数")
+    parser.add_argument("--recordings", help="回放已有的录制目录，不生成合成数据")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"接口权重，默认 {DEFAULT_MIX}")
+    parser.add_argument("--distribution", choices=["zipf", "uniform"], default="zipf", help="股票分布")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf分布的指数，越大热门股票越集中")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=2000, help="请求总数")
+    parser.add_argument("--duration", type=float, help="压测时长（秒），指定时不限请求数")
+    parser.add_argument("--warmup", type=int, default=0, help="正式统计前先发送的请求数")
+    parser.add_argument("--start-date", default="20240101", help="请求的开始日期")
+    parser.add_argument("--latency", type=float, default=0.0, help="回放的上游延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="回放的上游延迟抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回放的上游错误比例")
+    parser.add_argument("--upstream-rate", type=float, default=1000.0,
+                        help="上游限流的速率和容量，默认放开限流；设为0时保持配置值")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--output", help="结果文件路径，默认写入 benchmarks/results/")
+    parser.add_argument("--compare", help="与之比较的压测结果文件")
+    parser.add_argument("--threshold", type=float, default=1.2, help="当前/基准延迟超过该比值时视为变慢")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(
+        url=args.url, symbols=args.symbols, bars=args.bars, mix=args.mix,
+        distribution=args.distribution, zipf_s=args.zipf_s, concurrency=args.concurrency,
+        requests=None if args.duration else args.requests, duration=args.duration,
+        warmup=args.warmup, seed=args.seed, recordings=args.recordings, latency=args.latency,
+        jitter=args.jitter, error_rate=args.error_rate, upstream_rate=args.upstream_rate or None,
+        start_date=args.start_date,
+    ))
+
+    print(f"{'接口':10s} {'请求数':>8s} {'错误':>6s} {'吞吐量/s':>10s} {'p50ms':>9s} {'p95ms':>9s} {'p99ms':>9s} {'最大ms':>9s}")
+    for name, s in results["endpoints"].items():
+        print(f"{name:10s} {s['requests']:8d} {s['errors']:6d} {s['throughput_rps']:10.1f} "
+              f"{s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['p99_ms']:9.2f} {s['max_ms']:9.2f}")
+
+    env = results["environment"]
+    name = f"load-{env['commit'] or 'nocommit'}{'-dirty' if env['dirty'] else ''}-{env['timestamp'].replace(':', '')}.json"
+    output = args.output or os.path.join(RESULTS_DIR, name)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+    print(f"结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, results, args.threshold)
+        print(f"\n与 {baseline['environment'].get('commit')} 比较:")
+        for endpoint, metric, base, current, ratio, slower in rows:
+            mark = "  变慢" if slower else ""
+            print(f"{endpoint:10s} {metric:7s} {base:9.2f} -> {current:9.2f}  {ratio:6.2f}x{mark}")
+        if any(row[5] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+确定性的合成行情数据，供基准测试离线使用
+
+同样的参数和种子总是生成同样的数据，不同提交之间的基准结果可以直接比较。
+"""
+import numpy as np
+import pandas as pd
+
+# 最后一根K线的日期；日期按自然日向前排，10万根K线也不会超出 pandas 的时间范围
+END_DATE = "2025-12-31"
+
+def synthetic_ohlcv(bars, seed=0):
+    """
+    生成一只股票的日线数据
+
+    收盘价是对数正态随机游走，开盘价、最高价、最低价围绕收盘价生成并满足 low <= open/close <= high。
+
+    参数:
+    bars (int): K线数
+    seed: 随机数种子，可以是整数或整数序列
+
+    返回:
+    DataFrame: 以 datetime.date 为索引（名为 date），包含 open、high、low、close、volume 列，
+               与 data_fetcher 返回的格式相同
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, bars)
+    close = 10 * np.exp(np.cumsum(returns))
+    prev_close = np.concatenate([[close[0]], close[:-1]])
+    open_ = prev_close * (1 + rng.normal(0, 0.005, bars))
+    spread = close * rng.uniform(0, 0.02, bars)
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread * rng.uniform(0, 1, bars)
+    volume = rng.integers(10_000, 5_000_000, bars).astype(float)
+
+    dates = pd.date_range(end=END_DATE, periods=bars, freq="D").date
+    return pd.DataFrame({
+        "open": open_.round(2),
+        "high": high.round(2),
+        "low": low.round(2),
+        "close": close.round(2),
+        "volume": volume,
+    }, index=pd.Index(dates, name="date"))
+
+def synthetic_universe(symbols, bars, seed=0, suspended=0.02):
+    """
+    生成多只股票的日线数据
+
+    每只股票用 (seed, 序号) 作种子，股票数变化时已有股票的数据不变；
+    随机去掉 suspended 比例的K线模拟停牌，使各股票的交易日不完全对齐。
+
+    参数:
+    symbols (int): 股票数
+    bars (int): 每只股票停牌前的K线数
+    seed (int): 随机数种子
+    suspended (float): 停牌K线的比例
+
+    返回:
+    dict: {股票代码: DataFrame}，股票代码为 600000 起的六位数字
+    """
+    frames = {}
+    for i in range(symbols):
+        data = synthetic_ohlcv(bars, seed=(seed, i))
+        if suspended > 0:
+            keep = np.random.default_rng((seed, i, 1)).uniform(size=bars) >= suspended
+            # 保留第一根K线，避免整只股票为空
+            keep[0] = True
+            data = data[keep]
+        frames[f"{600000 + i:06d}"] = data
+    return frames
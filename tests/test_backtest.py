@@ -0,0 +1,112 @@
+"""backtest 的向量化交易模拟和组合日收益与逐笔循环计算的结果对比"""
+import numpy as np
+import pytest
+
+from app.services.backtest import _daily_returns, simulate_trades
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+def _compact(steps=80, n_valid=(80, 61, 12, 2, 1), seed=0):
+    """压紧布局的收盘价：每列的有效数据在前 n_valid 行，之后为NaN"""
+    rng = np.random.default_rng(seed)
+    n_valid = np.array(n_valid)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.03, (steps, len(n_valid))), axis=0))
+    is_valid = np.arange(steps)[:, None] < n_valid[None, :]
+    close = np.where(is_valid, close, np.nan)
+    signal = (rng.random(close.shape) < 0.2) & is_valid
+    exit_signal = (rng.random(close.shape) < 0.1) & is_valid
+    in_range = is_valid & (np.arange(steps)[:, None] >= 5)
+    return close, signal, exit_signal, n_valid, in_range
+
+PARAMS = {
+    "hold_5": {"hold_days": 5, "take_profit": None, "stop_loss": None,
+               "fee_rate": 0.0, "stamp_tax": 0.0},
+    "hold_1_fees": {"hold_days": 1, "take_profit": None, "stop_loss": None,
+                    "fee_rate": 0.0003, "stamp_tax": 0.001},
+    "hold_20_tp_sl": {"hold_days": 20, "take_profit": 0.05, "stop_loss": 0.03,
+                      "fee_rate": 0.0003, "stamp_tax": 0.001},
+    "hold_100": {"hold_days": 100, "take_profit": 0.2, "stop_loss": None,
+                 "fee_rate": 0.001, "stamp_tax": 0.0},
+}
+
+def _naive_trades(close, signal, n_valid, in_range, params, exit_signal=None):
+    """逐笔买入、逐日检查卖出条件"""
+    trades = []
+    for col in range(close.shape[1]):
+        for row in range(n_valid[col] - 1):
+            if not (signal[row, col] and in_range[row, col]):
+                continue
+            held, gross = 0, 0.0
+            for day in range(1, params["hold_days"] + 1):
+                if row + day >= n_valid[col]:
+                    break
+                held, gross = day, close[row + day, col] / close[row, col] - 1
+                if params["take_profit"] is not None and gross >= params["take_profit"]:
+                    break
+                if params["stop_loss"] is not None and gross <= -params["stop_loss"]:
+                    break
+                if exit_signal is not None and exit_signal[row + day, col]:
+                    break
+            sell_cost = params["fee_rate"] + params["stamp_tax"]
+            net = (1 + gross) * (1 - sell_cost) / (1 + params["fee_rate"]) - 1
+            trades.append((row, col, held, net))
+    return sorted(trades)
+
+def _naive_daily(close, entry_row, entry_col, held, params):
+    """把每笔交易的逐日收益和费用累加到持有的各个位置上"""
+    numerator = np.zeros(close.shape)
+    holding = np.zeros(close.shape)
+    for row, col, days in zip(entry_row, entry_col, held):
+        for step in range(row + 1, row + days + 1):
+            value = close[step, col] / close[step - 1, col] - 1
+            if step == row + 1:
+                value -= params["fee_rate"]
+            if step == row + days:
+                value -= params["fee_rate"] + params["stamp_tax"]
+            numerator[step, col] += value
+            holding[step, col] += 1
+    return numerator, holding
+
+@pytest.mark.parametrize("label", sorted(PARAMS))
+@pytest.mark.parametrize("use_exit", [False, True])
+def test_simulate_trades_matches_naive_loop(label, use_exit):
+    close, signal, exit_signal, n_valid, in_range = _compact()
+    params = PARAMS[label]
+    exit_signal = exit_signal if use_exit else None
+
+    entry_row, entry_col, held, returns = simulate_trades(
+        close, signal, n_valid, in_range, params, exit_signal=exit_signal
+    )
+    actual = sorted(zip(entry_row.tolist(), entry_col.tolist(), held.tolist(), returns.tolist()))
+    expected = _naive_trades(close, signal, n_valid, in_range, params, exit_signal)
+
+    assert len(actual) == len(expected) > 0
+    assert [trade[:3] for trade in actual] == [trade[:3] for trade in expected]
+    np.testing.assert_allclose(
+        [trade[3] for trade in actual], [trade[3] for trade in expected], rtol=RTOL, atol=ATOL
+    )
+    assert (held >= 1).all()
+    assert (held <= params["hold_days"]).all()
+
+def test_simulate_trades_without_signals():
+    close, signal, _, n_valid, in_range = _compact()
+    entry_row, entry_col, held, returns = simulate_trades(
+        close, np.zeros_like(signal), n_valid, in_range, PARAMS["hold_5"]
+    )
+    assert len(entry_row) == len(entry_col) == len(held) == len(returns) == 0
+
+@pytest.mark.parametrize("label", sorted(PARAMS))
+def test_daily_returns_match_naive_loop(label):
+    close, signal, exit_signal, n_valid, in_range = _compact(seed=1)
+    params = PARAMS[label]
+    entry_row, entry_col, held, _ = simulate_trades(
+        close, signal, n_valid, in_range, params, exit_signal=exit_signal
+    )
+
+    numerator, holding = _daily_returns(close, entry_row, entry_col, held, params)
+    expected_numerator, expected_holding = _naive_daily(close, entry_row, entry_col, held, params)
+    np.testing.assert_array_equal(holding, expected_holding)
+    np.testing.assert_allclose(numerator, expected_numerator, rtol=RTOL, atol=ATOL)
+    # 持有的位置都在有效数据内
+    assert not (holding > 0)[np.isnan(close)].any()
@@ -0,0 +1,195 @@
+"""data_fetcher 的本地存储补拉：用替换的上游数据源模拟除权改写和没有K线的区间"""
+import asyncio
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.services import data_fetcher, price_store, upstream
+from app.services.frame_cache import frame_cache
+from app.services.upstream_providers import UpstreamProvider
+
+# 测试中“已定型”的最近日期，请求区间都在它之前
+SETTLED = "20241231"
+
+class StubHistProvider(UpstreamProvider):
+    """
+    按日期生成确定性日线数据的 stock_zh_a_hist
+
+    ex_dates 中的每个 (除权日, 比例) 使该日之前的前复权价格乘以比例，
+    与真实的前复权数据一样在除权后改写全部历史。
+    """
+
+    name = "stub"
+
+    def __init__(self, holidays=()):
+        super().__init__()
+        self.holidays = {pd.Timestamp(d).date() for d in holidays}
+        self.ex_dates = []
+        self.requests = []
+
+    def _raw(self, dates):
+        # 价格只由日期决定，不同请求区间中同一天的价格相同
+        days = np.array([(d - datetime.date(2024, 1, 1)).days for d in dates], dtype=float)
+        return 10 + np.sin(days / 7) + days / 100
+
+    def call(self, func, *args, **kwargs):
+        self.calls += 1
+        assert func.__name__ == "stock_zh_a_hist"
+        start, end = kwargs["start_date"], kwargs["end_date"]
+        self.requests.append((start, end))
+        dates = [d for d in pd.bdate_range(start, end).date if d not in self.holidays]
+        close = self._raw(dates)
+        for ex_date, ratio in self.ex_dates:
+            close = np.where(np.array(dates) < pd.Timestamp(ex_date).date(), close * ratio, close)
+        return pd.DataFrame({
+            "日期": dates,
+            "开盘": close,
+            "收盘": close,
+            "最高": close + 0.5,
+            "最低": close - 0.5,
+            "成交量": np.full(len(dates), 1000.0),
+        })
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    provider = StubHistProvider(holidays=pd.date_range("20241001", "20241007"))
+    previous = upstream.set_provider(provider)
+    monkeypatch.setattr(settings, "PRICE_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "UPSTREAM_RETRY_BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(upstream, "rate_limiter", upstream.TokenBucket(1e6, 1e6))
+    monkeypatch.setattr(upstream, "circuit_breaker", upstream.CircuitBreaker(100, 30.0))
+    monkeypatch.setattr(data_fetcher, "settled_date", lambda: SETTLED)
+    frame_cache.clear()
+    yield provider
+    upstream.set_provider(previous)
+    frame_cache.clear()
+
+def fetch(start_date, end_date):
+    return asyncio.run(data_fetcher.fetch_stock_data_checked(
+        "000001", start_date, end_date, use_alternative=False
+    ))
+
+def expected_close(provider, start_date, end_date):
+    df = provider.call(data_fetcher.ak.stock_zh_a_hist, start_date=start_date, end_date=end_date)
+    return df["收盘"].to_numpy()
+
+def test_gap_fetch_overlaps_one_stored_bar(provider):
+    fetch("20240101", "20240628")
+    frame_cache.clear()
+    df, complete = fetch("20240101", "20240731")
+
+    assert complete
+    # 补拉从本地最后一根K线（20240628）开始，用于检查复权基准
+    assert provider.requests == [("20240101", "20240628"), ("20240628", "20240731")]
+    assert not df.index.duplicated().any()
+    np.testing.assert_allclose(df["close"], expected_close(provider, "20240101", "20240731"))
+
+def test_adjustment_change_refetches_full_history(provider):
+    fetch("20240101", "20240628")
+    # 7月15日除权，之前的前复权价格全部改写
+    provider.ex_dates.append(("20240715", 0.9))
+    frame_cache.clear()
+    df, complete = fetch("20240101", "20240831")
+
+    assert complete
+    assert provider.requests[-1] == ("20240101", "20240831")
+    close = expected_close(provider, "20240101", "20240831")
+    np.testing.assert_allclose(df["close"], close)
+
+    stored, covered = price_store.load_history("000001", "qfq")
+    assert covered == ("20240101", "20240831")
+    np.testing.assert_allclose(stored["close"], close)
+
+def test_adjustment_change_before_stored_range(provider):
+    fetch("20240601", "20240830")
+    provider.ex_dates.append(("20240801", 0.8))
+    frame_cache.clear()
+    df, complete = fetch("20240101", "20240830")
+
+    assert complete
+    np.testing.assert_allclose(df["close"], expected_close(provider, "20240101", "20240830"))
+    assert price_store.load_history("000001", "qfq")[1] == ("20240101", "20240830")
+
+def test_empty_settled_range_is_covered_without_retry(provider):
+    # 国庆假期：上游成功返回空结果，只请求一次并记入覆盖区间
+    df, complete = fetch("20241001", "20241007")
+    assert df.empty
+    assert provider.requests == [("20241001", "20241007")]
+    assert price_store.load_history("000001", "qfq")[1] == ("20241001", "20241007")
+
+    fetch("20241001", "20241007")
+    assert len(provider.requests) == 1
+
+    df, complete = fetch("20240923", "20241007")
+    assert complete
+    assert provider.requests[1:] == [("20240923", "20240930")]
+    assert df.index[-1] == datetime.date(2024, 9, 30)
+
+def test_holiday_gap_after_stored_bars_is_complete(provider):
+    fetch("20240901", "20240930")
+    frame_cache.clear()
+    df, complete = fetch("20240901", "20241007")
+    assert complete
+    assert provider.requests[1:] == [("20240930", "20241007")]
+
+    frame_cache.clear()
+    fetch("20240901", "20241007")
+    assert len(provider.requests) == 2
+
+def test_empty_unsettled_range_retries_with_backoff(provider, monkeypatch):
+    monkeypatch.setattr(data_fetcher, "settled_date", lambda: "20241003")
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(settings, "UPSTREAM_RETRY_BACKOFF_SECONDS", 1.0)
+    monkeypatch.setattr(data_fetcher.asyncio, "sleep", fake_sleep)
+    df, _ = fetch("20241001", "20241007")
+    assert df.empty
+    assert len(provider.requests) == 3
+    assert sleeps == [1.0, 2.0]
+    # 已定型的部分记入覆盖区间，未定型的部分下次仍会请求
+    assert price_store.load_history("000001", "qfq")[1] == ("20241001", "20241003")
+
+def test_upstream_errors_are_not_covered(provider, monkeypatch):
+    def failing_call(func, *args, **kwargs):
+        provider.requests.append((kwargs["start_date"], kwargs["end_date"]))
+        raise ConnectionError("upstream down")
+
+    monkeypatch.setattr(provider, "call", failing_call)
+    df, complete = fetch("20240101", "20240131")
+    assert df.empty
+    assert not complete
+    assert len(provider.requests) == 3
+    assert price_store.load_history("000001", "qfq")[1] is None
+
+def test_unsettled_stored_bar_is_not_used_as_anchor(provider, monkeypatch):
+    # 盘中保存的当日K线在覆盖区间之外，补拉从覆盖区间内的最后一根K线开始
+    monkeypatch.setattr(data_fetcher, "settled_date", lambda: "20240912")
+    fetch("20240901", "20240913")
+    assert price_store.load_history("000001", "qfq")[0].index[-1] == datetime.date(2024, 9, 13)
+
+    frame_cache.clear()
+    fetch("20240901", "20240913")
+    assert provider.requests[-1] == ("20240912", "20240913")
+    assert ("20240901", "20240913") not in provider.requests[1:]
+
+def test_unsettled_bar_is_not_cached(provider, monkeypatch):
+    # 9月13日盘中：当日K线尚未定型
+    monkeypatch.setattr(data_fetcher, "settled_date", lambda: "20240912")
+    df, _ = fetch("20240901", "20240913")
+    assert df.index[-1] == datetime.date(2024, 9, 13)
+
+    assert frame_cache.get("000001", "qfq", "20240901", "20240913") is None
+    cached = frame_cache.get("000001", "qfq", "20240901", "20240912")
+    assert cached.index[-1] == datetime.date(2024, 9, 12)
+
+    # 包含当日的请求不命中缓存，重新获取当日K线
+    requests = len(provider.requests)
+    df, _ = fetch("20240901", "20240913")
+    assert df.index[-1] == datetime.date(2024, 9, 13)
+    assert provider.requests[requests:] == [("20240912", "20240913")]
@@ -0,0 +1,117 @@
+"""indicator_engine 的向量化计算与 tech_indicators / pandas 逐个计算的结果对比"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import tech_indicators
+from app.services.indicator_engine import (
+    MA_PERIODS,
+    ewm_mean,
+    latest_indicator_values,
+    rolling_max,
+    rolling_mean,
+    rolling_min,
+    rolling_std,
+    rolling_sum,
+    shift,
+)
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+def _random_walk(length, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.normal(0, 0.2, length))
+    return pd.DataFrame({
+        "open": close,
+        "high": close + rng.uniform(0, 0.5, length),
+        "low": close - rng.uniform(0, 0.5, length),
+        "close": close,
+        "volume": rng.integers(1000, 100000, length).astype(float),
+    })
+
+def _flat(length=250):
+    # 一字板/停牌式的平盘数据，覆盖除以零的分支
+    flat = np.where(np.arange(length) < 100, 10.0, 11.0)
+    return pd.DataFrame({
+        "open": flat, "high": flat, "low": flat, "close": flat, "volume": np.full(length, 100.0),
+    })
+
+DATASETS = {
+    **{f"random_walk_{length}": (lambda length=length: _random_walk(length))
+       for length in (10, 30, 60, 250, 1000)},
+    "flat_250": _flat,
+}
+
+def _expected(data):
+    """tech_indicators 各函数和 pandas 计算的最新值"""
+    macd = tech_indicators.calculate_macd(data)
+    stoch = tech_indicators.calculate_stochastic(data)
+    stoch_rsi = tech_indicators.calculate_stoch_rsi(data)
+    expected = {
+        "rsi": tech_indicators.calculate_rsi(data),
+        "stoch_k": stoch[0],
+        "stoch_d": stoch[1],
+        "cci": tech_indicators.calculate_cci(data),
+        "adx": tech_indicators.calculate_adx(data),
+        "ao": tech_indicators.calculate_ao(data),
+        "williams_r": tech_indicators.calculate_williams_r(data),
+        "macd": macd[0],
+        "macd_signal": macd[1],
+        "macd_hist": macd[2],
+        "stoch_rsi_k": stoch_rsi[0],
+        "stoch_rsi_d": stoch_rsi[1],
+        "cmf": tech_indicators.calculate_chaikin_money_flow(data),
+        "bbp": tech_indicators.calculate_bbp(data),
+        "uo": tech_indicators.calculate_ultimate_oscillator(data),
+    }
+    for period in MA_PERIODS:
+        if len(data) >= period:
+            expected[f"sma_{period}"] = data["close"].rolling(window=period).mean().iloc[-1]
+            expected[f"ema_{period}"] = data["close"].ewm(span=period, adjust=False).mean().iloc[-1]
+        else:
+            expected[f"sma_{period}"] = expected[f"ema_{period}"] = float("nan")
+    return expected
+
+@pytest.mark.parametrize("label", sorted(DATASETS))
+def test_latest_values_match_tech_indicators(label):
+    data = DATASETS[label]()
+    values = latest_indicator_values(data)
+    expected = _expected(data)
+
+    assert set(expected) <= set(values)
+    mismatched = {
+        name: (values[name], value) for name, value in expected.items()
+        if not np.isclose(values[name], value, rtol=RTOL, atol=ATOL, equal_nan=True)
+    }
+    assert not mismatched
+
+@pytest.mark.parametrize("window", [2, 5, 20, 60])
+def test_rolling_helpers_match_pandas(window):
+    # (T, N) 的二维数组，每列与 pandas 逐列计算的结果一致，窗口内有NaN时为NaN
+    values = np.random.default_rng(1).normal(0, 1, (120, 3))
+    values[40, 1] = np.nan
+    frame = pd.DataFrame(values)
+    roll = frame.rolling(window)
+
+    np.testing.assert_allclose(rolling_sum(values, window), roll.sum(), rtol=RTOL, atol=ATOL)
+    np.testing.assert_allclose(rolling_mean(values, window), roll.mean(), rtol=RTOL, atol=ATOL)
+    np.testing.assert_allclose(rolling_min(values, window), roll.min(), rtol=RTOL, atol=ATOL)
+    np.testing.assert_allclose(rolling_max(values, window), roll.max(), rtol=RTOL, atol=ATOL)
+    np.testing.assert_allclose(rolling_std(values, window), roll.std(), rtol=RTOL, atol=ATOL)
+
+def test_rolling_window_longer_than_data_is_all_nan():
+    assert np.isnan(rolling_mean(np.arange(5.0), 10)).all()
+
+@pytest.mark.parametrize("kwargs", [{"span": 12}, {"com": 13}, {"alpha": 1 / 14}])
+def test_ewm_mean_matches_pandas(kwargs):
+    values = np.random.default_rng(2).normal(0, 1, (200, 2))
+    values[:5, 0] = np.nan
+    expected = pd.DataFrame(values).ewm(adjust=False, **kwargs).mean()
+    np.testing.assert_allclose(ewm_mean(values, **kwargs), expected, rtol=RTOL, atol=ATOL)
+
+def test_shift_matches_pandas():
+    values = np.arange(10.0)
+    np.testing.assert_array_equal(shift(values), pd.Series(values).shift(1))
+    np.testing.assert_array_equal(shift(values, 3), pd.Series(values).shift(3))
+    assert np.isnan(shift(values, 20)).all()
@@ -0,0 +1,128 @@
+"""盘中模式的指标与在历史数据加上同一根临时K线后整体计算的结果对比"""
+import asyncio
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.services import live_indicators, upstream
+from app.services.indicator_engine import latest_indicator_values
+from app.services.stage_by_tech import get_trend_signals
+from app.services.upstream_providers import UpstreamProvider
+from benchmarks.synthetic import synthetic_ohlcv
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+TODAY = datetime.date.today()
+
+@pytest.fixture
+def history():
+    data = synthetic_ohlcv(300, seed=3)
+    # 最后一根K线为昨天之前的最近一个工作日，今天的K线尚未定型
+    dates = pd.bdate_range(end=TODAY - datetime.timedelta(days=1), periods=len(data)).date
+    data.index = pd.Index(dates, name="date")
+    return data
+
+class StubQuoteProvider(UpstreamProvider):
+    """stock_bid_ask_em 返回 quote 中的盘口，其他接口不应被调用"""
+
+    name = "stub"
+
+    def __init__(self, quote):
+        super().__init__()
+        self.quote = quote
+
+    def call(self, func, *args, **kwargs):
+        self.calls += 1
+        assert func.__name__ == "stock_bid_ask_em"
+        return pd.DataFrame({"item": list(self.quote), "value": list(self.quote.values())})
+
+def quote_for(bar):
+    return {"今开": bar["open"], "最高": bar["high"], "最低": bar["low"],
+            "最新": bar["close"], "总手": bar["volume"]}
+
+@pytest.fixture
+def live(tmp_path, monkeypatch, history):
+    """盘中时段、历史数据固定、盘口由 StubQuoteProvider 给出"""
+    provider = StubQuoteProvider({})
+    previous = upstream.set_provider(provider)
+
+    async def fetch_history(symbol, start_date=None, end_date=None, adjust="qfq", *args, **kwargs):
+        return history
+
+    monkeypatch.setattr(settings, "PRICE_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(upstream, "rate_limiter", upstream.TokenBucket(1e6, 1e6))
+    monkeypatch.setattr(upstream, "circuit_breaker", upstream.CircuitBreaker(100, 30.0))
+    monkeypatch.setattr(live_indicators, "fetch_stock_data_async", fetch_history)
+    monkeypatch.setattr(live_indicators, "has_provisional_bar", lambda: True)
+    monkeypatch.setattr(live_indicators, "live_states", live_indicators.LiveStateCache(10))
+    yield provider
+    upstream.set_provider(previous)
+
+BAR = {"open": 12.0, "high": 12.6, "low": 11.8, "close": 12.4, "volume": 123456.0}
+
+def with_bar(history, bar):
+    provisional = pd.DataFrame([bar], index=pd.Index([TODAY], name="date"))
+    return pd.concat([history, provisional])
+
+def assert_items_match(actual, expected):
+    assert [item["date"] for item in actual] == [item["date"] for item in expected]
+    for got, want in zip(actual, expected):
+        for name, value in want.items():
+            if name == "date" or isinstance(value, bool):
+                assert got[name] == value, name
+            elif value is None:
+                assert got[name] is None, name
+            else:
+                assert got[name] == pytest.approx(value, rel=RTOL, abs=ATOL), name
+
+@pytest.mark.parametrize("lookback", [1, 5, 30, None])
+def test_live_trend_signals_match_full_recompute(live, history, lookback):
+    live.quote = quote_for(BAR)
+    signals = live_indicators.live_trend_signals("000001", "20200101", lookback=lookback)
+    actual = asyncio.run(signals)
+    expected = get_trend_signals(with_bar(history, BAR), lookback)
+    assert actual[-1]["date"] == TODAY.strftime("%Y-%m-%d")
+    assert_items_match(actual, expected)
+
+def test_live_stock_data_matches_full_recompute(live, history):
+    live.quote = quote_for(BAR)
+    data, values = asyncio.run(live_indicators.live_stock_data("000001", "20200101"))
+    full = with_bar(history, BAR)
+    pd.testing.assert_frame_equal(data, full)
+
+    expected = latest_indicator_values(full)
+    mismatched = {
+        name: (values[name], value) for name, value in expected.items()
+        if not np.isclose(values[name], value, rtol=RTOL, atol=ATOL, equal_nan=True)
+    }
+    assert not mismatched
+
+def test_repeated_polls_reuse_state(live, history):
+    live.quote = quote_for(BAR)
+    asyncio.run(live_indicators.live_trend_signals("000001", "20200101"))
+    moved = {**BAR, "close": 12.5, "high": 12.7}
+    live.quote = quote_for(moved)
+    actual = asyncio.run(live_indicators.live_trend_signals("000001", "20200101"))
+    assert_items_match(actual, get_trend_signals(with_bar(history, moved)))
+    assert live_indicators.live_states.hits == 1
+
+def test_stale_quote_on_holiday_is_skipped(live, history):
+    # 工作日休市：盘口仍是最后一个交易日的行情
+    last = history.iloc[-1]
+    live.quote = quote_for({name: float(last[name]) for name in BAR})
+    actual = asyncio.run(live_indicators.live_trend_signals("000001", "20200101"))
+    assert_items_match(actual, get_trend_signals(history))
+
+    data, values = asyncio.run(live_indicators.live_stock_data("000001", "20200101"))
+    assert len(data) == len(history)
+    assert values["rsi"] == pytest.approx(latest_indicator_values(history)["rsi"], rel=RTOL)
+
+@pytest.mark.parametrize("open_", [0.0, "-"])
+def test_quote_without_open_is_skipped(live, history, open_):
+    live.quote = {**quote_for(BAR), "今开": open_}
+    actual = asyncio.run(live_indicators.live_trend_signals("000001", "20200101"))
+    assert actual[-1]["date"] == pd.Timestamp(history.index[-1]).strftime("%Y-%m-%d")
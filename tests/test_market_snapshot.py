@@ -0,0 +1,66 @@
+"""全市场行情快照：刷新失败时旧快照只在 max_age 内继续使用"""
+import asyncio
+
+import pandas as pd
+import pytest
+
+from app.services import upstream
+from app.services.market_snapshot import MarketSnapshot
+from app.services.upstream_providers import UpstreamProvider
+
+class SpotProvider(UpstreamProvider):
+    name = "spot"
+
+    def __init__(self):
+        super().__init__()
+        self.fail = False
+
+    def call(self, func, *args, **kwargs):
+        self.calls += 1
+        assert func.__name__ == "stock_zh_a_spot_em"
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return pd.DataFrame({"代码": ["000001"], "最新价": [10.5], "开盘": [10.0]})
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = SpotProvider()
+    previous = upstream.set_provider(provider)
+    monkeypatch.setattr(upstream, "rate_limiter", upstream.TokenBucket(1e6, 1e6))
+    monkeypatch.setattr(upstream, "circuit_breaker", upstream.CircuitBreaker(100, 30.0))
+    yield provider
+    upstream.set_provider(previous)
+
+def age(snapshot, seconds):
+    """把快照的刷新时间提前，相当于过去了 seconds 秒"""
+    snapshot._fetched_at -= seconds
+    if snapshot._updated_at is not None:
+        snapshot._updated_at -= seconds
+
+def get(snapshot, symbol="000001"):
+    return asyncio.run(snapshot.get(symbol))
+
+def test_failed_refresh_keeps_rows_until_max_age(provider):
+    snapshot = MarketSnapshot(ttl=30, max_age=300)
+    assert get(snapshot)["最新价"] == 10.5
+
+    provider.fail = True
+    age(snapshot, 60)
+    assert get(snapshot)["最新价"] == 10.5
+    assert snapshot.failures == 1
+
+    # 上游故障超过 max_age 后不再返回旧行情
+    age(snapshot, 300)
+    assert get(snapshot) is None
+    assert snapshot.expired == 1
+    assert snapshot.stats()["age_seconds"] >= 360
+
+    provider.fail = False
+    age(snapshot, 30)
+    assert get(snapshot)["最新价"] == 10.5
+
+def test_first_refresh_failure_returns_nothing(provider):
+    provider.fail = True
+    snapshot = MarketSnapshot(ttl=30, max_age=300)
+    assert get(snapshot) is None
+    assert snapshot.stats()["age_seconds"] is None
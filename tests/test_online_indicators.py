@@ -0,0 +1,186 @@
+"""逐根递推的指标状态与 stage_by_tech、tech_indicators 批量计算的结果对比"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.services import price_store, stage_by_tech, tech_indicators
+from app.services.online_indicators import (
+    MA_PERIODS,
+    RECENT_BARS,
+    STAGE_MA_WINDOWS,
+    STAGE_RSI_PERIODS,
+    STAGE_VOL_MA_WINDOWS,
+    IndicatorState,
+    advance_state,
+    load_indicator_state,
+    restore_state,
+)
+
+LENGTH = 400
+SPLIT = LENGTH // 2
+SIGNALS = ("MACD_gold_cross", "KDJ_gold_cross", "RSI_rebound", "MA_bullish")
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    close = 10 + np.cumsum(rng.normal(0, 0.2, LENGTH))
+    # 中间插入一段平盘，覆盖除以零和常数序列的分支
+    close[150:180] = close[150]
+    flat = np.arange(LENGTH) // 30 == 5
+    df = pd.DataFrame({
+        "close": close,
+        "high": np.where(flat, close, close + rng.uniform(0, 0.5, LENGTH)),
+        "low": np.where(flat, close, close - rng.uniform(0, 0.5, LENGTH)),
+        "volume": rng.integers(1000, 100000, LENGTH).astype(float),
+    }, index=pd.Index(pd.bdate_range("2024-01-01", periods=LENGTH).date, name="date"))
+    df["open"] = df["close"]
+    return df
+
+@pytest.fixture(scope="module")
+def expected(data):
+    """批量计算的各指标序列"""
+    expected = {}
+    for period in STAGE_RSI_PERIODS:
+        expected[f"RSI{period}"] = stage_by_tech.calculate_rsi(data["close"], period)
+    expected["K"], expected["D"], expected["J"] = stage_by_tech.calculate_kdj(data)
+    macd = stage_by_tech.calculate_macd(data["close"])
+    expected["DIF"], expected["DEA"], expected["MACD_HIST"] = macd
+    for window in STAGE_MA_WINDOWS:
+        expected[f"MA{window}"] = stage_by_tech.get_ma(data, window)
+    for window in STAGE_VOL_MA_WINDOWS:
+        volume = data["volume"].rolling(window=window, min_periods=window)
+        expected[f"VOL_MA{window}"] = volume.mean()
+    for period in MA_PERIODS:
+        expected[f"sma_{period}"] = data["close"].rolling(window=period).mean()
+        expected[f"ema_{period}"] = data["close"].ewm(span=period, adjust=False).mean()
+    return {name: series.to_numpy() for name, series in expected.items()}
+
+def _stream(state, data, start, stop):
+    columns = [data[name].to_numpy() for name in ("close", "high", "low", "volume")]
+    return [
+        state.update(columns[0][i], columns[1][i], columns[2][i], columns[3][i], data.index[i])
+        for i in range(start, stop)
+    ]
+
+def _assert_rows_equal(rows, expected, start):
+    actual = pd.DataFrame(rows)
+    stop = start + len(rows)
+    mismatched = [
+        name for name, values in expected.items()
+        if not np.array_equal(actual[name].to_numpy(), values[start:stop], equal_nan=True)
+    ]
+    assert not mismatched
+
+def test_update_matches_batch(data, expected):
+    rows = _stream(IndicatorState(), data, 0, LENGTH)
+    _assert_rows_equal(rows, expected, 0)
+
+@pytest.mark.parametrize("n", [35, 100, LENGTH])
+def test_update_matches_tech_indicators(data, n):
+    # tech_indicators 的函数只返回最后一个值，抽查几个长度
+    row = _stream(IndicatorState(), data, 0, n)[-1]
+    prefix = data.iloc[:n]
+    macd = tech_indicators.calculate_macd(prefix)
+    stoch_rsi = tech_indicators.calculate_stoch_rsi(prefix)
+    checks = {
+        "rsi": tech_indicators.calculate_rsi(prefix),
+        "macd": macd[0],
+        "macd_signal": macd[1],
+        "macd_hist": macd[2],
+        "stoch_rsi_k": stoch_rsi[0],
+        "stoch_rsi_d": stoch_rsi[1],
+    }
+    mismatched = [
+        name for name, value in checks.items()
+        if not np.array_equal(row[name], value, equal_nan=True)
+    ]
+    assert not mismatched
+
+def test_signals_match_get_trend_signals(data):
+    rows = _stream(IndicatorState(), data, 0, LENGTH)
+    items = stage_by_tech.get_trend_signals(data, None)
+    for name in SIGNALS:
+        assert [row[name] for row in rows] == [item[name] for item in items], name
+
+def test_serialized_state_continues(data, expected):
+    state = IndicatorState()
+    rows = _stream(state, data, 0, SPLIT)
+    state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+    rows += _stream(state, data, SPLIT, LENGTH)
+    _assert_rows_equal(rows, expected, 0)
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PRICE_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+def _save(data, n):
+    covered = (pd.Timestamp(data.index[0]).strftime("%Y%m%d"),
+               pd.Timestamp(data.index[n - 1]).strftime("%Y%m%d"))
+    price_store.save_history("000001", "qfq", data.iloc[:n], *covered)
+
+def test_restored_state_advances_like_batch(data, expected, store_dir):
+    state = IndicatorState()
+    _stream(state, data, 0, SPLIT)
+    price_store.save_state("000001", "qfq", state.to_dict())
+
+    restored = restore_state("000001", "qfq")
+    assert restored is not None
+    assert restored.bars == SPLIT
+    rows = _stream(restored, data, SPLIT, LENGTH)
+    _assert_rows_equal(rows, expected, SPLIT)
+
+def test_load_indicator_state_advances_saved_state(data, expected, store_dir, monkeypatch):
+    _save(data, SPLIT)
+    _, state = load_indicator_state("000001", "qfq")
+    assert state.bars == SPLIT
+    assert restore_state("000001", "qfq").last_date == state.last_date
+
+    # 历史数据新增了K线后，只递推新增的部分
+    _save(data, LENGTH)
+    updated = []
+    original = IndicatorState.update
+
+    def counting_update(self, *args, **kwargs):
+        updated.append(args)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(IndicatorState, "update", counting_update)
+    df, state = load_indicator_state("000001", "qfq")
+    assert len(df) == LENGTH
+    assert len(updated) == LENGTH - SPLIT
+    assert state.bars == LENGTH
+
+    recent = [row for _, row in state.recent]
+    _assert_rows_equal(recent, expected, LENGTH - RECENT_BARS)
+    items = stage_by_tech.get_trend_signals(data, RECENT_BARS)
+    assert [date for date, _ in state.recent] == [item["date"].replace("-", "") for item in items]
+    for name in SIGNALS:
+        assert [row[name] for row in recent] == [item[name] for item in items], name
+
+def test_advance_state_rebuilds_when_history_start_changes(data, expected):
+    state, _ = advance_state(None, data.iloc[:SPLIT])
+    state, changed = advance_state(state, data.iloc[10:])
+    assert changed
+    assert state.bars == LENGTH - 10
+    assert state.first_date == pd.Timestamp(data.index[10]).strftime("%Y%m%d")
+
+def test_advance_state_without_new_bars_is_unchanged(data):
+    state, _ = advance_state(None, data)
+    same, changed = advance_state(state, data)
+    assert same is state
+    assert not changed
+
+def test_advance_state_rebuilds_when_prices_are_rewritten(data, expected):
+    # 除权后前复权价格整体改写，日期不变但已递推的K线收盘价不同
+    state, _ = advance_state(None, data.iloc[:SPLIT])
+    rewritten = data.copy()
+    rewritten[["close", "high", "low", "open"]] *= 0.9
+    state, changed = advance_state(state, rewritten)
+    assert changed
+    assert state.bars == LENGTH
+    assert state.prev_close == rewritten["close"].iloc[-1]
+    assert state.recent[-1][1]["MA5"] == pytest.approx(expected["MA5"][-1] * 0.9)
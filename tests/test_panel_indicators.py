@@ -0,0 +1,78 @@
+"""面板计算的指标和信号与逐只股票调用 get_trend_signals 的结果对比"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.panel_indicators import build_panel, compute_panel_signals, latest_signals
+from app.services.stage_by_tech import SIGNAL_FIELDS, SIGNAL_FLAG_FIELDS, get_trend_signals
+from benchmarks.synthetic import synthetic_ohlcv
+
+# 各股票的K线数：不同的上市日期，包括不足以计算均线的短历史和只有一根K线的股票
+LENGTHS = [300, 250, 120, 60, 25, 12, 1]
+
+@pytest.fixture(scope="module")
+def frames():
+    frames = {}
+    for i, bars in enumerate(LENGTHS):
+        data = synthetic_ohlcv(bars, seed=(1, i))
+        # 随机剔除一些交易日模拟停牌，保留第一根K线
+        keep = np.random.default_rng((1, i, 1)).uniform(size=bars) >= 0.05
+        keep[0] = True
+        frames[f"{600000 + i:06d}"] = data[keep]
+    # 没有数据的股票不进入面板
+    frames["600999"] = synthetic_ohlcv(1).iloc[:0]
+    return frames
+
+@pytest.fixture(scope="module")
+def panel(frames):
+    return build_panel(frames)
+
+@pytest.fixture(scope="module")
+def signals(panel):
+    return compute_panel_signals(panel)
+
+def _assert_matches(name, actual, expected):
+    if name in SIGNAL_FLAG_FIELDS:
+        assert actual.tolist() == expected, name
+    else:
+        expected = np.array([np.nan if value is None else value for value in expected], dtype=float)
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, err_msg=name)
+
+def test_panel_is_ragged(frames, panel):
+    assert panel.symbols == [symbol for symbol, df in frames.items() if not df.empty]
+    assert len(set(panel.valid.sum(axis=1))) == len(panel.symbols)
+    assert not panel.valid.all()
+
+def test_panel_matches_get_trend_signals(frames, panel, signals):
+    dates = pd.DatetimeIndex(panel.dates).strftime("%Y-%m-%d")
+    for row, symbol in enumerate(panel.symbols):
+        expected = get_trend_signals(frames[symbol], None)
+        valid = panel.valid[row]
+        assert dates[valid].tolist() == [item["date"] for item in expected], symbol
+        for name in SIGNAL_FIELDS:
+            _assert_matches(f"{symbol}.{name}", signals[name][row, valid],
+                            [item[name] for item in expected])
+
+def test_missing_days_are_empty(panel, signals):
+    missing = ~panel.valid
+    for name in SIGNAL_FIELDS:
+        if name in SIGNAL_FLAG_FIELDS:
+            assert not signals[name][missing].any(), name
+        else:
+            assert np.isnan(signals[name][missing]).all(), name
+
+def test_latest_signals_match_last_item(frames, panel, signals):
+    latest = latest_signals(panel, signals)
+    assert latest.index.tolist() == panel.symbols
+    for symbol in panel.symbols:
+        expected = get_trend_signals(frames[symbol], 1)[-1]
+        row = latest.loc[symbol]
+        assert row["date"].strftime("%Y-%m-%d") == expected["date"]
+        for name in SIGNAL_FIELDS:
+            _assert_matches(f"{symbol}.{name}", np.array([row[name]]), [expected[name]])
+
+def test_empty_universe():
+    panel = build_panel({})
+    assert panel.shape == (0, 0)
+    assert compute_panel_signals(panel) == {}
+    assert latest_signals(panel, {}).empty
@@ -0,0 +1,88 @@
+"""param_sweep 共享的中间序列与 tech_indicators 在每个前缀上计算的最新值对比"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import tech_indicators
+from app.services.param_sweep import _Intermediates
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+def _history(steps=90, n_valid=(90, 70, 90), seed=0):
+    """
+    压紧布局的 (交易日, 股票) 数组，每列的有效数据在前 n_valid 行
+
+    第三列前半段为一字板式的平盘数据，覆盖除以零的分支。
+    """
+    rng = np.random.default_rng(seed)
+    n_valid = np.array(n_valid)
+    close = 10 + np.cumsum(rng.normal(0, 0.2, (steps, len(n_valid))), axis=0)
+    high = close + rng.uniform(0, 0.5, close.shape)
+    low = close - rng.uniform(0, 0.5, close.shape)
+    flat = np.arange(steps) < steps // 2
+    close[flat, 2] = high[flat, 2] = low[flat, 2] = 10.0
+    is_valid = np.arange(steps)[:, None] < n_valid[None, :]
+    history = {
+        name: np.where(is_valid, values, np.nan)
+        for name, values in (("close", close), ("high", high), ("low", low))
+    }
+    history["n_valid"] = n_valid
+    return history
+
+def _frame(history, col):
+    rows = history["n_valid"][col]
+    return pd.DataFrame({name: history[name][:rows, col] for name in ("close", "high", "low")})
+
+# (名称, 中间序列, tech_indicators 的最新值, 至少需要的行数)
+CASES = [
+    (f"rsi_{period}", lambda im, period=period: im.rsi(period),
+     lambda data, period=period: tech_indicators.calculate_rsi(data, period), period + 1)
+    for period in (6, 14)
+] + [
+    (f"stoch_{k_period}_{slowing}", lambda im, k=k_period, s=slowing: im.stoch_k(k, s),
+     lambda data, k=k_period, s=slowing: (
+         tech_indicators.calculate_stochastic(data, k, slowing=s)[0]
+     ),
+     k_period)
+    for k_period, slowing in ((9, 1), (14, 3))
+] + [
+    (f"cci_{period}", lambda im, period=period: im.cci(period),
+     lambda data, period=period: tech_indicators.calculate_cci(data, period), period)
+    for period in (14, 20)
+] + [
+    (f"williams_r_{period}", lambda im, period=period: im.williams_r(period),
+     lambda data, period=period: tech_indicators.calculate_williams_r(data, period), period)
+    for period in (10, 14)
+] + [
+    (f"uo_{short}_{mid}_{long}", lambda im, w=(short, mid, long): im.uo(*w),
+     lambda data, w=(short, mid, long): tech_indicators.calculate_ultimate_oscillator(data, *w),
+     long + 1)
+    for short, mid, long in ((7, 14, 28), (5, 10, 20))
+]
+
+@pytest.mark.parametrize("label, series, latest, min_rows", CASES, ids=[case[0] for case in CASES])
+def test_intermediates_match_tech_indicators(label, series, latest, min_rows):
+    history = _history()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = series(_Intermediates(history))
+
+    mismatched = {}
+    for col in range(values.shape[1]):
+        data = _frame(history, col)
+        for row in range(min_rows - 1, len(data)):
+            expected = latest(data.iloc[:row + 1])
+            if not np.isclose(values[row, col], expected, rtol=RTOL, atol=ATOL, equal_nan=True):
+                mismatched[(row, col)] = (values[row, col], expected)
+    assert not mismatched
+
+def test_intermediates_share_series_between_configs():
+    intermediates = _Intermediates(_history())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first = intermediates.rsi(14)
+        assert intermediates.rsi(14) is first
+        intermediates.stoch_k(14, 3)
+        hits = intermediates.hits
+        # Williams %R 复用同一周期的最高价/最低价滚动极值
+        intermediates.williams_r(14)
+    assert intermediates.hits == hits + 2
@@ -0,0 +1,86 @@
+"""筛选指标表：冷启动并发请求只构建一次，按列格式化的结果与逐行转换相同"""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models.schemas import ScreenerItem
+from app.services import screener
+from app.services.panel_indicators import build_panel
+from app.services.screener import SCREENER_FIELDS, ScreenerIndex, compile_condition
+from benchmarks.synthetic import synthetic_ohlcv
+
+LENGTHS = [300, 120, 25, 1]
+
+@pytest.fixture
+def loads(tmp_path, monkeypatch):
+    """load_panel 返回合成数据的面板，并记录调用次数"""
+    frames = {
+        f"{600000 + i:06d}": synthetic_ohlcv(bars, seed=(2, i)) for i, bars in enumerate(LENGTHS)
+    }
+    calls = []
+    lock = threading.Lock()
+
+    def load_panel(adjust="qfq", start_date=None, end_date=None, symbols=None):
+        with lock:
+            calls.append(adjust)
+        # 模拟构建耗时，让并发请求都在构建完成前到达
+        time.sleep(0.05)
+        return build_panel(frames)
+
+    monkeypatch.setattr(settings, "PRICE_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(screener, "load_panel", load_panel)
+    return calls
+
+def _row_item(symbol, row):
+    """逐行转换，作为按列格式化的参照"""
+    item = {"symbol": symbol, "date": row["date"].strftime("%Y-%m-%d")}
+    for name in SCREENER_FIELDS:
+        value = row[name]
+        if isinstance(value, (bool, np.bool_)):
+            item[name] = bool(value)
+        elif name == "volume":
+            item[name] = int(value)
+        else:
+            item[name] = None if np.isnan(value) else float(value)
+    return item
+
+def test_concurrent_cold_requests_build_once(loads):
+    index = ScreenerIndex("qfq", 365)
+
+    async def requests():
+        await asyncio.gather(*(index.ensure_built() for _ in range(5)))
+
+    asyncio.run(requests())
+    assert len(loads) == 1
+    assert len(index.table) == len(LENGTHS)
+
+    asyncio.run(index.ensure_built())
+    assert len(loads) == 1
+
+def test_items_match_row_conversion(loads):
+    index = ScreenerIndex("qfq", 365)
+    index.build()
+    total, items = index.screen(compile_condition("close > 0"))
+
+    expected = [_row_item(symbol, row) for symbol, row in index.table.iterrows()]
+    assert total == len(LENGTHS)
+    assert items == expected
+    # 值相同且类型相同：信号为bool、成交量为int，NaN转为None
+    types = [{name: type(value) for name, value in item.items()} for item in items]
+    assert types == [{name: type(value) for name, value in item.items()} for item in expected]
+    assert any(value is None for value in items[-1].values())
+    for item in items:
+        ScreenerItem(**item)
+
+def test_limit_and_empty_match(loads):
+    index = ScreenerIndex("qfq", 365)
+    index.build()
+    total, items = index.screen(compile_condition("close > 0"), limit=2)
+    assert total == len(LENGTHS)
+    assert [item["symbol"] for item in items] == index.table.index[:2].tolist()
+
+    assert index.screen(compile_condition("close < 0")) == (0, [])
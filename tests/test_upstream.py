@@ -0,0 +1,83 @@
+"""上游调用的熔断器：试探调用失败、成功和被取消"""
+import asyncio
+import threading
+
+import pytest
+
+from app.services import upstream
+from app.services.upstream import CircuitBreaker, CircuitOpenError
+from app.services.upstream_providers import UpstreamProvider
+
+class BlockingProvider(UpstreamProvider):
+    """调用阻塞到 release 被设置，或在 fail 为True时抛出异常"""
+
+    name = "blocking"
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.fail = False
+
+    def call(self, func, *args, **kwargs):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return func.__name__
+
+def stock_info():
+    pass
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = BlockingProvider()
+    previous = upstream.set_provider(provider)
+    monkeypatch.setattr(upstream, "rate_limiter", upstream.TokenBucket(1e6, 1e6))
+    monkeypatch.setattr(upstream, "circuit_breaker", CircuitBreaker(1, 0.0))
+    yield provider
+    provider.release.set()
+    upstream.set_provider(previous)
+
+def open_breaker(provider):
+    provider.fail = True
+    provider.release.set()
+    with pytest.raises(ConnectionError):
+        asyncio.run(upstream.call_upstream(stock_info))
+    assert upstream.circuit_breaker.state == CircuitBreaker.OPEN
+    provider.fail = False
+    provider.release.clear()
+
+def test_cancelled_probe_releases_half_open_slot(provider):
+    open_breaker(provider)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(upstream.call_upstream(stock_info))
+        await asyncio.to_thread(provider.started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    provider.started.clear()
+    asyncio.run(cancel_probe())
+    assert upstream.circuit_breaker.state == CircuitBreaker.HALF_OPEN
+
+    # 试探名额已释放，下一次调用可以试探并关闭熔断器
+    provider.release.set()
+    assert asyncio.run(upstream.call_upstream(stock_info)) == "stock_info"
+    assert upstream.circuit_breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_allows_one_probe():
+    breaker = CircuitBreaker(1, 0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_open_breaker_rejects_calls(provider, monkeypatch):
+    monkeypatch.setattr(upstream, "circuit_breaker", CircuitBreaker(1, 60.0))
+    open_breaker(provider)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(upstream.call_upstream(stock_info))
@@ -0,0 +1,78 @@
+"""上游数据源：抽象基类、录制与回放"""
+import datetime
+
+import pandas as pd
+import pytest
+
+from app.services.upstream_providers import (
+    InjectedUpstreamError,
+    RecordingNotFoundError,
+    RecordingProvider,
+    RecordingStore,
+    ReplayProvider,
+    UpstreamProvider,
+)
+
+def stock_zh_a_hist(symbol, period="daily", start_date=None, end_date=None, adjust=""):
+    dates = pd.bdate_range(start_date, end_date).date
+    return pd.DataFrame({
+        "日期": dates,
+        "收盘": [float(i) for i in range(len(dates))],
+        "股票代码": [symbol] * len(dates),
+    })
+
+class StaticProvider(UpstreamProvider):
+    name = "static"
+
+    def call(self, func, *args, **kwargs):
+        self.calls += 1
+        return func(*args, **kwargs)
+
+def test_incomplete_provider_fails_on_instantiation():
+    class Incomplete(UpstreamProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    with pytest.raises(TypeError):
+        UpstreamProvider()
+
+def test_replay_slices_recorded_range(tmp_path):
+    store = RecordingStore(str(tmp_path))
+    recorder = RecordingProvider(store, inner=StaticProvider())
+    recorder.call(stock_zh_a_hist, symbol="000001", start_date="20240101", end_date="20240131")
+    recorder.call(stock_zh_a_hist, symbol="000001", start_date="20240115", end_date="20240229")
+    assert recorder.calls == 2
+    assert recorder.inner.calls == 2
+
+    # 新的 store 从文件读取，不依赖内存中已加载的录制
+    replay = ReplayProvider(RecordingStore(str(tmp_path)))
+    df = replay.call(stock_zh_a_hist, symbol="000001", start_date="20240201", end_date="20240210")
+    assert df["日期"].tolist() == list(pd.bdate_range("20240201", "20240210").date)
+    assert isinstance(df["日期"].iloc[0], datetime.date)
+    assert df["股票代码"].tolist() == ["000001"] * len(df)
+
+    with pytest.raises(RecordingNotFoundError):
+        replay.call(stock_zh_a_hist, symbol="000002", start_date="20240201", end_date="20240210")
+    assert replay.misses == 1
+
+def test_replay_error_injection_is_deterministic(tmp_path):
+    store = RecordingStore(str(tmp_path))
+    store.put("stock_zh_a_hist", stock_zh_a_hist("000001", start_date="20240101",
+                                                 end_date="20240105"), symbol="000001")
+
+    def outcomes(seed):
+        replay = ReplayProvider(store, error_rate=0.5, seed=seed)
+        result = []
+        for _ in range(20):
+            try:
+                replay.call(stock_zh_a_hist, symbol="000001")
+                result.append(True)
+            except InjectedUpstreamError:
+                result.append(False)
+        return result, replay.injected_errors
+
+    first, errors = outcomes(7)
+    assert outcomes(7) == (first, errors)
+    assert 0 < errors < 20
+    assert errors == first.count(False)